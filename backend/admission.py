@@ -0,0 +1,228 @@
+# İstek Kabul Kontrolü (öncelik şeritleri + kullanıcı bazlı hız sınırı)
+import asyncio
+import ipaddress
+import json
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from auth import decode_token
+
+# Öncelik sırası: sipariş girişi > kurye > fiş > paneller > rapor/export
+ORDER_ENTRY = 'order_entry'
+COURIER = 'courier'
+RECEIPTS = 'receipts'
+DASHBOARD = 'dashboard'
+REPORTS = 'reports'
+
+# (metot veya None, yol regex'i, sınıf) - ilk eşleşen kural geçerli
+# Sınıf None: uzun süreli akış, bütçe ve hız sınırına tabi değil
+DEFAULT_RULES: List[Tuple[Optional[str], str, Optional[str]]] = [
+    ('GET', r'^/api/tables/stream$', None),
+    ('GET', r'^/api/images/', None),
+    (None, r'^/api/admin/export/', REPORTS),
+    (None, r'^/api/admin/courier/[^/]+/settle$', REPORTS),
+    (None, r'^/api/admin/couriers/settle$', REPORTS),
+    (None, r'^/api/receipts/batch$', REPORTS),
+    ('POST', r'^/api/admin/backups$', REPORTS),
+    # Tek fiş kasada sipariş başına basılır: toplu rapor bütçesini beklememeli
+    ('GET', r'^/api/orders/[^/]+/receipt$', RECEIPTS),
+    (None, r'^/api/courier/', COURIER),
+    (None, r'^/api/(stats|admin)/', DASHBOARD),
+    # Kasa terminallerinin senkronu ve kurye ataması için kurye listesi
+    (None, r'^/api/(orders|tables|products|categories|customers|couriers|sync|auth)(/|$)', ORDER_ENTRY),
+]
+
+
+class PriorityClass:
+    """Bir öncelik sınıfının eşzamanlılık bütçesi ve sayaçları"""
+
+    def __init__(self, name: str, concurrency: int, queue_timeout: float, max_queue: int,
+                 rate: float, burst: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = burst
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_timeout = 0
+        self.shed_queue_full = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+
+    def metrics(self) -> dict:
+        return {
+            'concurrency': self.concurrency,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'shed_timeout': self.shed_timeout,
+            'shed_queue_full': self.shed_queue_full,
+            'rate_limited': self.rate_limited,
+            'avg_wait_ms': round(self.total_wait / self.queued * 1000, 2) if self.queued else 0,
+        }
+
+
+class AdmissionController:
+    """
+    İstekleri öncelik sınıflarına ayırır.
+    - Her sınıfın kendi eşzamanlılık bütçesi ve kuyruk zaman aşımı vardır
+    - Kullanıcı (token yoksa IP) başına token bucket hız sınırı uygulanır
+    - Rapor yükü altında sipariş girişi kendi bütçesiyle çalışmaya devam eder
+    - Ters proxy arkasında bağlantı IP'si proxy'nindir: `trusted_proxies` içindeki
+      adreslerden gelen isteklerde istemci IP'si X-Forwarded-For'dan alınır.
+      Başlık sadece güvenilen proxy'den gelince okunur (istemci kendi kovasını seçemez)
+    """
+
+    def __init__(self, classes: Dict[str, PriorityClass], rules=None, default_class: str = DASHBOARD,
+                 trusted_proxies: Iterable[str] = ()):
+        self.classes = classes
+        self.rules = [(method, re.compile(pattern), name) for method, pattern, name in (rules or DEFAULT_RULES)]
+        self.default_class = default_class
+        self.trusted_proxies = [ipaddress.ip_network(value.strip(), strict=False)
+                                for value in trusted_proxies if value.strip()]
+        self._buckets: Dict[Tuple[str, str], list] = {}
+        self._last_prune = time.monotonic()
+
+    def classify(self, method: str, path: str) -> Optional[PriorityClass]:
+        for rule_method, pattern, name in self.rules:
+            if (rule_method is None or rule_method == method) and pattern.match(path):
+                return self.classes[name] if name is not None else None
+        return self.classes[self.default_class]
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, headers: Dict[bytes, bytes], client) -> str:
+        """Bağlantı IP'si; güvenilen proxy'den geliyorsa X-Forwarded-For'daki ilk güvenilmeyen adres"""
+        address = client[0] if client else 'unknown'
+        if not self._trusted(address):
+            return address
+        # Sağdan sola: her güvenilen proxy bir önceki adresi ekler, soldakiler istemcinin beyanıdır
+        forwarded = headers.get(b'x-forwarded-for', b'').decode('latin-1')
+        for hop in reversed([part.strip() for part in forwarded.split(',') if part.strip()]):
+            if not self._trusted(hop):
+                return hop
+            address = hop
+        return address
+
+    def client_key(self, headers: Dict[bytes, bytes], client) -> str:
+        """Hız sınırı anahtarı: token'daki kullanıcı, yoksa istemci IP'si"""
+        authorization = headers.get(b'authorization', b'').decode('latin-1')
+        if authorization.lower().startswith('bearer '):
+            try:
+                payload = decode_token(authorization[7:])
+                return f"user:{payload.get('user_id')}"
+            except HTTPException:
+                pass
+        return f"ip:{self.client_ip(headers, client)}"
+
+    def allow(self, key: str, priority: PriorityClass) -> bool:
+        """Token bucket: istek için jeton var mı"""
+        now = time.monotonic()
+        bucket = self._buckets.get((key, priority.name))
+        if bucket is None:
+            bucket = self._buckets[(key, priority.name)] = [priority.burst, now]
+        tokens = min(priority.burst, bucket[0] + (now - bucket[1]) * priority.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+
+        # Uzun süredir kullanılmayan kovaları temizle
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            self._buckets = {k: b for k, b in self._buckets.items() if now - b[1] < 300}
+        return True
+
+    async def acquire(self, priority: PriorityClass) -> Optional[str]:
+        """Sınıf bütçesinden yer al; alınamazsa reddetme nedenini döndür"""
+        if priority.semaphore.locked():
+            if priority.waiting >= priority.max_queue:
+                priority.shed_queue_full += 1
+                return 'queue_full'
+            priority.waiting += 1
+            priority.queued += 1
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(priority.semaphore.acquire(), priority.queue_timeout)
+            except asyncio.TimeoutError:
+                priority.shed_timeout += 1
+                return 'timeout'
+            finally:
+                priority.waiting -= 1
+                priority.total_wait += time.monotonic() - start
+        else:
+            await priority.semaphore.acquire()
+
+        priority.active += 1
+        priority.admitted += 1
+        return None
+
+    def release(self, priority: PriorityClass):
+        priority.active -= 1
+        priority.semaphore.release()
+
+    def metrics(self) -> dict:
+        return {name: priority.metrics() for name, priority in self.classes.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: /api isteklerini AdmissionController'dan geçirir"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS' or not scope['path'].startswith('/api'):
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.controller.classify(scope['method'], scope['path'])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = self.controller.client_key(dict(scope['headers']), scope.get('client'))
+        if not self.controller.allow(key, priority):
+            priority.rate_limited += 1
+            await self._reject(send, 429, 'Çok fazla istek, lütfen biraz bekleyin', 1)
+            return
+
+        reason = await self.controller.acquire(priority)
+        if reason is not None:
+            await self._reject(send, 503, 'Sunucu yoğun, lütfen tekrar deneyin', max(1, int(priority.queue_timeout)))
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: int):
+        body = json.dumps({'detail': detail}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(retry_after).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
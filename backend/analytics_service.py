@@ -0,0 +1,179 @@
+# Satış Analitiği Servisi (saatlik önceden toplanmış kovalar)
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from branch_service import DEFAULT_BRANCH_ID
+
+BUCKET_COLLECTION = 'sales_buckets'
+ANALYTICS_TIMEZONE = os.environ.get('ANALYTICS_TIMEZONE', 'Europe/Istanbul')
+
+
+def hour_bucket(value) -> datetime:
+    """Zamanı saat başına yuvarla (UTC)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class SalesAnalytics:
+    """
+    Kapanan siparişleri şube / saat / ürün / sipariş tipi kovalarına işler.
+    - Her sipariş kapanışında tek bir bulk write ($inc upsert)
+    - Raporlar items dizilerini açmak yerine birkaç yüz kova dokümanı okur
+    """
+
+    def __init__(self, db, catalog):
+        self.db = db
+        # Ürünün kategorisi için fiyatlandırma servisinin ürün önbelleği kullanılır
+        self.catalog = catalog
+
+    async def ensure_indexes(self):
+        await self.db[BUCKET_COLLECTION].create_index([('branch_id', 1), ('hour', 1)])
+        await self.db[BUCKET_COLLECTION].create_index([('branch_id', 1), ('product_id', 1), ('hour', 1)])
+
+    async def record_closed_order(self, order: dict) -> bool:
+        """
+        Siparişi kovalara işle. Sipariş daha önce işlendiyse tekrar saymaz.
+        """
+        claimed = await self.db.orders.update_one(
+            {'id': order['id'], 'branch_id': order.get('branch_id', DEFAULT_BRANCH_ID),
+             'analytics_recorded': {'$ne': True}},
+            {'$set': {'analytics_recorded': True}}
+        )
+        if claimed.modified_count == 0:
+            return False
+
+        await self.add_to_buckets(order)
+        return True
+
+    async def add_to_buckets(self, order: dict):
+        hour = hour_bucket(order['created_at'])
+        branch_id = order.get('branch_id', DEFAULT_BRANCH_ID)
+        order_type = order.get('order_type', 'dine-in')
+        items = order.get('items', [])
+        products = await self.catalog.get_products([item['product_id'] for item in items])
+
+        # Aynı ürün birden fazla satırda olabilir: önce topla
+        totals: Dict[str, dict] = {}
+        for item in items:
+            line_total = item.get('line_total')
+            if line_total is None:
+                line_total = item.get('quantity', 0) * item.get('price', 0)
+            entry = totals.setdefault(item['product_id'], {
+                'product_name': item.get('product_name'),
+                'quantity': 0,
+                'revenue': 0.0,
+            })
+            entry['quantity'] += item.get('quantity', 0)
+            entry['revenue'] += line_total
+
+        operations = []
+        for product_id, entry in totals.items():
+            product = products.get(product_id, {})
+            operations.append(UpdateOne(
+                {'_id': f"{branch_id}|{hour.isoformat()}|{product_id}|{order_type}"},
+                {
+                    '$inc': {'quantity': entry['quantity'], 'revenue': round(entry['revenue'], 2), 'orders': 1},
+                    '$set': {'product_name': entry['product_name'] or product.get('name')},
+                    '$setOnInsert': {
+                        'branch_id': branch_id,
+                        'hour': hour,
+                        'product_id': product_id,
+                        'category_id': product.get('category_id'),
+                        'order_type': order_type,
+                    },
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.db[BUCKET_COLLECTION].bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def _match(start: datetime, end: datetime, order_type: Optional[str] = None,
+               product_id: Optional[str] = None, branch_id: Optional[str] = None) -> dict:
+        # branch_id verilmezse tüm şubelerin toplamı
+        match = {'branch_id': branch_id} if branch_id else {}
+        match['hour'] = {'$gte': start, '$lt': end}
+        if order_type:
+            match['order_type'] = order_type
+        if product_id:
+            match['product_id'] = product_id
+        return match
+
+    async def top_products(self, start: datetime, end: datetime, limit: int = 10,
+                           order_type: Optional[str] = None, branch_id: Optional[str] = None) -> List[dict]:
+        """En çok satan ürünler"""
+        pipeline = [
+            {'$match': self._match(start, end, order_type, branch_id=branch_id)},
+            {'$group': {
+                '_id': '$product_id',
+                'product_name': {'$last': '$product_name'},
+                'category_id': {'$first': '$category_id'},
+                'quantity': {'$sum': '$quantity'},
+                'revenue': {'$sum': '$revenue'},
+                'orders': {'$sum': '$orders'},
+            }},
+            {'$sort': {'quantity': -1}},
+            {'$limit': limit},
+            {'$project': {
+                '_id': 0, 'product_id': '$_id', 'product_name': 1, 'category_id': 1,
+                'quantity': 1, 'revenue': {'$round': ['$revenue', 2]}, 'orders': 1,
+            }},
+        ]
+        return await self.db[BUCKET_COLLECTION].aggregate(pipeline).to_list(limit)
+
+    async def hourly_heatmap(self, start: datetime, end: datetime,
+                             product_id: Optional[str] = None, branch_id: Optional[str] = None) -> dict:
+        """Haftanın günü x saat satış adedi / ciro matrisi (yerel saat)"""
+        pipeline = [
+            {'$match': self._match(start, end, product_id=product_id, branch_id=branch_id)},
+            {'$group': {
+                '_id': {
+                    'dow': {'$isoDayOfWeek': {'date': '$hour', 'timezone': ANALYTICS_TIMEZONE}},
+                    'hour': {'$hour': {'date': '$hour', 'timezone': ANALYTICS_TIMEZONE}},
+                },
+                'quantity': {'$sum': '$quantity'},
+                'revenue': {'$sum': '$revenue'},
+            }},
+        ]
+        quantity = [[0] * 24 for _ in range(7)]
+        revenue = [[0.0] * 24 for _ in range(7)]
+        async for row in self.db[BUCKET_COLLECTION].aggregate(pipeline):
+            day = row['_id']['dow'] - 1  # 0 = Pazartesi
+            quantity[day][row['_id']['hour']] = row['quantity']
+            revenue[day][row['_id']['hour']] = round(row['revenue'], 2)
+        return {'timezone': ANALYTICS_TIMEZONE, 'quantity': quantity, 'revenue': revenue}
+
+    async def category_mix(self, start: datetime, end: datetime,
+                           order_type: Optional[str] = None, branch_id: Optional[str] = None) -> List[dict]:
+        """Kategori bazında ciro ve payı"""
+        pipeline = [
+            {'$match': self._match(start, end, order_type, branch_id=branch_id)},
+            {'$group': {
+                '_id': '$category_id',
+                'quantity': {'$sum': '$quantity'},
+                'revenue': {'$sum': '$revenue'},
+            }},
+            {'$sort': {'revenue': -1}},
+        ]
+        rows = await self.db[BUCKET_COLLECTION].aggregate(pipeline).to_list(None)
+        total = sum(row['revenue'] for row in rows) or 1
+        return [{
+            'category_id': row['_id'],
+            'quantity': row['quantity'],
+            'revenue': round(row['revenue'], 2),
+            'share': round(row['revenue'] / total, 4),
+        } for row in rows]
+
+
+def parse_range(start: Optional[str], end: Optional[str], default_days: int = 30):
+    """'YYYY-MM-DD' aralığını [başlangıç, bitiş) UTC datetime'a çevir (bitiş günü dahil)"""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_dt = (datetime.fromisoformat(end).replace(tzinfo=timezone.utc) if end else today) + timedelta(days=1)
+    start_dt = datetime.fromisoformat(start).replace(tzinfo=timezone.utc) if start else end_dt - timedelta(days=default_days)
+    return start_dt, end_dt
@@ -5,6 +5,9 @@ import os
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from profiling import timed
+from tracing import span
+
 SECRET_KEY = os.environ.get('SECRET_KEY', 'super-secret-key-change-in-production')
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 gün
@@ -14,12 +17,14 @@ security = HTTPBearer()
 
 def hash_password(password: str) -> str:
     """Şifreyi hashle"""
-    return bcrypt.hash(password)
+    with timed('auth'), span('bcrypt.hash'):
+        return bcrypt.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Şifre doğrula"""
-    return bcrypt.verify(plain_password, hashed_password)
+    with timed('auth'), span('bcrypt.verify'):
+        return bcrypt.verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict) -> str:
@@ -44,8 +49,9 @@ def decode_token(token: str) -> dict:
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     """Token'dan kullanıcı bilgisi al"""
-    token = credentials.credentials
-    payload = decode_token(token)
+    with timed('auth'):
+        token = credentials.credentials
+        payload = decode_token(token)
     return payload
 
 
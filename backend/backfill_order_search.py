@@ -0,0 +1,50 @@
+# Dosya Konumu: backend/backfill_order_search.py
+#
+# Sipariş araması için eski siparişlere arama alanlarını ekler
+# (customer_phone_normalized, customer_name_normalized, notes_normalized)
+# ve arama indekslerini oluşturur. Yeni siparişlerde bu alanlar oluşturulurken yazılır.
+#   python backfill_order_search.py [--batch-size 1000]
+# Tekrar çalıştırılabilir: sadece alanları eksik siparişler güncellenir.
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+CURRENT_DIR = Path(__file__).parent
+sys.path.append(str(CURRENT_DIR))
+load_dotenv(CURRENT_DIR / '.env')
+
+from order_search_service import OrderSearch
+
+
+async def backfill_order_search(batch_size: int):
+    mongo_url = os.environ.get('MONGO_URL')
+    if not mongo_url:
+        print("❌ HATA: .env dosyasında MONGO_URL bulunamadı!")
+        return
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ.get('DB_NAME', 'restoran_db')]
+    search = OrderSearch(db)
+
+    # Önce alanlar doldurulur: indeksler tek seferde kurulur
+    updated = await search.backfill(batch_size=batch_size)
+    print(f"✓ {updated} siparişe arama alanları eklendi")
+
+    await search.ensure_indexes()
+    print("✓ Sipariş arama indeksleri hazır")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sipariş arama alanlarını doldur')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(backfill_order_search(args.batch_size))
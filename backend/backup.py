@@ -0,0 +1,105 @@
+# Dosya Konumu: backend/backup.py
+#
+# Veritabanı yedeği al / geri yükle (backup_service.BackupService).
+#   python backup.py create                       # tüm koleksiyonlar, tüm şubeler
+#   python backup.py create --branch main --collections orders,users
+#   python backup.py list
+#   python backup.py restore <yedek-id> [--collections orders] [--drop] [--workers 8]
+#
+# Zamanlanmış iş olarak (her gece 03:00):
+#   0 3 * * * cd /app/backend && python backup.py create --label nightly >> /var/log/pos-backup.log 2>&1
+#
+# Her etiket + şube için son BACKUP_KEEP yedek tutulur; gün sonu / hesap kapatma öncesi
+# alınan güvenlik yedekleri (day-close-*, courier-settle-*, couriers-settle-*) otomatik silinmez.
+#
+# Yedekler BACKUP_DIR klasörüne (varsayılan backend/backups) yazılır. users koleksiyonu
+# şifre hash'lerini içerir: klasör sadece uygulama kullanıcısı tarafından okunabilmelidir.
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+CURRENT_DIR = Path(__file__).parent
+sys.path.append(str(CURRENT_DIR))
+load_dotenv(CURRENT_DIR / '.env')
+
+from backup_service import BACKUP_COLLECTIONS, BackupService
+from http_cache import CollectionVersions
+from sync_service import ChangeTracker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Veritabanı yedeği al / geri yükle')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help='Yedek al')
+    create.add_argument('--label', default='manual')
+    create.add_argument('--branch', default=None, help='Sadece bu şube (varsayılan: tümü)')
+    create.add_argument('--collections', default=','.join(BACKUP_COLLECTIONS))
+
+    commands.add_parser('list', help='Yedekleri listele')
+
+    restore = commands.add_parser('restore', help='Yedeği geri yükle')
+    restore.add_argument('backup_id')
+    restore.add_argument('--collections', default=None)
+    restore.add_argument('--drop', action='store_true', help='Önce yedeğin kapsadığı dokümanları sil')
+    restore.add_argument('--workers', type=int, default=4, help='Aynı anda yazılan parti sayısı')
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    mongo_url = os.environ.get('MONGO_URL')
+    if not mongo_url:
+        print("❌ HATA: .env dosyasında MONGO_URL bulunamadı!")
+        sys.exit(1)
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ.get('DB_NAME', 'restoran_db')]
+    service = BackupService(
+        db,
+        Path(os.environ.get('BACKUP_DIR', CURRENT_DIR / 'backups')),
+        batch_size=int(os.environ.get('BACKUP_BATCH_SIZE', '1000')),
+        keep=int(os.environ.get('BACKUP_KEEP', '14')),
+        # Geri yüklemede sürüm ve ETag sayaçları da artar: çalışan sunucular değişikliği görür
+        change_tracker=ChangeTracker(db, collection_versions=CollectionVersions(db))
+    )
+
+    try:
+        if args.command == 'create':
+            manifest = await service.create(
+                label=args.label,
+                collections=[name.strip() for name in args.collections.split(',') if name.strip()],
+                branch_id=args.branch
+            )
+            print(f"✓ Yedek alındı: {manifest['id']} (sürüm {manifest['marker']['start_version']})")
+            for name, info in manifest['collections'].items():
+                print(f"  {name}: {info['count']} doküman, {info['bytes']} bayt")
+        elif args.command == 'list':
+            for manifest in service.list():
+                total = sum(info['count'] for info in manifest['collections'].values())
+                print(f"{manifest['id']}  şube={manifest['branch_id'] or 'tümü'}  {total} doküman")
+        elif args.command == 'restore':
+            collections = args.collections.split(',') if args.collections else None
+            result = await service.restore(args.backup_id, collections=collections,
+                                           workers=args.workers, drop=args.drop)
+            for name, info in result['collections'].items():
+                status = '✓' if info['checksum_ok'] else '⚠️  özet uyuşmuyor'
+                print(f"{status} {name}: {info['inserted']} eklendi, {info['skipped']} zaten vardı "
+                      f"(yedekte {info['expected']})")
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ HATA: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
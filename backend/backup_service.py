@@ -0,0 +1,318 @@
+# Yedekleme / Geri Yükleme (gzip NDJSON, cursor ile akarak; sabit bellek)
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from sync_service import SYNC_COLLECTIONS, TOMBSTONE_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+BACKUP_COLLECTIONS = ('orders', 'couriers', 'tables', 'products', 'categories', 'users')
+# Silme öncesi alınan güvenlik yedekleri otomatik silinmez (elle temizlenir)
+PROTECTED_LABELS = ('day-close-', 'courier-settle-', 'couriers-settle-')
+MANIFEST = 'manifest.json'
+FORMAT = 'ndjson.gz'
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class _ArchiveWriter:
+    """Bir koleksiyonun arşivi; thread havuzunda parça parça yazılır"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._digest = hashlib.sha256()
+        self._file = gzip.open(path, 'wb', compresslevel=6)
+
+    def write(self, lines: List[bytes]):
+        data = b''.join(lines)
+        self._digest.update(data)
+        self._file.write(data)
+        self.count += len(lines)
+
+    def close(self) -> dict:
+        self._file.close()
+        return {
+            'file': self.path.name,
+            'count': self.count,
+            'bytes': self.path.stat().st_size,
+            'sha256': self._digest.hexdigest(),
+        }
+
+
+def _read_batches(path: Path, batch_size: int, digest) -> Iterator[List[dict]]:
+    """Arşivi satır satır oku, `batch_size` dokümanlık listeler üret"""
+    batch = []
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            digest.update(line)
+            batch.append(json_util.loads(line, json_options=_JSON_OPTIONS))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class BackupService:
+    """
+    Her yedek bir klasör: <koleksiyon>.ndjson.gz + manifest.json
+    - Koleksiyonlar `_id` sırasıyla cursor'dan okunur, `batch_size` dokümanda bir
+      thread havuzunda sıkıştırılıp yazılır (bellekte en fazla bir parti)
+    - Manifest zaman noktasını tutar: başlangıç/bitiş değişiklik sürümü (`version`)
+      ve sunucu saati. Bitiş > başlangıç ise yedek sırasında yazma olmuştur;
+      `version` > başlangıç olan dokümanlar başlangıçtan sonraki hâlleridir
+    - Yazım `<ad>.tmp` klasörüne yapılır, manifest yazılınca klasör yeniden adlandırılır
+      (yarım yedek listelenmez / geri yüklenmez)
+    - Geri yükleme sırasız insert_many partileri ile paralel; aynı `_id` atlanır,
+      yani yarıda kalan geri yükleme tekrar çalıştırılabilir
+    - Geri yüklenen senkron dokümanları yeni `version` alır ve tombstone'ları silinir:
+      istemciler ve diğer worker'ların bellek indeksleri (masa, ürün) sürüm
+      takibiyle değişikliği görür
+    """
+
+    def __init__(self, db, directory: Path, batch_size: int = 1000, keep: int = 14,
+                 change_tracker=None):
+        self.db = db
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.keep = keep
+        self.change_tracker = change_tracker
+
+    async def _version(self) -> Optional[int]:
+        return await self.change_tracker.current_version() if self.change_tracker is not None else None
+
+    async def _dump(self, name: str, query: dict, path: Path) -> dict:
+        loop = asyncio.get_running_loop()
+        writer = await loop.run_in_executor(None, _ArchiveWriter, path)
+        try:
+            lines: List[bytes] = []
+            cursor = self.db[name].find(query).sort('_id', 1).batch_size(self.batch_size)
+            async for doc in cursor:
+                lines.append(json_util.dumps(doc, json_options=_JSON_OPTIONS).encode('utf-8') + b'\n')
+                if len(lines) >= self.batch_size:
+                    await loop.run_in_executor(None, writer.write, lines)
+                    lines = []
+            if lines:
+                await loop.run_in_executor(None, writer.write, lines)
+        finally:
+            info = await loop.run_in_executor(None, writer.close)
+        info['query'] = json.loads(json_util.dumps(query, json_options=_JSON_OPTIONS))
+        return info
+
+    async def create(self, label: str = 'manual', collections: Sequence[str] = BACKUP_COLLECTIONS,
+                     queries: Optional[Dict[str, dict]] = None,
+                     branch_id: Optional[str] = None) -> dict:
+        """
+        Yedek al. `queries` koleksiyon başına filtre (örn. gün sonunda silinecek siparişler);
+        `branch_id` verilirse tüm filtrelere eklenir.
+        """
+        unknown = [name for name in collections if name not in BACKUP_COLLECTIONS]
+        if unknown:
+            raise ValueError(f"Bilinmeyen koleksiyon: {', '.join(unknown)}")
+
+        started = datetime.now(timezone.utc)
+        backup_id = f"{started.strftime('%Y%m%dT%H%M%S%fZ')}-{_UNSAFE.sub('_', label)}"
+        tmp_dir = self.directory / f"{backup_id}.tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            start_version = await self._version()
+            results = await asyncio.gather(*(
+                self._dump(
+                    name,
+                    {**(queries or {}).get(name, {}), **({'branch_id': branch_id} if branch_id else {})},
+                    tmp_dir / f"{name}.{FORMAT}"
+                )
+                for name in collections
+            ))
+            manifest = {
+                'id': backup_id,
+                'label': label,
+                'format': FORMAT,
+                'branch_id': branch_id,
+                'started_at': started.isoformat(),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'marker': {'start_version': start_version, 'end_version': await self._version()},
+                'collections': dict(zip(collections, results)),
+            }
+            await asyncio.get_running_loop().run_in_executor(None, self._finish, tmp_dir, manifest)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.info(f"Yedek alındı: {backup_id} ({sum(r['count'] for r in results)} doküman)")
+        return manifest
+
+    def _finish(self, tmp_dir: Path, manifest: dict):
+        with open(tmp_dir / MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_dir, self.directory / manifest['id'])
+        self.prune()
+
+    def prune(self):
+        """
+        Her etiket + şube için en yeni `keep` yedek kalır (yarım kalmış .tmp klasörleri de
+        silinir). Silme öncesi güvenlik yedekleri (PROTECTED_LABELS) hiç silinmez.
+        """
+        if self.keep <= 0 or not self.directory.exists():
+            return
+        for stale in self.directory.glob('*.tmp'):
+            # Başka bir süreç hâlâ yazıyor olabilir: sadece bir günden eskileri sil
+            if stale.stat().st_mtime < time.time() - 86400:
+                shutil.rmtree(stale, ignore_errors=True)
+        groups: Dict[tuple, List[Path]] = {}
+        for path in sorted(self.directory.glob(f'*/{MANIFEST}')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            label = manifest.get('label', '')
+            if label.startswith(PROTECTED_LABELS):
+                continue
+            groups.setdefault((label, manifest.get('branch_id')), []).append(path.parent)
+        for backups in groups.values():
+            for old in backups[:max(0, len(backups) - self.keep)]:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def list(self) -> List[dict]:
+        """Yedek manifestleri (en yeni önce)"""
+        if not self.directory.exists():
+            return []
+        manifests = []
+        for path in sorted(self.directory.glob(f'*/{MANIFEST}'), reverse=True):
+            with open(path, encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        return manifests
+
+    def manifest(self, backup_id: str) -> dict:
+        path = self.directory / _UNSAFE.sub('_', backup_id) / MANIFEST
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    # ---- Geri yükleme ----
+
+    async def _drop(self, name: str, query: dict, tracked: bool):
+        """Yedeğin kapsadığı dokümanları sil; senkron koleksiyonlarda tombstone bırak"""
+        collection = self.db[name]
+        if not tracked:
+            await collection.delete_many(query)
+            return
+        # Geri yüklenenlerin tombstone'u partiler yazılırken silinir,
+        # sadece yedekte olmayan (gerçekten silinen) dokümanlarınki kalır
+        async with self.change_tracker.write(name) as version:
+            by_branch: Dict[Optional[str], List[str]] = {}
+            async for doc in collection.find(query, {'_id': 0, 'id': 1, 'branch_id': 1}):
+                if doc.get('id') is None:
+                    continue
+                ids = by_branch.setdefault(doc.get('branch_id'), [])
+                ids.append(doc['id'])
+                if len(ids) >= self.batch_size:
+                    await self.change_tracker.tombstone(name, ids, version, doc.get('branch_id'))
+                    by_branch[doc.get('branch_id')] = []
+            for branch_id, ids in by_branch.items():
+                await self.change_tracker.tombstone(name, ids, version, branch_id)
+            await collection.delete_many(query)
+
+    async def _insert(self, name: str, batch: List[dict]) -> tuple:
+        """(eklenen, atlanan); yinelenen `_id` dışındaki hatalar yükseltilir"""
+        try:
+            result = await self.db[name].insert_many(batch, ordered=False)
+            return len(result.inserted_ids), 0
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            return e.details.get('nInserted', 0), len(errors)
+
+    async def _insert_tracked(self, name: str, batch: List[dict]) -> tuple:
+        # Parti başına ayrı sürüm: uzun bir geri yükleme tek yazma bloğunda kalıp
+        # diğer worker'ların onayladığı sürümün gerisine düşmez
+        async with self.change_tracker.write(name) as version:
+            for doc in batch:
+                doc['version'] = version
+            counts = await self._insert(name, batch)
+            ids = [doc['id'] for doc in batch if doc.get('id') is not None]
+            await self.db[TOMBSTONE_COLLECTION].delete_many({'collection': name, 'doc_id': {'$in': ids}})
+        return counts
+
+    async def _restore_collection(self, backup_dir: Path, name: str, info: dict,
+                                  workers: int, drop: bool) -> dict:
+        loop = asyncio.get_running_loop()
+        tracked = self.change_tracker is not None and name in SYNC_COLLECTIONS
+        if drop:
+            query = json_util.loads(json.dumps(info.get('query') or {}), json_options=_JSON_OPTIONS)
+            await self._drop(name, query, tracked)
+
+        digest = hashlib.sha256()
+        batches = _read_batches(backup_dir / info['file'], self.batch_size, digest)
+        # En fazla `workers` parti aynı anda yazılır (okuma da bekler: sabit bellek)
+        slots = asyncio.Semaphore(workers)
+        tasks = set()
+        failures: List[Exception] = []
+        inserted = skipped = 0
+
+        async def insert(batch: List[dict]):
+            nonlocal inserted, skipped
+            try:
+                if tracked:
+                    batch_inserted, batch_skipped = await self._insert_tracked(name, batch)
+                else:
+                    batch_inserted, batch_skipped = await self._insert(name, batch)
+                inserted += batch_inserted
+                skipped += batch_skipped
+            except Exception as e:
+                failures.append(e)
+            finally:
+                slots.release()
+
+        try:
+            while not failures:
+                await slots.acquire()
+                batch = await loop.run_in_executor(None, next, batches, None)
+                if batch is None:
+                    slots.release()
+                    break
+                task = asyncio.create_task(insert(batch))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await loop.run_in_executor(None, batches.close)
+        if failures:
+            raise failures[0]
+
+        if digest.hexdigest() != info['sha256']:
+            logger.warning(f"{name}: arşiv özeti manifestle eşleşmiyor")
+        return {'inserted': inserted, 'skipped': skipped, 'expected': info['count'],
+                'checksum_ok': digest.hexdigest() == info['sha256']}
+
+    async def restore(self, backup_id: str, collections: Optional[Sequence[str]] = None,
+                      workers: int = 4, drop: bool = False) -> dict:
+        """
+        Yedeği geri yükle. `drop`: önce yedeğin kapsadığı dokümanları (aynı filtre) sil.
+        Koleksiyonlar sırayla, her koleksiyonun partileri paralel yazılır.
+        """
+        manifest = self.manifest(backup_id)
+        backup_dir = self.directory / manifest['id']
+        results = {}
+        for name, info in manifest['collections'].items():
+            if collections and name not in collections:
+                continue
+            results[name] = await self._restore_collection(backup_dir, name, info, workers, drop)
+            logger.info(f"{name} geri yüklendi: {results[name]}")
+        return {'id': manifest['id'], 'marker': manifest['marker'], 'collections': results}
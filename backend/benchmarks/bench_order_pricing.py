@@ -0,0 +1,80 @@
+# Büyük sepetli sipariş oluşturma benchmark'ı
+# Kullanım: python benchmarks/bench_order_pricing.py
+# Ayrı bir veritabanı kullanır (<DB_NAME>_bench), gerçek verilere dokunmaz.
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+load_dotenv(BACKEND_DIR / '.env')
+
+from pricing_service import PricingService  # noqa: E402
+
+PRODUCT_COUNT = 500
+BASKET_SIZES = [10, 100, 1000]
+ROUNDS = 20
+
+
+async def price_per_item(db, items):
+    """Eski yöntem: her kalem için ayrı sorgu + float toplam"""
+    total = 0.0
+    for item in items:
+        product = await db.products.find_one({'id': item['product_id']}, {'_id': 0, 'price': 1})
+        total += item['quantity'] * product['price']
+    return total
+
+
+async def timed(fn, rounds=ROUNDS):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def main():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'test_database') + '_bench']
+
+    await db.products.delete_many({})
+    await db.products.create_index('id', unique=True)
+    await db.products.insert_many([
+        {'id': f'bench-{i}', 'name': f'Ürün {i}', 'price': 10 + (i % 90) + 0.25,
+         'category_id': 'cat-bench', 'is_available': True}
+        for i in range(PRODUCT_COUNT)
+    ])
+
+    print(f"{'sepet':>6} | {'kalem başı sorgu':>17} | {'toplu (soğuk)':>14} | {'toplu (sıcak)':>14} | {'oluştur+kaydet':>15}")
+    for size in BASKET_SIZES:
+        items = [{'product_id': f'bench-{i % PRODUCT_COUNT}', 'quantity': 1 + i % 3} for i in range(size)]
+
+        per_item = await timed(lambda: price_per_item(db, items))
+
+        async def cold():
+            service = PricingService(db)
+            await service.price_items(items)
+
+        warm_service = PricingService(db)
+        await warm_service.price_items(items)
+
+        async def create():
+            pricing = await warm_service.price_items(items)
+            await db.orders.insert_one({'id': str(uuid.uuid4()), **pricing})
+
+        batched_cold = await timed(cold)
+        batched_warm = await timed(lambda: warm_service.price_items(items))
+        create_ms = await timed(create)
+        print(f"{size:>6} | {per_item:>14.2f} ms | {batched_cold:>11.2f} ms | {batched_warm:>11.2f} ms | {create_ms:>12.2f} ms")
+
+    await client.drop_database(db.name)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+# Kurye uygulamasının /courier/packages sorgulama döngüsü için bant genişliği ve gecikme ölçümü
+# Kullanım:
+#   BENCH_URL=http://localhost:8000 BENCH_USERNAME=kurye BENCH_PASSWORD=... python benchmarks/bench_polling.py
+# Çalışan bir sunucuya karşı koşar; her mod için aynı sayıda istek atar.
+import os
+import statistics
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BENCH_URL', 'http://localhost:8000')
+PATH = os.environ.get('BENCH_PATH', '/api/courier/packages')
+POLLS = int(os.environ.get('BENCH_POLLS', '200'))
+
+MODES = [
+    ('sıkıştırmasız', {'Accept-Encoding': 'identity'}, False),
+    ('gzip', {'Accept-Encoding': 'gzip'}, False),
+    ('br/zstd/gzip', {'Accept-Encoding': 'br, zstd, gzip'}, False),
+    ('gzip + ETag', {'Accept-Encoding': 'gzip'}, True),
+]
+
+
+def login(client: httpx.Client) -> str:
+    token = os.environ.get('BENCH_TOKEN')
+    if token:
+        return token
+    response = client.post('/api/auth/login', json={
+        'username': os.environ['BENCH_USERNAME'],
+        'password': os.environ['BENCH_PASSWORD'],
+    })
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+def run_mode(client: httpx.Client, token: str, headers: dict, use_etag: bool):
+    latencies = []
+    wire_bytes = 0
+    not_modified = 0
+    etag = None
+    for _ in range(POLLS):
+        request_headers = {'Authorization': f'Bearer {token}', **headers}
+        if use_etag and etag:
+            request_headers['If-None-Match'] = etag
+        start = time.perf_counter()
+        response = client.get(PATH, headers=request_headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        wire_bytes += response.num_bytes_downloaded
+        if response.status_code == 304:
+            not_modified += 1
+        else:
+            response.raise_for_status()
+            etag = response.headers.get('etag')
+    latencies.sort()
+    return {
+        'bytes_per_poll': wire_bytes / POLLS,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'not_modified': not_modified,
+    }
+
+
+def main():
+    with httpx.Client(base_url=BASE_URL, timeout=10) as client:
+        token = login(client)
+        print(f"{PATH} - {POLLS} istek/mod")
+        print(f"{'mod':>14} | {'bayt/istek':>10} | {'p50':>8} | {'p95':>8} | {'304':>5}")
+        for name, headers, use_etag in MODES:
+            result = run_mode(client, token, headers, use_etag)
+            print(f"{name:>14} | {result['bytes_per_poll']:>10.0f} | {result['p50_ms']:>5.2f} ms | "
+                  f"{result['p95_ms']:>5.2f} ms | {result['not_modified']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Fiş PDF boyutu ve oluşturma süresi: tam font (önceki) / alt küme font / termal düzen
+# Kullanım: python benchmarks/bench_receipts.py
+# Veritabanı gerekmez; örnek siparişlerle PDFReceiptService doğrudan çağrılır.
+import sys
+import time
+from pathlib import Path
+
+from reportlab import rl_config
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from pdf_service import PDFReceiptService, SubsetTTFont, FONT_NAME  # noqa: E402
+
+ROUNDS = 50
+BATCH_SIZE = 50
+FONT_FILES = {
+    'DejaVu': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'DejaVu-Bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+}
+
+PRODUCTS = ['Tavuk Döner', 'Et Döner', 'İskender', 'Lahmacun', 'Ayran', 'Künefe', 'Çoban Salata', 'Şalgam']
+
+
+def sample_order(i: int) -> dict:
+    items = [
+        {'product_name': PRODUCTS[(i + j) % len(PRODUCTS)], 'quantity': 1 + j % 3, 'price': 40 + j * 12.5}
+        for j in range(3 + i % 6)
+    ]
+    total = sum(item['quantity'] * item['price'] for item in items)
+    return {
+        'order_number': f'SIP-20260101-{i:04d}',
+        'created_at': '2026-01-01T12:30:00',
+        'order_type': 'takeaway' if i % 2 else 'dine-in',
+        'table_name': f'Masa {i % 12 + 1}',
+        'customer_name': 'Ayşe Yılmaz',
+        'customer_phone': '0555 111 22 33',
+        'customer_address': 'Caferağa Mah. Moda Cad. No:12 Kadıköy',
+        'items': items,
+        'total_amount': total,
+        'tax_amount': total * 0.10,
+        'grand_total': total * 1.10,
+    }
+
+
+def use_fonts(font_class, use_a85: int):
+    # registerFont kayıtlı bir adı değiştirmez; karşılaştırma için kayıt doğrudan değiştirilir
+    for name, path in FONT_FILES.items():
+        pdfmetrics._fonts[name] = font_class(name, path)
+    rl_config.useA85 = use_a85
+
+
+def measure(service: PDFReceiptService, orders, layout: str):
+    sizes = []
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        sizes.append(len(service.generate_receipt(orders[i % len(orders)], layout=layout)))
+    single_ms = (time.perf_counter() - start) / ROUNDS * 1000
+
+    start = time.perf_counter()
+    batch = service.generate_receipts(orders[:BATCH_SIZE], layout=layout)
+    batch_ms = (time.perf_counter() - start) * 1000
+    return sum(sizes) / len(sizes), single_ms, len(batch), batch_ms
+
+
+def main():
+    if FONT_NAME == 'Helvetica':
+        print("DejaVu fontları bulunamadı; gömülü font olmadığından karşılaştırma anlamsız.")
+        return
+
+    orders = [sample_order(i) for i in range(BATCH_SIZE)]
+    service = PDFReceiptService()
+    modes = [
+        ('tam font, A4 (önceki)', TTFont, 1, 'a4'),
+        ('alt küme, A4', SubsetTTFont, 0, 'a4'),
+        ('alt küme, termal 80 mm', SubsetTTFont, 0, 'thermal'),
+    ]
+
+    print(f"{'mod':<24} | {'fiş başı bayt':>13} | {'fiş başı süre':>13} | {f'{BATCH_SIZE} fiş toplu':>14} | {'toplu süre':>10}")
+    for label, font_class, use_a85, layout in modes:
+        use_fonts(font_class, use_a85)
+        measure(service, orders, layout)  # ısınma (alt küme önbelleği dolar)
+        avg_bytes, single_ms, batch_bytes, batch_ms = measure(service, orders, layout)
+        print(f"{label:<24} | {avg_bytes:>11.0f} B | {single_ms:>10.2f} ms | {batch_bytes:>12} B | {batch_ms:>7.1f} ms")
+
+    # Servisin kendi font kaydına geri dön
+    use_fonts(SubsetTTFont, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Soğuk açılış profili: `python -X importtime` dökümü ve worker başına temel RSS
+# Kullanım: python benchmarks/profile_imports.py [--top 20] [--depth 1]
+# Son ölçüm: benchmarks/profile_imports.md
+# server modülünü ayrı bir süreçte yükler (MongoDB'ye bağlanmaz, sadece import eder)
+# ve rapor servislerinin hemen yüklenmesi (eski davranış) ile karşılaştırır.
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = [
+    ('tembel (şimdiki)', 'import server'),
+    ('hemen (eski)', 'import server, report_services; report_services.prewarm()'),
+]
+
+RSS_SNIPPET = """
+import resource, sys
+{statement}
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(rss if sys.platform != 'darwin' else rss // 1024)
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'importtime_profile')
+    return env
+
+
+def import_times(statement: str):
+    """-X importtime çıktısını (modül, self_us, kümülatif_us) listesine çevir"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Sütun bir boşlukla başlar, her iç içe seviye iki boşluk ekler
+        name = name.rstrip()[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def max_rss_kb(statement: str) -> int:
+    result = subprocess.run(
+        [sys.executable, '-c', RSS_SNIPPET.format(statement=statement)],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True
+    )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=1, help='0: sadece en üst seviye importlar')
+    args = parser.parse_args()
+
+    for title, statement in SCENARIOS:
+        rows = import_times(statement)
+        total_ms = sum(cumulative for _, depth, _, cumulative in rows if depth == 0) / 1000
+        shown = [(name, depth, cumulative) for name, depth, _, cumulative in rows if depth <= args.depth]
+        print(f"## {title}: `{statement}`")
+        print(f"toplam import süresi: {total_ms:.1f} ms, max RSS: {max_rss_kb(statement) / 1024:.1f} MB")
+        print()
+        print("| modül | seviye | kümülatif (ms) |")
+        print("|---|---:|---:|")
+        for name, depth, cumulative in sorted(shown, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"| {name} | {depth} | {cumulative / 1000:.1f} |")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Şube Servisi (çoklu şube: şube bazlı indeksler, sipariş sırası ve shard key)
+import os
+from datetime import datetime, timezone
+from typing import Optional, Set
+
+from pymongo import ReturnDocument
+
+DEFAULT_BRANCH_ID = os.environ.get('DEFAULT_BRANCH_ID', 'main')
+
+# branch_id taşıyan koleksiyonlar (müşteri rehberi şubeler arası ortaktır)
+BRANCH_COLLECTIONS = ('orders', 'tables', 'categories', 'products', 'couriers', 'users', 'sales_buckets')
+
+# Tüm sorgular branch_id eşitliği ile başlar; indeksler de şube önekli
+BRANCH_INDEXES = {
+    'orders': [
+        # version: rapor önbelleğinin dönem sürümü indeksten okunur
+        [('branch_id', 1), ('order_number', 1), ('version', 1)],
+        [('branch_id', 1), ('created_at', -1)],
+        [('branch_id', 1), ('status', 1), ('created_at', -1)],
+        [('branch_id', 1), ('courier_id', 1), ('order_number', 1)],
+    ],
+    'tables': [[('branch_id', 1), ('table_number', 1)]],
+    'categories': [[('branch_id', 1), ('is_active', 1)]],
+    'products': [[('branch_id', 1), ('category_id', 1)]],
+    'couriers': [[('branch_id', 1), ('is_approved', 1), ('is_available', 1)]],
+    'users': [[('branch_id', 1), ('role', 1)]],
+}
+
+# orders shard key:
+# - branch_id öneki: şube sorguları sadece o şubenin chunk'larına gider
+# - hashed id: kalabalık bir şubenin yazmaları tek chunk'ta birikmez
+# Tek doküman güncellemelerinde filtre {'id', 'branch_id'} içermelidir.
+ORDERS_SHARD_KEY = {'branch_id': 1, 'id': 'hashed'}
+
+
+def branch_of(user: dict) -> str:
+    """Token'daki şube (eski token'larda varsayılan şube)"""
+    return user.get('branch_id') or DEFAULT_BRANCH_ID
+
+
+class BranchService:
+    """
+    Şube kayıtları ve şube bazlı sayaçlar.
+    - Sipariş numarası şube + gün başına atomik sayaçtan alınır
+    - branch_id olmayan eski dokümanlar varsayılan şubeye atanır
+    """
+
+    def __init__(self, db, default_branch_id: str = DEFAULT_BRANCH_ID):
+        self.db = db
+        self.default_branch_id = default_branch_id
+        self._known: Set[str] = set()
+
+    async def ensure_indexes(self):
+        await self.db.branches.create_index('id', unique=True)
+        for name, indexes in BRANCH_INDEXES.items():
+            for keys in indexes:
+                await self.db[name].create_index(keys)
+        # Shard key indeksi (tek düğümde de oluşturulur, shardCollection için hazır olur)
+        await self.db.orders.create_index(list(ORDERS_SHARD_KEY.items()))
+
+    async def ensure_default(self):
+        """Varsayılan şube kaydı yoksa oluştur"""
+        await self.db.branches.update_one(
+            {'id': self.default_branch_id},
+            {'$setOnInsert': {
+                'id': self.default_branch_id,
+                'name': 'Merkez',
+                'address': None,
+                'is_active': True,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+            }},
+            upsert=True
+        )
+        self._known.add(self.default_branch_id)
+
+    async def backfill(self) -> dict:
+        """branch_id alanı olmayan dokümanları varsayılan şubeye ata"""
+        updated = {}
+        for name in BRANCH_COLLECTIONS:
+            result = await self.db[name].update_many(
+                {'branch_id': {'$exists': False}},
+                {'$set': {'branch_id': self.default_branch_id}}
+            )
+            if result.modified_count:
+                updated[name] = result.modified_count
+        return updated
+
+    async def exists(self, branch_id: str) -> bool:
+        if branch_id in self._known:
+            return True
+        if await self.db.branches.find_one({'id': branch_id, 'is_active': True}, {'_id': 1}):
+            self._known.add(branch_id)
+            return True
+        return False
+
+    def remember(self, branch_id: str):
+        self._known.add(branch_id)
+
+    async def next_order_number(self, branch_id: str, now: Optional[datetime] = None) -> str:
+        """Şube ve gün başına artan sipariş numarası (tek atomik işlem)"""
+        today = (now or datetime.now(timezone.utc)).strftime('%Y%m%d')
+        doc = await self.db.counters.find_one_and_update(
+            {'_id': f"order_seq|{branch_id}|{today}"},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return f"SIP-{today}-{doc['seq']:04d}"
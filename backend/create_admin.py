@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -22,7 +23,7 @@ except ImportError:
     print("HATA: 'auth.py' dosyası bulunamadı! Bu script 'backend' klasöründe olmalı.")
     sys.exit(1)
 
-async def create_admin():
+async def create_admin(branch_id: str, username: str, password: str):
     print("------------------------------------------------")
     print("Admin oluşturma işlemi başlıyor...")
 
@@ -43,9 +44,11 @@ async def create_admin():
         print(f"❌ HATA: Veritabanına bağlanılamadı. Hata: {e}")
         return
 
-    # KULLANICI BİLGİLERİ (İstersen burayı değiştirebilirsin)
-    username = "admin"
-    password = "admin123"
+    # Şube önceden oluşturulmuş olmalı (POST /api/admin/branches); varsayılan şube açılışta oluşur
+    if branch_id != os.environ.get('DEFAULT_BRANCH_ID', 'main') and not await db.branches.find_one({"id": branch_id}):
+        print(f"❌ HATA: '{branch_id}' şubesi bulunamadı.")
+        client.close()
+        return
 
     # Zaten var mı kontrol et
     existing_user = await db.users.find_one({"username": username})
@@ -62,6 +65,7 @@ async def create_admin():
         "role": "admin",
         "is_approved": True,  # Admin direkt onaylıdır
         "courier_id": None,
+        "branch_id": branch_id,
         "created_at": "2025-01-01T10:00:00"
     }
 
@@ -70,6 +74,7 @@ async def create_admin():
         print("✅ BAŞARILI! Admin kullanıcısı oluşturuldu.")
         print(f"   Kullanıcı Adı: {username}")
         print(f"   Şifre: {password}")
+        print(f"   Şube: {branch_id}")
         print("   (Lütfen tarayıcıdan giriş yapmayı dene)")
     except Exception as e:
         print(f"❌ HATA: Kayıt sırasında sorun oluştu: {e}")
@@ -78,8 +83,16 @@ async def create_admin():
     print("------------------------------------------------")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Admin kullanıcısı oluştur')
+    # Her şubenin admini ayrı kullanıcı adıyla oluşturulur
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--branch', default=os.environ.get('DEFAULT_BRANCH_ID', 'main'),
+                        help='Adminin şubesi (varsayılan: DEFAULT_BRANCH_ID)')
+    args = parser.parse_args()
+
     # Windows için gerekli ayar
     if os.name == 'nt':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
-    asyncio.run(create_admin())
\ No newline at end of file
+    asyncio.run(create_admin(args.branch, args.username, args.password))
\ No newline at end of file
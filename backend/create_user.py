@@ -1,5 +1,6 @@
 # Dosya Konumu: backend/create_user.py
 
+import argparse
 import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -10,7 +11,7 @@ from auth import hash_password # Senin auth.py dosyanı kullanır
 # .env yükle
 load_dotenv()
 
-async def create_admin_user():
+async def create_admin_user(branch_id: str, username: str, password: str):
     # 1. Veritabanına Bağlan
     mongo_url = os.environ.get('MONGO_URL')
     if not mongo_url:
@@ -20,9 +21,10 @@ async def create_admin_user():
     client = AsyncIOMotorClient(mongo_url)
     db = client[os.environ.get('DB_NAME', 'restoran_db')]
     
-    # 2. Kullanıcı Bilgileri
-    username = "admin"
-    password = "123"  # Şifren bu olacak
+    # Şube önceden oluşturulmuş olmalı (POST /api/admin/branches)
+    if branch_id != os.environ.get('DEFAULT_BRANCH_ID', 'main') and not await db.branches.find_one({"id": branch_id}):
+        print(f"HATA: '{branch_id}' şubesi bulunamadı!")
+        return
     
     # Kontrol et: Zaten var mı?
     existing = await db.users.find_one({"username": username})
@@ -31,28 +33,37 @@ async def create_admin_user():
         # İstersen buraya silme kodu eklersin ama şimdilik uyarıp geçelim
         return
 
-    # 3. Kullanıcıyı Hazırla
+    # 2. Kullanıcıyı Hazırla
     new_user = {
         "id": str(uuid.uuid4()),
         "username": username,
         "password": hash_password(password), # ŞİFREYİ HASH'LEMEK ŞART!
         "role": "admin",      # Admin her yere girer
         "is_approved": True,  # Onaylı olsun
+        "branch_id": branch_id,
         "created_at": "2024-01-01T00:00:00"
     }
 
-    # 4. Kaydet
+    # 3. Kaydet
     try:
         await db.users.insert_one(new_user)
         print("------------------------------------------------")
         print("✅ BAŞARILI! Kullanıcı oluşturuldu.")
         print(f"👤 Kullanıcı Adı: {username}")
         print(f"🔑 Şifre: {password}")
+        print(f"🏪 Şube: {branch_id}")
         print("------------------------------------------------")
     except Exception as e:
         print(f"❌ HATA: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Admin kullanıcısı oluştur')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='123')
+    parser.add_argument('--branch', default=os.environ.get('DEFAULT_BRANCH_ID', 'main'),
+                        help='Kullanıcının şubesi (varsayılan: DEFAULT_BRANCH_ID)')
+    args = parser.parse_args()
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(create_admin_user())
\ No newline at end of file
+    loop.run_until_complete(create_admin_user(args.branch, args.username, args.password))
\ No newline at end of file
@@ -0,0 +1,250 @@
+# Müşteri Rehberi Servisi (telefon / isim otomatik tamamlama)
+import asyncio
+import logging
+import re
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from text_utils import fold_text, normalize_phone, normalize_phone_prefix, tokenize
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 3
+
+
+class PrefixIndex:
+    """Sıralı (anahtar, değer) listesi üzerinde bisect ile önek araması"""
+
+    def __init__(self, entries: Optional[List[Tuple[str, str]]] = None):
+        self._entries: List[Tuple[str, str]] = sorted(entries or [])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key: str, value: str):
+        entry = (key, value)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            return
+        insort(self._entries, entry)
+
+    def remove(self, key: str, value: str):
+        entry = (key, value)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def search(self, prefix: str, limit: int) -> List[str]:
+        """Öneki eşleşen değerler (tekrarsız, en fazla limit adet)"""
+        result = []
+        seen = set()
+        i = bisect_left(self._entries, (prefix, ''))
+        while i < len(self._entries) and len(result) < limit:
+            key, value = self._entries[i]
+            if not key.startswith(prefix):
+                break
+            if value not in seen:
+                seen.add(value)
+                result.append(value)
+            i += 1
+        return result
+
+
+class CustomerDirectory:
+    """
+    Müşteri rehberi.
+    - Siparişlerden müşteri kaydı oluşturur/günceller (upsert)
+    - Telefon ve isim önek araması bellekteki indeksten yapılır
+    - Diğer worker'ların yazdıkları `version` alanı üzerinden periyodik alınır
+    """
+
+    def __init__(self, db, change_tracker=None, refresh_interval: float = 5.0,
+                 full_reload_every: int = 60):
+        self.db = db
+        # Yazılan müşteriye global değişiklik sırasından `version` verilir
+        self.change_tracker = change_tracker
+        self.refresh_interval = refresh_interval
+        self.full_reload_every = full_reload_every
+        self._customers: Dict[str, dict] = {}
+        self._phone_index = PrefixIndex()
+        self._name_index = PrefixIndex()
+        self._loaded = False
+        self._since = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        """Telefon için unique, isim için önek indeksi"""
+        await self.db.customers.create_index(
+            'phone_normalized',
+            unique=True,
+            partialFilterExpression={'phone_normalized': {'$type': 'string'}}
+        )
+        await self.db.customers.create_index('name_normalized')
+        await self.db.customers.create_index('version')
+
+    async def load(self):
+        """Tüm müşterileri belleğe al ve indeksleri tek seferde kur"""
+        docs = await self.db.customers.find(
+            {'phone_normalized': {'$type': 'string'}}, {'_id': 0}
+        ).to_list(None)
+
+        customers = {doc['id']: doc for doc in docs}
+        # Yükleme sürerken bu worker'da yazılan daha yeni sürümleri koru
+        for customer_id, doc in self._customers.items():
+            if customer_id in customers and doc.get('version', 0) > customers[customer_id].get('version', 0):
+                customers[customer_id] = doc
+        docs = list(customers.values())
+
+        self._customers = customers
+        self._phone_index = PrefixIndex([(doc['phone_normalized'], doc['id']) for doc in docs])
+        self._name_index = PrefixIndex([
+            (key, doc['id']) for doc in docs for key in self._name_keys(doc.get('name'))
+        ])
+        self._since = max([self._since] + [doc.get('version', 0) for doc in docs])
+        self._loaded = True
+
+    @staticmethod
+    def _name_keys(name: Optional[str]) -> List[str]:
+        # Tam isim + her kelime ayrı anahtar ("yılmaz" ile de bulunsun)
+        folded = fold_text(name)
+        if not folded:
+            return []
+        return list({folded, *tokenize(name)})
+
+    def _index(self, doc: dict):
+        old = self._customers.get(doc['id'])
+        self._since = max(self._since, doc.get('version', 0))
+        if old is not None and old.get('version', 0) > doc.get('version', 0):
+            return
+        if old is not None:
+            self._phone_index.remove(old['phone_normalized'], old['id'])
+            for key in self._name_keys(old.get('name')):
+                self._name_index.remove(key, old['id'])
+
+        self._customers[doc['id']] = doc
+        self._phone_index.add(doc['phone_normalized'], doc['id'])
+        for key in self._name_keys(doc.get('name')):
+            self._name_index.add(key, doc['id'])
+
+    async def upsert_from_order(self, name: Optional[str], phone: Optional[str],
+                                address: Optional[str]) -> Optional[dict]:
+        """Siparişteki müşteri bilgilerini rehbere yaz"""
+        phone_normalized = normalize_phone(phone)
+        if not phone_normalized:
+            return None
+
+        now = datetime.now(timezone.utc).isoformat()
+        update = {'phone': phone, 'last_order_at': now}
+        if name:
+            update['name'] = name
+            update['name_normalized'] = fold_text(name)
+        if address:
+            update['address'] = address
+        if self.change_tracker is not None:
+            update['version'] = await self.change_tracker.next_version()
+
+        doc = await self.db.customers.find_one_and_update(
+            {'phone_normalized': phone_normalized},
+            {
+                '$set': update,
+                '$inc': {'order_count': 1},
+                '$setOnInsert': {'id': str(uuid.uuid4()), 'created_at': now},
+            },
+            upsert=True,
+            projection={'_id': 0},
+            return_document=ReturnDocument.AFTER
+        )
+        self._index(doc)
+        return doc
+
+    def _rank(self, ids: List[str], limit: int) -> List[dict]:
+        # Son sipariş verenler önce gelsin
+        docs = [self._customers[i] for i in ids]
+        docs.sort(key=lambda d: d.get('last_order_at') or '', reverse=True)
+        return docs[:limit]
+
+    async def search(self, query: str, limit: int = 10) -> List[dict]:
+        """Telefon öneki veya isim ile müşteri ara"""
+        query = query.strip()
+        is_phone = bool(query) and all(ch.isdigit() or ch in '+ -()' for ch in query)
+
+        if is_phone:
+            prefix = normalize_phone_prefix(query)
+            if len(prefix) < MIN_QUERY_LENGTH:
+                return []
+            if self._loaded:
+                return self._rank(self._phone_index.search(prefix, 200), limit)
+            return await self._search_db('phone_normalized', prefix, limit)
+
+        tokens = tokenize(query)
+        if not tokens or len(''.join(tokens)) < MIN_QUERY_LENGTH:
+            return []
+        if not self._loaded:
+            return await self._search_db('name_normalized', fold_text(query), limit)
+
+        # İlk kelimeyle adayları bul, diğer kelimeleri aday üzerinde kontrol et
+        candidates = self._name_index.search(tokens[0], 500)
+        if len(tokens) > 1:
+            matched = []
+            for customer_id in candidates:
+                name_tokens = tokenize(self._customers[customer_id].get('name'))
+                if all(any(t.startswith(q) for t in name_tokens) for q in tokens[1:]):
+                    matched.append(customer_id)
+            candidates = matched
+        return self._rank(candidates, limit)
+
+    async def _search_db(self, field: str, prefix: str, limit: int) -> List[dict]:
+        # Bellek indeksi hazır değilse çapalı regex (indeks kullanır)
+        return await self.db.customers.find(
+            {field: {'$regex': f'^{re.escape(prefix)}'}}, {'_id': 0}
+        ).sort('last_order_at', -1).to_list(limit)
+
+    async def get_by_phone(self, phone: str) -> Optional[dict]:
+        """Tam telefon numarası ile müşteri"""
+        phone_normalized = normalize_phone(phone)
+        if not phone_normalized:
+            return None
+        for customer_id in self._phone_index.search(phone_normalized, 1):
+            doc = self._customers[customer_id]
+            if doc['phone_normalized'] == phone_normalized:
+                return doc
+        return await self.db.customers.find_one({'phone_normalized': phone_normalized}, {'_id': 0})
+
+    # ---- Diğer worker'larla eşitleme ----
+
+    async def poll(self):
+        """Son görülen sürümden sonra değişen müşterileri al"""
+        async for doc in self.db.customers.find({'version': {'$gt': self._since}}, {'_id': 0}):
+            if doc.get('phone_normalized'):
+                self._index(doc)
+
+    async def _run(self):
+        rounds = 0
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            rounds += 1
+            try:
+                # Sürüm sırası dışında tamamlanan yazmalar için ara ara tam yükleme
+                if rounds % self.full_reload_every == 0:
+                    await self.load()
+                else:
+                    await self.poll()
+            except Exception as e:
+                logger.error(f"Müşteri rehberi güncellenemedi: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -69,4 +69,53 @@ class ExcelExportService:
         buffer = BytesIO()
         wb.save(buffer)
         buffer.seek(0)
-        return buffer.getvalue()
\ No newline at end of file
+        return buffer.getvalue()
+    
+    def generate_settlement_summary(self, rows: List[dict], title: str = "Kurye Hesap Özeti") -> bytes:
+        """Toplu kurye hesabı özeti (kurye başına sipariş adedi ve tutarlar)"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Özet"
+        
+        ws['A1'] = title
+        ws['A1'].font = Font(size=16, bold=True)
+        ws['A1'].alignment = Alignment(horizontal='center')
+        ws.merge_cells('A1:E1')
+        
+        headers = ['Kurye', 'Sipariş', 'Teslim Edilen', 'Tutar (KDV hariç)', 'Genel Toplam']
+        header_fill = PatternFill(start_color='FFA500', end_color='FFA500', fill_type='solid')
+        for col, header in enumerate(headers, start=1):
+            cell = ws.cell(row=3, column=col)
+            cell.value = header
+            cell.font = Font(bold=True, color='FFFFFF')
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center')
+        
+        for row_idx, row in enumerate(rows, start=4):
+            ws.cell(row=row_idx, column=1, value=row['courier_name'])
+            ws.cell(row=row_idx, column=2, value=row['order_count'])
+            ws.cell(row=row_idx, column=3, value=row['delivered_count'])
+            ws.cell(row=row_idx, column=4, value=f"{row['total_amount']:.2f} ₺")
+            ws.cell(row=row_idx, column=5, value=f"{row['grand_total']:.2f} ₺")
+        
+        # Toplam satırı
+        total_row = len(rows) + 4
+        ws.cell(row=total_row, column=1, value='TOPLAM').font = Font(bold=True)
+        ws.cell(row=total_row, column=2, value=sum(row['order_count'] for row in rows)).font = Font(bold=True)
+        ws.cell(row=total_row, column=3, value=sum(row['delivered_count'] for row in rows)).font = Font(bold=True)
+        ws.cell(row=total_row, column=4, value=f"{sum(row['total_amount'] for row in rows):.2f} ₺").font = Font(bold=True)
+        ws.cell(row=total_row, column=5, value=f"{sum(row['grand_total'] for row in rows):.2f} ₺").font = Font(bold=True)
+        
+        ws.column_dimensions['A'].width = 25
+        for column in ('B', 'C', 'D', 'E'):
+            ws.column_dimensions[column].width = 18
+        
+        buffer = BytesIO()
+        wb.save(buffer)
+        buffer.seek(0)
+        return buffer.getvalue()
+
+
+def render_orders_workbook(orders: List[dict], title: str) -> bytes:
+    """Süreç havuzu için modül düzeyinde (pickle edilebilir) giriş noktası"""
+    return ExcelExportService().generate_orders_report(orders, title=title)
\ No newline at end of file
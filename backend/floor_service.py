@@ -0,0 +1,195 @@
+# Salon Durumu Servisi (masa doluluk haritası bellekte, tek sorguda atomik güncelleme)
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PROJECTION = {'_id': 0}
+
+
+def _table_sort_key(table: dict):
+    number = str(table.get('table_number', ''))
+    return (0, int(number), '') if number.isdigit() else (1, 0, number)
+
+
+class FloorService:
+    """
+    Şube bazında masa haritası.
+    - GET /tables bellekten döner, koleksiyon her istekte okunmaz
+    - Masa değişiklikleri tek bir koşullu update ile yapılır (find + update yok)
+    - Doluluk masadaki aktif sipariş ID'lerine bağlıdır
+    - Diğer worker'ların değişiklikleri `version` alanı üzerinden periyodik alınır
+    - Değişiklikler abonelere (SSE) anında iletilir
+    """
+
+    def __init__(self, db, refresh_interval: float = 1.0, full_reload_every: int = 30):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.full_reload_every = full_reload_every
+        self._tables: Dict[str, Dict[str, dict]] = {}
+        self._since = 0
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        """Tüm masaları baştan yükle"""
+        tables: Dict[str, Dict[str, dict]] = {}
+        async for doc in self.db.tables.find({}, PROJECTION):
+            tables.setdefault(doc.get('branch_id'), {})[doc['id']] = doc
+            self._since = max(self._since, doc.get('version', 0))
+        # Yükleme sürerken bu worker'da yazılan daha yeni sürümleri koru
+        for branch_id, current in self._tables.items():
+            loaded = tables.setdefault(branch_id, {})
+            for table_id, doc in current.items():
+                if table_id in loaded and doc.get('version', 0) > loaded[table_id].get('version', 0):
+                    loaded[table_id] = doc
+        before = {branch_id: self.etag(branch_id) for branch_id in self._subscribers}
+        self._tables = tables
+        for branch_id, etag in before.items():
+            if self.etag(branch_id) != etag:
+                self._publish(branch_id, None)
+
+    def apply(self, doc: Optional[dict]) -> Optional[dict]:
+        """Yazma sonucu dönen masa dokümanını haritaya işle ve abonelere bildir"""
+        if doc is None:
+            return None
+        branch = self._tables.setdefault(doc.get('branch_id'), {})
+        current = branch.get(doc['id'])
+        if current is not None and current.get('version', 0) > doc.get('version', 0):
+            return current
+        branch[doc['id']] = doc
+        self._since = max(self._since, doc.get('version', 0))
+        self._publish(doc.get('branch_id'), doc)
+        return doc
+
+    def tables(self, branch_id: str) -> List[dict]:
+        return sorted(self._tables.get(branch_id, {}).values(), key=_table_sort_key)
+
+    def etag(self, branch_id: str) -> str:
+        """Haritanın bellekteki durumundan ETag (veri ile aynı kaynaktan)"""
+        tables = self._tables.get(branch_id, {})
+        # Sürümler sadece artar: toplam, herhangi bir masa değişince değişir
+        key = f"{branch_id}|{len(tables)}|{sum(t.get('version', 0) for t in tables.values())}"
+        return 'W/"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '"'
+
+    # ---- Atomik yazmalar (hepsi tek round trip) ----
+
+    async def toggle(self, table_id: str, branch_id: str, version: int) -> Optional[dict]:
+        """Dolu <-> boş: aggregation pipeline update ile sunucuda çevrilir"""
+        doc = await self.db.tables.find_one_and_update(
+            {'id': table_id, 'branch_id': branch_id},
+            [{'$set': {
+                'is_occupied': {'$not': [{'$ifNull': ['$is_occupied', False]}]},
+                'version': version,
+            }}],
+            projection=PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        return self.apply(doc)
+
+    async def set_occupied(self, table_id: str, branch_id: str, is_occupied: bool,
+                           version: int) -> Optional[dict]:
+        doc = await self.db.tables.find_one_and_update(
+            {'id': table_id, 'branch_id': branch_id},
+            {'$set': {'is_occupied': is_occupied, 'version': version}},
+            projection=PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        return self.apply(doc)
+
+    async def attach_order(self, table_id: str, branch_id: str, order_id: str,
+                           version: int) -> Optional[dict]:
+        """Siparişi masaya bağla ve masayı dolu yap; masa adı için dokümanı döndürür"""
+        doc = await self.db.tables.find_one_and_update(
+            {'id': table_id, 'branch_id': branch_id},
+            {
+                '$addToSet': {'active_order_ids': order_id},
+                '$set': {'is_occupied': True, 'version': version},
+            },
+            projection=PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        return self.apply(doc)
+
+    async def release_order(self, table_id: str, branch_id: str, order_id: str,
+                            version: int) -> Optional[dict]:
+        """Kapanan siparişi masadan çıkar; masada başka aktif sipariş yoksa boşalt"""
+        doc = await self.db.tables.find_one_and_update(
+            {'id': table_id, 'branch_id': branch_id},
+            [
+                {'$set': {'active_order_ids': {'$filter': {
+                    'input': {'$ifNull': ['$active_order_ids', []]},
+                    'cond': {'$ne': ['$$this', order_id]},
+                }}}},
+                {'$set': {
+                    'is_occupied': {'$gt': [{'$size': '$active_order_ids'}, 0]},
+                    'version': version,
+                }},
+            ],
+            projection=PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        return self.apply(doc)
+
+    # ---- Değişiklik bildirimleri ----
+
+    def subscribe(self, branch_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+        self._subscribers.setdefault(branch_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, branch_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(branch_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[branch_id]
+
+    def _publish(self, branch_id: str, doc: Optional[dict]):
+        """doc=None: istemci tüm haritayı yeniden almalı"""
+        for queue in self._subscribers.get(branch_id, ()):
+            try:
+                queue.put_nowait(doc)
+            except asyncio.QueueFull:
+                # Yavaş istemci: birikenleri at, tam harita gönderilsin
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    # ---- Diğer worker'larla eşitleme ----
+
+    async def poll(self):
+        """Son görülen sürümden sonra değişen masaları al"""
+        async for doc in self.db.tables.find({'version': {'$gt': self._since}}, PROJECTION):
+            self.apply(doc)
+
+    async def _run(self):
+        rounds = 0
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            rounds += 1
+            try:
+                # Sürüm sırası dışında tamamlanan yazmalar için ara ara tam yükleme
+                if rounds % self.full_reload_every == 0:
+                    await self.load()
+                else:
+                    await self.poll()
+            except Exception as e:
+                logger.error(f"Masa haritası güncellenemedi: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,124 @@
+# Talep Tahmini Servisi (mutfak hazırlık planı)
+# Haftanın günü x saat mevsimselliği, haftalar boyunca üstel düzeltme ile
+# tüm ürünler için tek seferde (NumPy vektörleri ile) hesaplanır.
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from analytics_service import ANALYTICS_TIMEZONE, BUCKET_COLLECTION
+from branch_service import DEFAULT_BRANCH_ID
+
+
+class DemandForecaster:
+    """
+    Şube ve ürün bazında ertesi günün saatlik satış adedi tahmini.
+    - Geçmiş: sales_buckets kovalarından (ürün x gün x saat) dizisi
+    - Model: her (gün, saat) hücresi için haftalar boyunca üstel düzeltme
+    - Sonuç gün sonu kapanışına kadar önbellekte tutulur
+    """
+
+    def __init__(self, db, weeks: int = 8, alpha: float = 0.3):
+        self.db = db
+        self.weeks = weeks
+        self.alpha = alpha
+        self.tz = ZoneInfo(ANALYTICS_TIMEZONE)
+        self._cache: Dict[str, dict] = {}
+
+    def invalidate(self, branch_id: Optional[str] = None):
+        """Gün sonu kapanışında önbelleği temizle"""
+        if branch_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(branch_id, None)
+
+    def cached(self, target: date, branch_id: str = DEFAULT_BRANCH_ID) -> Optional[dict]:
+        forecast = self._cache.get(branch_id)
+        if forecast is not None and forecast['date'] == target.isoformat():
+            return forecast
+        return None
+
+    def next_day(self) -> date:
+        return datetime.now(self.tz).date() + timedelta(days=1)
+
+    async def load_history(self, target: date, branch_id: str = DEFAULT_BRANCH_ID) -> dict:
+        """Hedef günden önceki `weeks` haftanın satışlarını (ürün, gün, saat) satırları olarak oku"""
+        first_day = target - timedelta(days=self.weeks * 7)
+        start = datetime.combine(first_day, datetime.min.time(), tzinfo=self.tz)
+        end = datetime.combine(target, datetime.min.time(), tzinfo=self.tz)
+        pipeline = [
+            {'$match': {'branch_id': branch_id, 'hour': {'$gte': start, '$lt': end}}},
+            {'$group': {
+                '_id': {
+                    'product_id': '$product_id',
+                    'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$hour', 'timezone': ANALYTICS_TIMEZONE}},
+                    'hour': {'$hour': {'date': '$hour', 'timezone': ANALYTICS_TIMEZONE}},
+                },
+                'product_name': {'$last': '$product_name'},
+                'quantity': {'$sum': '$quantity'},
+            }},
+        ]
+        rows = await self.db[BUCKET_COLLECTION].aggregate(pipeline).to_list(None)
+        return {'branch_id': branch_id, 'first_day': first_day, 'rows': rows}
+
+    def fit_predict(self, history: dict, target: date) -> dict:
+        """Tüm ürünler için tek seferde model kur ve hedef günü tahmin et"""
+        import numpy as np
+
+        rows = history['rows']
+        first_day = history['first_day']
+        product_ids: List[str] = []
+        product_index: Dict[str, int] = {}
+        names: Dict[str, str] = {}
+        p_idx, d_idx, h_idx, qty = [], [], [], []
+        day_cache: Dict[str, int] = {}
+
+        for row in rows:
+            key = row['_id']
+            product_id = key['product_id']
+            if product_id not in product_index:
+                product_index[product_id] = len(product_ids)
+                product_ids.append(product_id)
+            if row.get('product_name'):
+                names[product_id] = row['product_name']
+            day = day_cache.get(key['day'])
+            if day is None:
+                day = day_cache[key['day']] = (date.fromisoformat(key['day']) - first_day).days
+            p_idx.append(product_index[product_id])
+            d_idx.append(day)
+            h_idx.append(key['hour'])
+            qty.append(row['quantity'])
+
+        days = self.weeks * 7
+        sales = np.zeros((len(product_ids), days, 24), dtype=np.float64)
+        if rows:
+            np.add.at(sales, (np.array(p_idx), np.array(d_idx), np.array(h_idx)), np.array(qty, dtype=np.float64))
+
+        # (ürün, hafta, haftanın günü, saat): gün 0 = first_day'in günü
+        weekly = sales.reshape(len(product_ids), self.weeks, 7, 24)
+        smoothed = weekly[:, 0]
+        for week in range(1, self.weeks):
+            smoothed = self.alpha * weekly[:, week] + (1 - self.alpha) * smoothed
+
+        day_slot = (target - first_day).days % 7
+        prediction = np.round(smoothed[:, day_slot, :], 2)
+        totals = prediction.sum(axis=1)
+
+        products = [{
+            'product_id': product_id,
+            'product_name': names.get(product_id),
+            'hourly': prediction[i].tolist(),
+            'total': round(float(totals[i]), 2),
+        } for i, product_id in enumerate(product_ids)]
+        products.sort(key=lambda p: p['total'], reverse=True)
+
+        return {
+            'branch_id': history['branch_id'],
+            'date': target.isoformat(),
+            'timezone': ANALYTICS_TIMEZONE,
+            'weeks': self.weeks,
+            'generated_at': datetime.now(self.tz).isoformat(),
+            'products': products,
+        }
+
+    def store(self, forecast: dict):
+        self._cache[forecast['branch_id']] = forecast
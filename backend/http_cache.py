@@ -0,0 +1,193 @@
+# Koşullu GET (ETag) ve yanıt sıkıştırma
+import asyncio
+import gzip
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+# Akış yanıtları tamponlanamaz
+STREAMING_TYPES = ('text/event-stream',)
+
+
+class CollectionVersions:
+    """
+    Koleksiyon başına değişiklik sayacı.
+    - Her yazmada artırılır (MongoDB'de saklanır, worker'lar arası paylaşılır)
+    - ETag bu sayaçtan türetilir; değişmeyen listeler sorgu çalıştırmadan 304 döner
+    """
+
+    def __init__(self, db, refresh_interval: float = 1.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Diğer worker'ların yaptığı değişiklikleri al"""
+        async for doc in self.db.collection_versions.find({}):
+            if doc['version'] > self._versions.get(doc['_id'], 0):
+                self._versions[doc['_id']] = doc['version']
+
+    async def bump(self, *names: str):
+        """Koleksiyon(lar) değişti"""
+        for name in names:
+            doc = await self.db.collection_versions.find_one_and_update(
+                {'_id': name},
+                {'$inc': {'version': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._versions[name] = max(self._versions.get(name, 0), doc['version'])
+
+    def get(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def etag(self, *names: str, extra: str = '') -> str:
+        """Koleksiyon sürümleri + sorgu parametrelerinden zayıf ETag"""
+        key = '|'.join(f"{name}:{self.get(name)}" for name in names) + '|' + extra
+        return 'W/"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '"'
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Koleksiyon sürümleri okunamadı: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match ETag ile eşleşiyorsa 304 yanıtı"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    tags = [tag.strip() for tag in header.split(',')]
+    # Zayıf karşılaştırma: W/ öneki yok sayılır
+    if '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]:
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    return None
+
+
+def set_cache_headers(response: Response, etag: str):
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.strip().startswith('q='):
+                try:
+                    quality = float(param.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    for name, available in (('br', brotli is not None), ('zstd', zstandard is not None), ('gzip', True)):
+        if available and accepted.get(name, accepted.get('*', 0)) > 0:
+            return name
+    return None
+
+
+def _compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11))
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Metin/JSON yanıtlarını sıkıştırır (brotli > zstd > gzip, kurulu olana göre).
+    minimum_size altındaki yanıtlar olduğu gibi gönderilir.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        encoding = _choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message['type'] == 'http.response.start':
+                response_headers = {k.lower(): v for k, v in message.get('headers', [])}
+                content_type = response_headers.get(b'content-type', b'').decode('latin-1')
+                if (b'content-encoding' in response_headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or content_type.startswith(STREAMING_TYPES)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            chunks.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            body = b''.join(chunks)
+            response_headers = [(k, v) for k, v in start_message.get('headers', [])
+                                if k.lower() not in (b'content-length', b'content-encoding')]
+            if len(body) >= self.minimum_size:
+                body = _compress(body, encoding, self.level)
+                response_headers.append((b'content-encoding', encoding.encode()))
+                response_headers.append((b'vary', b'Accept-Encoding'))
+            response_headers.append((b'content-length', str(len(body)).encode()))
+
+            await send({**start_message, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_wrapper)
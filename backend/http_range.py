@@ -0,0 +1,116 @@
+# Dosya yanıtları: Content-Length, tek aralıklı Range (206), If-Range ve güçlü ETag
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    'bytes=a-b' / 'bytes=a-' / 'bytes=-n' -> (başlangıç, bitiş) dahil.
+    Çoklu ya da anlaşılamayan aralıkta None (tam yanıt verilir),
+    dosya dışında kalan aralıkta ValueError (416).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    start_text, sep, end_text = (part.strip() for part in spec.partition('-'))
+    if not sep or not (start_text or end_text):
+        return None
+    if (start_text and not start_text.isdigit()) or (end_text and not end_text.isdigit()):
+        return None
+
+    if not start_text:
+        # Son n bayt
+        suffix = int(end_text)
+        if suffix == 0:
+            raise ValueError('boş aralık')
+        return max(0, size - suffix), size - 1
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        return None
+    if start >= size:
+        raise ValueError('aralık dosya dışında')
+    end = int(end_text) if end_text else size - 1
+    return start, min(end, size - 1)
+
+
+def iter_bytes(data: bytes):
+    """Bellekteki dosyayı parça parça gönder (tek büyük yazma yerine)"""
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[start:start + CHUNK_SIZE])
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+
+def _read(f, start: int, length: int):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    etag: str,
+    filename: Optional[str] = None,
+    cache_control: str = 'private, no-cache',
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Diskteki dosyayı parça parça gönderir (thread havuzunda okunur).
+    - If-None-Match eşleşirse 304
+    - Range: tek aralık 206 + Content-Range; If-Range farklı sürümü gösteriyorsa tam dosya
+    """
+    base_headers = {'ETag': etag, 'Cache-Control': cache_control, 'Accept-Ranges': 'bytes', **(headers or {})}
+    if filename:
+        base_headers['Content-Disposition'] = f'attachment; filename={filename}'
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: v for k, v in base_headers.items() if k != 'Content-Disposition'})
+
+    # Dosya açıldıktan sonra silinse de (önbellek temizliği) okuma sürer
+    f = open(path, 'rb')
+    size = os.fstat(f.fileno()).st_size
+    start, end = 0, size - 1
+    status_code = 200
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and size and (not if_range or if_range.strip() == etag):
+        try:
+            requested = parse_range(range_header, size)
+        except ValueError:
+            f.close()
+            return Response(status_code=416, headers={**base_headers, 'Content-Range': f'bytes */{size}'})
+        if requested is not None:
+            start, end = requested
+            status_code = 206
+            base_headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    length = end - start + 1 if size else 0
+    base_headers['Content-Length'] = str(length)
+    return StreamingResponse(
+        _read(f, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=base_headers,
+    )
@@ -0,0 +1,201 @@
+# Idempotency-Key desteği (tekrar deneyen istemciler için yanıt tekrarı)
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_COLLECTION = 'idempotency_keys'
+HEADER = 'idempotency-key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """
+    Aynı Idempotency-Key ile gelen istek ikinci kez çalıştırılmaz, ilk yanıt döner.
+    - Önde bellek içi LRU: tekrar bir sözlük okumasıyla cevaplanır
+    - Arkada TTL indeksli koleksiyon: worker'lar arası ve yeniden başlatmalar sonrası
+    - Eşzamanlı kopyalar: `_id` tekil olduğundan sadece biri kaydı oluşturur,
+      diğerleri sonucu bekler (aynı worker'da future, diğer worker'larda yoklama)
+    - Anahtar kullanıcı + metot + yol ile kapsamlanır; aynı anahtar farklı gövdeyle 422
+    """
+
+    def __init__(self, db, ttl_hours: float = 24, max_entries: int = 10000,
+                 lock_seconds: float = 30.0, wait_seconds: float = 10.0):
+        self.db = db
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self._cache: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.replays = 0
+        self.executed = 0
+
+    async def ensure_indexes(self):
+        await self.db[IDEMPOTENCY_COLLECTION].create_index('expires_at', expireAfterSeconds=0)
+
+    # ---- Önbellek ----
+
+    def _cached(self, scope: str) -> Optional[dict]:
+        entry = self._cache.get(scope)
+        if entry is None:
+            return None
+        if entry['expires'] < time.monotonic():
+            del self._cache[scope]
+            return None
+        self._cache.move_to_end(scope)
+        return entry
+
+    def _remember(self, scope: str, fingerprint: str, status_code: int, body: Any):
+        self._cache[scope] = {
+            'fingerprint': fingerprint,
+            'status_code': status_code,
+            'body': body,
+            'expires': time.monotonic() + self.ttl.total_seconds(),
+        }
+        self._cache.move_to_end(scope)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _replay(self, entry: dict, fingerprint: str) -> JSONResponse:
+        if entry['fingerprint'] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key farklı bir istekle tekrar kullanıldı")
+        self.replays += 1
+        return JSONResponse(
+            content=entry['body'],
+            status_code=entry['status_code'],
+            headers={'Idempotency-Replayed': 'true'}
+        )
+
+    # ---- Kayıt sahipliği ----
+
+    async def _claim(self, scope: str, fingerprint: str) -> Optional[dict]:
+        """Kaydı oluştur: None -> istek bu çağrıda çalıştırılır; dict -> tamamlanmış kayıt"""
+        now = datetime.now(timezone.utc)
+        collection = self.db[IDEMPOTENCY_COLLECTION]
+        try:
+            await collection.insert_one({
+                '_id': scope,
+                'state': 'pending',
+                'fingerprint': fingerprint,
+                'locked_until': now + timedelta(seconds=self.lock_seconds),
+                'expires_at': now + self.ttl,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            doc = await collection.find_one({'_id': scope})
+            if doc is None:
+                # Süresi dolup silinmiş: yeniden dene
+                return await self._claim(scope, fingerprint)
+            if doc['state'] == 'done':
+                return doc
+            if doc['fingerprint'] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key farklı bir istekle tekrar kullanıldı")
+            # Sahibi çökmüş olabilir: kilit süresi dolduysa devral
+            now = datetime.now(timezone.utc)
+            taken = await collection.find_one_and_update(
+                {'_id': scope, 'state': 'pending', 'locked_until': {'$lt': now}},
+                {'$set': {'locked_until': now + timedelta(seconds=self.lock_seconds)}}
+            )
+            if taken is not None:
+                return None
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="Aynı istek hâlâ işleniyor, lütfen tekrar deneyin")
+            await asyncio.sleep(0.1)
+
+    async def run(self, scope: str, fingerprint: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._cached(scope)
+        if entry is not None:
+            return self._replay(entry, fingerprint)
+
+        # Aynı worker'daki eşzamanlı kopya: ilk çağrının sonucunu bekle
+        pending = self._inflight.get(scope)
+        if pending is not None:
+            await asyncio.shield(pending)
+            entry = self._cached(scope)
+            if entry is not None:
+                return self._replay(entry, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[scope] = future
+        try:
+            doc = await self._claim(scope, fingerprint)
+            if doc is not None:
+                self._remember(scope, doc['fingerprint'], doc['status_code'], doc['body'])
+                return self._replay(self._cache[scope], fingerprint)
+
+            try:
+                result = await handler()
+            except BaseException:
+                # Başarısız istek saklanmaz; istemci aynı anahtarla tekrar deneyebilir
+                await self.db[IDEMPOTENCY_COLLECTION].delete_one({'_id': scope, 'state': 'pending'})
+                raise
+            self.executed += 1
+            status_code = result.status_code if isinstance(result, JSONResponse) else 200
+            body = json.loads(result.body) if isinstance(result, JSONResponse) else jsonable_encoder(result)
+            self._remember(scope, fingerprint, status_code, body)
+            try:
+                await self.db[IDEMPOTENCY_COLLECTION].update_one(
+                    {'_id': scope},
+                    {'$set': {'state': 'done', 'status_code': status_code, 'body': body},
+                     '$unset': {'locked_until': ''}}
+                )
+            except Exception as e:
+                logger.error(f"Idempotency kaydı yazılamadı: {str(e)}")
+            return result
+        finally:
+            self._inflight.pop(scope, None)
+            if not future.done():
+                future.set_result(None)
+
+    def metrics(self) -> dict:
+        return {
+            'replays': self.replays,
+            'executed': self.executed,
+            'cached': len(self._cache),
+            'in_flight': len(self._inflight),
+        }
+
+    # ---- Endpoint dekoratörü ----
+
+    def idempotent(self, endpoint):
+        """
+        Endpoint'in `request: Request` ve `user` parametreleri olmalı.
+        Başlık yoksa endpoint olduğu gibi çalışır.
+        """
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs['request']
+            key = request.headers.get(HEADER)
+            if not key:
+                return await endpoint(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail="Idempotency-Key çok uzun")
+            scope, fingerprint = await _scope(request, kwargs.get('user') or {}, key)
+            return await self.run(scope, fingerprint, lambda: endpoint(*args, **kwargs))
+        return wrapper
+
+
+async def _scope(request: Request, user: dict, key: str) -> Tuple[str, str]:
+    scope = f"{user.get('user_id', '-')}|{request.method}|{request.url.path}|{key}"
+    digest = hashlib.sha256()
+    digest.update(request.url.query.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(await request.body())
+    return scope, digest.hexdigest()
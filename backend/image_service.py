@@ -0,0 +1,195 @@
+# Ürün Görselleri (yerel depolama, arka planda küçük boyut üretimi)
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import uuid
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+FULL = 'full'
+MAX_DIMENSION = 1600
+JPEG_QUALITY = 82
+_IMAGE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Sıkıştırma bombalarına karşı (Pillow bu sınırın 2 katında hata verir)
+MAX_IMAGE_PIXELS = 40_000_000
+
+
+class ImageError(ValueError):
+    pass
+
+
+def _pil():
+    """Pillow ilk görsel işinde yüklenir (worker açılışında ve belleğinde yer tutmaz)"""
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    return Image, ImageOps
+
+
+def _encode(image: 'Image.Image', size: Optional[int]) -> bytes:
+    Image, _ = _pil()
+    if size is not None:
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _normalize(data: bytes) -> 'Image.Image':
+    """Yüklenen dosyayı aç: EXIF yönü uygulanır, saydamlık beyaz zemine basılır"""
+    Image, ImageOps = _pil()
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageError("Görsel okunamadı") from e
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _write(path: Path, data: bytes):
+    # İçerik adresli: aynı yol aynı içeriktir, başka thread/worker yazdıysa tekrar yazılmaz
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Geçici ad çağrı başına benzersiz: aynı süreçteki thread'ler birbirinin dosyasını ezmez
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ProductImageStore:
+    """
+    Görseller içerik özetiyle adlandırılır: <özet>/<boyut>.jpg
+    - Aynı dosya ikinci kez yüklenirse yeniden işlenmez
+    - URL içerikle değiştiğinden dosyalar süresiz önbelleklenebilir (immutable)
+    - Boyutlandırma thread havuzunda yapılır, event loop beklemez
+    - Küçük boyutlar yüklemeden sonra arka planda üretilir; henüz hazır
+      olmayan (ya da silinmiş) bir boyut istenirse o anda üretilir
+    """
+
+    def __init__(self, directory: Path, sizes: Sequence[int] = (128, 256, 512),
+                 max_bytes: int = 5 * 1024 * 1024, workers: int = 2):
+        self.directory = Path(directory)
+        self.sizes = tuple(sorted(sizes))
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[str, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.generated = 0
+
+    @property
+    def variants(self) -> List[str]:
+        return [str(size) for size in self.sizes] + [FULL]
+
+    def is_valid(self, image_id: str, variant: str) -> bool:
+        return bool(_IMAGE_ID.match(image_id)) and variant in self.variants
+
+    def path(self, image_id: str, variant: str) -> Path:
+        return self.directory / image_id[:2] / image_id / f"{variant}.jpg"
+
+    def url(self, image_id: str, variant: str) -> str:
+        return f"/api/images/{image_id}/{variant}"
+
+    # ---- Thread havuzunda çalışanlar ----
+
+    def _store_full(self, image_id: str, data: bytes):
+        path = self.path(image_id, FULL)
+        if path.exists():
+            return
+        image = _normalize(data)
+        _write(path, _encode(image, MAX_DIMENSION))
+
+    def _generate(self, image_id: str):
+        """Eksik küçük boyutları tam boyuttan üret"""
+        missing = [size for size in self.sizes if not self.path(image_id, str(size)).exists()]
+        if not missing:
+            return
+        Image, _ = _pil()
+        with Image.open(self.path(image_id, FULL)) as image:
+            image.load()
+            for size in missing:
+                _write(self.path(image_id, str(size)), _encode(image, size))
+        self.generated += len(missing)
+
+    # ---- Async arayüz ----
+
+    async def save(self, data: bytes) -> str:
+        """Yüklemeyi kaydet, görsel kimliğini döndür (küçük boyutlar kuyruğa alınır)"""
+        if not data:
+            raise ImageError("Görsel boş")
+        if len(data) > self.max_bytes:
+            raise ImageError("Görsel çok büyük")
+        image_id = hashlib.sha256(data).hexdigest()[:32]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._store_full, image_id, data)
+        self._queue.put_nowait(image_id)
+        return image_id
+
+    async def _thumbnails(self, image_id: str):
+        # Aynı görsel için eşzamanlı istekler tek üretimi bekler
+        job = self._jobs.get(image_id)
+        if job is None:
+            loop = asyncio.get_running_loop()
+            job = self._jobs[image_id] = asyncio.ensure_future(
+                loop.run_in_executor(None, self._generate, image_id)
+            )
+            job.add_done_callback(lambda _: self._jobs.pop(image_id, None))
+        await asyncio.shield(job)
+
+    async def ensure(self, image_id: str, variant: str) -> Optional[Path]:
+        """İstenen boyutun yolu; görsel yoksa None"""
+        path = self.path(image_id, variant)
+        if path.exists():
+            return path
+        if variant == FULL or not self.path(image_id, FULL).exists():
+            return None
+        await self._thumbnails(image_id)
+        return path
+
+    async def _run(self):
+        while True:
+            image_id = await self._queue.get()
+            try:
+                await self._thumbnails(image_id)
+            except Exception as e:
+                logger.error(f"Küçük görsel üretme hatası ({image_id}): {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def metrics(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'in_progress': len(self._jobs),
+            'generated': self.generated,
+        }
@@ -0,0 +1,324 @@
+# Kurye Konum Servisi (yüksek frekanslı konum akışı)
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+LOCATION_COLLECTION = 'courier_locations'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """İki nokta arası mesafe (km)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class CourierSpatialGrid:
+    """
+    Kurye son konumları için bellek içi ızgara indeksi.
+    Yakın kurye aramasında sadece çevredeki hücreler taranır.
+    """
+
+    def __init__(self, cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], set] = {}
+        self._positions: Dict[str, tuple] = {}
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def update(self, courier_id: str, lat: float, lng: float, ts: datetime):
+        """Kuryenin konumunu güncelle"""
+        cell = self._cell(lat, lng)
+        old = self._positions.get(courier_id)
+        if old is not None and old[3] != cell:
+            members = self._cells.get(old[3])
+            if members is not None:
+                members.discard(courier_id)
+                if not members:
+                    del self._cells[old[3]]
+        self._cells.setdefault(cell, set()).add(courier_id)
+        self._positions[courier_id] = (lat, lng, ts, cell)
+
+    def remove(self, courier_id: str):
+        """Kuryeyi indeksten çıkar"""
+        old = self._positions.pop(courier_id, None)
+        if old is not None:
+            members = self._cells.get(old[3])
+            if members is not None:
+                members.discard(courier_id)
+                if not members:
+                    del self._cells[old[3]]
+
+    def within(self, lat: float, lng: float, max_km: float,
+               max_age: Optional[timedelta] = None) -> List[Tuple[float, str]]:
+        """Yarıçap içindeki kuryeleri mesafeye göre sıralı döndür: [(km, courier_id)]"""
+        lat_cells = math.ceil(max_km / (KM_PER_DEGREE * self.cell_deg))
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_cells * self.cell_deg, 89.0))), 0.01)
+        lng_cells = math.ceil(max_km / (KM_PER_DEGREE * cos_lat * self.cell_deg))
+        cy, cx = self._cell(lat, lng)
+        oldest = datetime.now(timezone.utc) - max_age if max_age else None
+
+        results = []
+        for iy in range(cy - lat_cells, cy + lat_cells + 1):
+            for ix in range(cx - lng_cells, cx + lng_cells + 1):
+                members = self._cells.get((iy, ix))
+                if not members:
+                    continue
+                for courier_id in members:
+                    c_lat, c_lng, ts, _ = self._positions[courier_id]
+                    if oldest is not None and ts < oldest:
+                        continue
+                    distance = haversine_km(lat, lng, c_lat, c_lng)
+                    if distance <= max_km:
+                        results.append((distance, courier_id))
+        results.sort()
+        return results
+
+
+def _iso(ts: datetime) -> str:
+    # Sabit biçim (UTC, mikrosaniye): last_seen_at karşılaştırmaları metin olarak doğru sıralanır
+    return ts.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+class CourierLocationService:
+    """
+    Kurye konumlarını bellekte tamponlar ve toplu olarak
+    MongoDB time-series koleksiyonuna yazar.
+    - Her istek için ayrı yazma yapılmaz
+    - Son konum her kurye için bellekte tutulur (O(1) okuma)
+    - Konum yazmaları kurye `version` / ETag sayacını artırmaz: her 2 sn'de
+      tüm hareketli kuryeler senkronizasyona ve /couriers önbelleğine düşmez.
+      Canlı konum /admin/couriers/locations ile okunur.
+    - Birden çok worker varken (`single_worker=False`) bellek sadece o worker'a
+      gelen konumları bilir: okumalar Mongo'daki son konumdan ($geoNear) yapılır
+    """
+
+    def __init__(self, db, flush_interval: float = 2.0, max_buffer: int = 5000,
+                 retention_days: int = 30, single_worker: bool = True):
+        self.db = db
+        self.single_worker = single_worker
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention_days = retention_days
+        self.latest: Dict[str, dict] = {}
+        self.grid = CourierSpatialGrid()
+        self._buffer: List[dict] = []
+        self._dirty_couriers: set = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_collection(self):
+        """Time-series koleksiyonunu oluştur (varsa dokunma)"""
+        try:
+            await self.db.create_collection(
+                LOCATION_COLLECTION,
+                timeseries={'timeField': 'ts', 'metaField': 'courier_id', 'granularity': 'seconds'},
+                expireAfterSeconds=self.retention_days * 24 * 3600
+            )
+        except CollectionInvalid:
+            pass
+
+    def add_points(self, courier_id: str, points: List[dict], branch_id: Optional[str] = None) -> int:
+        """Konum noktalarını tampona ekle, son konumu güncelle"""
+        now = datetime.now(timezone.utc)
+        newest = self.latest.get(courier_id)
+        for point in points:
+            ts = point.get('ts') or now
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=timezone.utc)
+            # Cihaz saati ileride olabilir: gelecekteki zaman şimdiye çekilir
+            ts = min(ts.astimezone(timezone.utc), now)
+            doc = {
+                'courier_id': courier_id,
+                'branch_id': branch_id,
+                'ts': ts,
+                'lat': point['lat'],
+                'lng': point['lng'],
+                'accuracy': point.get('accuracy'),
+                'speed': point.get('speed'),
+                'heading': point.get('heading'),
+            }
+            self._buffer.append(doc)
+            if newest is None or ts >= newest['ts']:
+                newest = doc
+
+        if newest is not None:
+            self.latest[courier_id] = newest
+            self.grid.update(courier_id, newest['lat'], newest['lng'], newest['ts'])
+            self._dirty_couriers.add(courier_id)
+
+        # Tampon çok büyüdüyse beklemeden yaz
+        if len(self._buffer) >= self.max_buffer:
+            asyncio.ensure_future(self.flush())
+        return len(points)
+
+    async def get_latest(self, courier_id: Optional[str] = None, branch_id: Optional[str] = None):
+        """Son konum(lar)ı döndür"""
+        if not self.single_worker:
+            return await self._latest_from_db(courier_id, branch_id)
+        if courier_id is not None:
+            return self.latest.get(courier_id)
+        if branch_id is not None:
+            return [point for point in self.latest.values() if point.get('branch_id') == branch_id]
+        return list(self.latest.values())
+
+    async def _latest_from_db(self, courier_id: Optional[str], branch_id: Optional[str]):
+        query = {'last_position': {'$exists': True}}
+        if courier_id is not None:
+            query['id'] = courier_id
+        if branch_id is not None:
+            query['branch_id'] = branch_id
+        docs = await self.db.couriers.find(
+            query, {'_id': 0, 'id': 1, 'branch_id': 1, 'last_position': 1, 'last_seen_at': 1}
+        ).to_list(None)
+        points = [{
+            'courier_id': doc['id'],
+            'branch_id': doc.get('branch_id'),
+            'ts': datetime.fromisoformat(doc['last_seen_at']) if doc.get('last_seen_at') else None,
+            'lat': doc['last_position']['coordinates'][1],
+            'lng': doc['last_position']['coordinates'][0],
+        } for doc in docs]
+        if courier_id is not None:
+            return points[0] if points else None
+        return points
+
+    def forget(self, courier_id: str):
+        """Silinen kuryeyi bellekten çıkar"""
+        self.latest.pop(courier_id, None)
+        self.grid.remove(courier_id)
+
+    async def ensure_indexes(self):
+        """Kurye son konumu için 2dsphere indeksi"""
+        await self.db.couriers.create_index([('last_position', '2dsphere')])
+
+    async def nearest_available(self, lat: float, lng: float, limit: int = 5,
+                                max_km: float = 10.0, max_age_minutes: int = 15,
+                                branch_id: Optional[str] = None) -> List[dict]:
+        """Verilen noktaya en yakın müsait ve onaylı kuryeler"""
+        max_age = timedelta(minutes=max_age_minutes)
+        eligible = {'is_available': True, 'is_approved': True}
+        if branch_id is not None:
+            eligible['branch_id'] = branch_id
+        projection = {'_id': 0, 'last_position': 0}
+
+        if self.single_worker and len(self.grid):
+            candidates = self.grid.within(lat, lng, max_km, max_age)
+            if not candidates:
+                return []
+            # Uygunluk kontrolü adaylar için tek sorguda yapılır
+            ids = [courier_id for _, courier_id in candidates]
+            docs = await self.db.couriers.find(
+                {'id': {'$in': ids}, **eligible}, projection
+            ).to_list(len(ids))
+            by_id = {doc['id']: doc for doc in docs}
+
+            result = []
+            for distance, courier_id in candidates:
+                doc = by_id.get(courier_id)
+                if doc is None:
+                    continue
+                doc['distance_km'] = round(distance, 3)
+                result.append(doc)
+                if len(result) >= limit:
+                    break
+            return result
+
+        # Çok worker'lı çalışmada ya da bu worker'da henüz konum yoksa 2dsphere indeksine düş
+        oldest = datetime.now(timezone.utc) - max_age
+        pipeline = [
+            {'$geoNear': {
+                'near': {'type': 'Point', 'coordinates': [lng, lat]},
+                'distanceField': 'distance_m',
+                'maxDistance': max_km * 1000,
+                'spherical': True,
+                'query': {**eligible, 'last_seen_at': {'$gte': _iso(oldest)}},
+            }},
+            {'$limit': limit},
+            {'$project': projection},
+        ]
+        docs = await self.db.couriers.aggregate(pipeline).to_list(limit)
+        for doc in docs:
+            doc['distance_km'] = round(doc.pop('distance_m') / 1000, 3)
+        return docs
+
+    async def flush(self):
+        """Tamponu toplu olarak veritabanına yaz"""
+        async with self._flush_lock:
+            if not self._buffer and not self._dirty_couriers:
+                return
+            batch, self._buffer = self._buffer, []
+            dirty, self._dirty_couriers = self._dirty_couriers, set()
+
+            if batch:
+                try:
+                    # Kopya yazılır: insert_many `_id` ekler, `latest` aynı dokümanları tutuyor
+                    await self.db[LOCATION_COLLECTION].insert_many([dict(p) for p in batch], ordered=False)
+                except BulkWriteError as e:
+                    # ordered=False: yazılanlar kalır, yalnızca hata alan noktalar tekrar denenir
+                    failed = {err['index'] for err in e.details.get('writeErrors', [])}
+                    logger.error(f"Konum yazma hatası: {len(failed)}/{len(batch)} nokta yazılamadı")
+                    retry = [p for i, p in enumerate(batch) if i in failed]
+                    self._buffer = (retry + self._buffer)[-self.max_buffer * 4:]
+                except Exception as e:
+                    # Yazılamayan noktaları kaybetme, bir sonraki turda tekrar dene
+                    logger.error(f"Konum yazma hatası: {str(e)}")
+                    self._buffer = (batch + self._buffer)[-self.max_buffer * 4:]
+
+            if dirty:
+                try:
+                    await self._write_positions(dirty)
+                except Exception as e:
+                    logger.error(f"Kurye konum güncelleme hatası: {str(e)}")
+                    self._dirty_couriers |= dirty
+
+    async def _write_positions(self, dirty: set):
+        """Kurye kaydındaki son konumu tek bir bulk write ile güncelle"""
+        updates = []
+        for courier_id in dirty:
+            point = self.latest.get(courier_id)
+            if not point:
+                continue
+            fields = {
+                'current_location': f"{point['lat']:.6f},{point['lng']:.6f}",
+                'last_position': {'type': 'Point', 'coordinates': [point['lng'], point['lat']]},
+                'last_seen_at': _iso(point['ts']),
+            }
+            updates.append(UpdateOne({'id': courier_id}, {'$set': fields}))
+        if updates:
+            await self.db.couriers.bulk_write(updates, ordered=False)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Periyodik yazma görevini başlat"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Görevi durdur ve kalanları yaz"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,279 @@
+# Sipariş Olay Günlüğü (sadece ekleme; toplu yazma, anlık görüntü sıkıştırma, süre metrikleri)
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = 'order_events'
+SNAPSHOTS_COLLECTION = 'order_snapshots'
+
+# Olaylardan çıkarılan zaman noktaları (her biri ilk gerçekleştiği an)
+MILESTONES = ('created_at', 'preparing_at', 'ready_at', 'assigned_at', 'delivered_at', 'cancelled_at')
+STATUS_MILESTONES = {
+    'pending': 'created_at',
+    'preparing': 'preparing_at',
+    'ready': 'ready_at',
+    'delivered': 'delivered_at',
+    'cancelled': 'cancelled_at',
+}
+
+
+def _milestone(event: dict) -> Optional[str]:
+    if event['type'] == 'created':
+        return 'created_at'
+    if event['type'] == 'assigned':
+        return 'assigned_at'
+    return STATUS_MILESTONES.get(event.get('status'))
+
+
+def _fold(timeline: dict, milestone: Optional[str], ts: datetime, courier_id: Optional[str]):
+    """Zaman çizelgesine olayı işle (her noktanın en erken anı tutulur)"""
+    if milestone is not None and (timeline.get(milestone) is None or ts < timeline[milestone]):
+        timeline[milestone] = ts
+    if courier_id:
+        timeline['courier_id'] = courier_id
+
+
+class _Stat:
+    """Akan değerler için sayaç (değerler bellekte tutulmaz)"""
+
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        if not self.count:
+            return {'count': 0, 'avg_minutes': None, 'min_minutes': None, 'max_minutes': None}
+        return {
+            'count': self.count,
+            'avg_minutes': round(self.total / self.count / 60, 2),
+            'min_minutes': round(self.min / 60, 2),
+            'max_minutes': round(self.max / 60, 2),
+        }
+
+
+class OrderEventLog:
+    """
+    Sipariş durum değişiklikleri için sadece eklenen olay günlüğü.
+    - `record` belleğe ekler; olaylar periyodik olarak tek insert_many ile yazılır
+      (orders dokümanına geçmiş dizisi eklenmez, sıcak doküman küçük kalır)
+    - `compact_after` süresinden eski olaylar sipariş başına tek bir anlık görüntüye
+      (zaman noktaları) katlanır ve ham olaylar silinir
+    - Metrikler olaylar ve anlık görüntüler üzerinde cursor ile akarak hesaplanır
+    """
+
+    def __init__(self, db, flush_interval: float = 1.0, max_buffer: int = 1000,
+                 compact_after_days: int = 7, compact_interval: float = 3600.0,
+                 compact_batch: int = 5000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.compact_after = timedelta(days=compact_after_days)
+        self.compact_interval = compact_interval
+        self.compact_batch = compact_batch
+        self._buffer: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._compact_task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db[EVENTS_COLLECTION].create_index([('branch_id', 1), ('ts', 1)])
+        await self.db[EVENTS_COLLECTION].create_index([('order_id', 1), ('ts', 1)])
+        await self.db[EVENTS_COLLECTION].create_index('ts')
+        await self.db[SNAPSHOTS_COLLECTION].create_index('order_id', unique=True)
+        await self.db[SNAPSHOTS_COLLECTION].create_index([('branch_id', 1), ('created_at', 1)])
+
+    def record(self, order_id: str, branch_id: str, type: str, status: Optional[str] = None,
+               courier_id: Optional[str] = None, user_id: Optional[str] = None,
+               version: Optional[int] = None, previous_status: Optional[str] = None):
+        """Olayı tampona ekle (yazma beklenmez)"""
+        self._buffer.append({
+            'order_id': order_id,
+            'branch_id': branch_id,
+            'type': type,
+            'status': status,
+            'previous_status': previous_status,
+            'courier_id': courier_id,
+            'user_id': user_id,
+            'version': version,
+            'ts': datetime.now(timezone.utc),
+        })
+        # Tampon çok büyüdüyse beklemeden yaz
+        if len(self._buffer) >= self.max_buffer:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Tamponu toplu olarak yaz"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            try:
+                # Kopya yazılır: insert_many `_id` ekler, tekrar denenen olay çakışmamalı
+                await self.db[EVENTS_COLLECTION].insert_many([dict(event) for event in batch], ordered=False)
+            except BulkWriteError as e:
+                # Yazılanlar ve zaten var olanlar (11000) tekrar denenmez
+                failed = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000}
+                logger.error(f"Sipariş olayı yazma hatası: {len(failed)}/{len(batch)} olay yazılamadı")
+                retry = [event for i, event in enumerate(batch) if i in failed]
+                self._buffer = (retry + self._buffer)[-self.max_buffer * 10:]
+            except Exception as e:
+                # Yazılamayan olayları kaybetme, bir sonraki turda tekrar dene
+                logger.error(f"Sipariş olayı yazma hatası: {str(e)}")
+                self._buffer = (batch + self._buffer)[-self.max_buffer * 10:]
+
+    async def history(self, order_id: str, branch_id: str) -> dict:
+        """Siparişin anlık görüntüsü + sonraki ham olaylar"""
+        await self.flush()
+        snapshot = await self.db[SNAPSHOTS_COLLECTION].find_one(
+            {'order_id': order_id, 'branch_id': branch_id}, {'_id': 0}
+        )
+        events = await self.db[EVENTS_COLLECTION].find(
+            {'order_id': order_id, 'branch_id': branch_id}, {'_id': 0}
+        ).sort('ts', 1).to_list(1000)
+        return {'snapshot': snapshot, 'events': events}
+
+    # ---- Sıkıştırma ----
+
+    async def compact(self, before: Optional[datetime] = None) -> int:
+        """
+        `before` öncesindeki olayları sipariş başına anlık görüntüye katla ve sil.
+        Noktalar $min ile birleşir: aynı olayı iki worker işlese de sonuç değişmez.
+        """
+        cutoff = before or datetime.now(timezone.utc) - self.compact_after
+        compacted = 0
+        while True:
+            events = await self.db[EVENTS_COLLECTION].find(
+                {'ts': {'$lt': cutoff}}
+            ).sort('ts', 1).limit(self.compact_batch).to_list(self.compact_batch)
+            if not events:
+                return compacted
+
+            timelines: Dict[str, dict] = {}
+            for event in events:
+                timeline = timelines.setdefault(event['order_id'], {'branch_id': event['branch_id']})
+                _fold(timeline, _milestone(event), event['ts'], event.get('courier_id'))
+                timeline['last_status'] = event.get('status') or timeline.get('last_status')
+
+            updates = []
+            for order_id, timeline in timelines.items():
+                update = {
+                    '$setOnInsert': {'order_id': order_id, 'branch_id': timeline['branch_id']},
+                    '$max': {'compacted_until': events[-1]['ts']},
+                }
+                points = {m: timeline[m] for m in MILESTONES if timeline.get(m) is not None}
+                if points:
+                    update['$min'] = points
+                fields = {k: timeline[k] for k in ('courier_id', 'last_status') if timeline.get(k)}
+                if fields:
+                    update['$set'] = fields
+                updates.append(UpdateOne({'order_id': order_id}, update, upsert=True))
+            await self.db[SNAPSHOTS_COLLECTION].bulk_write(updates, ordered=False)
+            await self.db[EVENTS_COLLECTION].delete_many({'_id': {'$in': [event['_id'] for event in events]}})
+            compacted += len(events)
+            if len(events) < self.compact_batch:
+                return compacted
+
+    # ---- Metrikler ----
+
+    async def duration_metrics(self, start: datetime, end: datetime, branch_id: str) -> dict:
+        """
+        Hazırlık (oluşturma -> hazır), kurye teslim (alma -> teslim) ve toplam
+        (oluşturma -> teslim) süreleri. Olaylar cursor ile okunur; sipariş başına
+        sadece zaman noktaları tutulur.
+        """
+        await self.flush()
+        timelines: Dict[str, dict] = {}
+
+        async for snapshot in self.db[SNAPSHOTS_COLLECTION].find(
+            {'branch_id': branch_id, 'created_at': {'$gte': start, '$lt': end}}, {'_id': 0}
+        ):
+            timelines[snapshot['order_id']] = {k: snapshot.get(k) for k in MILESTONES + ('courier_id',)}
+
+        async for event in self.db[EVENTS_COLLECTION].find(
+            {'branch_id': branch_id, 'ts': {'$gte': start, '$lt': end}},
+            {'_id': 0, 'order_id': 1, 'type': 1, 'status': 1, 'courier_id': 1, 'ts': 1}
+        ).sort('ts', 1).batch_size(1000):
+            timeline = timelines.setdefault(event['order_id'], {})
+            _fold(timeline, _milestone(event), event['ts'], event.get('courier_id'))
+
+        prep = _Stat()
+        total = _Stat()
+        couriers: Dict[str, Dict[str, _Stat]] = {}
+        for timeline in timelines.values():
+            created = timeline.get('created_at')
+            if created is None:
+                continue  # Aralıktan önce açılmış sipariş
+            if timeline.get('ready_at'):
+                prep.add((timeline['ready_at'] - created).total_seconds())
+            delivered = timeline.get('delivered_at')
+            if delivered:
+                total.add((delivered - created).total_seconds())
+                courier_id = timeline.get('courier_id')
+                if courier_id and timeline.get('assigned_at'):
+                    stats = couriers.setdefault(courier_id, {'deliver': _Stat(), 'total': _Stat()})
+                    stats['deliver'].add((delivered - timeline['assigned_at']).total_seconds())
+                    stats['total'].add((delivered - created).total_seconds())
+
+        return {
+            'orders': len(timelines),
+            'time_to_ready': prep.as_dict(),
+            'time_to_deliver': total.as_dict(),
+            'couriers': [
+                {'courier_id': courier_id,
+                 'time_to_deliver': stats['deliver'].as_dict(),
+                 'order_to_door': stats['total'].as_dict()}
+                for courier_id, stats in sorted(couriers.items())
+            ],
+        }
+
+    # ---- Arka plan görevleri ----
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _run_compaction(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                count = await self.compact()
+                if count:
+                    logger.info(f"Sipariş olayları sıkıştırıldı: {count}")
+            except Exception as e:
+                logger.error(f"Sipariş olayı sıkıştırma hatası: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if self._compact_task is None and self.compact_interval > 0:
+            self._compact_task = asyncio.create_task(self._run_compaction())
+
+    async def stop(self):
+        """Görevleri durdur ve kalanları yaz"""
+        for task in (self._task, self._compact_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._compact_task = None
+        await self.flush()
@@ -0,0 +1,170 @@
+# Sipariş Arama (sipariş no, telefon öneki, müşteri adı, not metni; indeksli + sayfalı)
+import base64
+import json
+import re
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from text_utils import fold_text, normalize_phone, normalize_phone_prefix
+
+MIN_QUERY_LENGTH = 3
+# Telefon öneki (alan kodu hariç) en az 7 rakam: 10 haneli numarada öneke en fazla
+# 1000 numara uyar. Kısa önekte ("532") şubenin o operatördeki tüm siparişleri
+# indeksten okunup created_at'e göre bellekte sıralanır (SORT aşaması)
+MIN_PHONE_PREFIX = 7
+TEXT_INDEX_NAME = 'order_search_text'
+
+# Liste için yeterli alanlar (kalemler dönmez)
+SUMMARY_PROJECTION = {
+    '_id': 0, 'id': 1, 'order_number': 1, 'status': 1, 'order_type': 1, 'table_name': 1,
+    'customer_name': 1, 'customer_phone': 1, 'courier_name': 1, 'notes': 1,
+    'total_amount': 1, 'grand_total': 1, 'created_at': 1,
+}
+
+
+def search_fields(order: dict) -> dict:
+    """
+    Siparişe yazılan arama alanları (oluşturma ve backfill'de aynı).
+    Siparişin müşteri adı, telefonu ve notu sadece oluşturulurken yazılır, sonra
+    değişmez; bu alanları güncelleyen bir uç eklenirse aynı `$set` içinde
+    search_fields() sonucu da yazılmalıdır.
+    """
+    return {
+        'customer_phone_normalized': normalize_phone(order.get('customer_phone')),
+        'customer_name_normalized': fold_text(order.get('customer_name')),
+        'notes_normalized': fold_text(order.get('notes')),
+    }
+
+
+def _encode_cursor(value: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Geçersiz sayfa imleci")
+    if not isinstance(value, dict):
+        raise ValueError("Geçersiz sayfa imleci")
+    return value
+
+
+class OrderSearch:
+    """
+    - Sipariş no: tam eşleşme, (branch_id, order_number) indeksi
+    - Telefon: normalize edilmiş alanda çapalı önek (en az MIN_PHONE_PREFIX rakam),
+      (branch_id, telefon, created_at, id) indeksinde sınırlı aralık taraması
+    - Müşteri adı: normalize edilmiş adda çapalı önek
+    - Metin (`q`): ad + not kelimelerinde text indeksi (şube önekli), alaka sırasıyla
+    Metin dışı aramalar created_at + id ile sayfalanır (skip yok);
+    metin araması alaka puanına göre sıralandığından ofset ile sayfalanır.
+    """
+
+    def __init__(self, db, max_text_offset: int = 500):
+        self.db = db
+        self.max_text_offset = max_text_offset
+
+    async def ensure_indexes(self):
+        await self.db.orders.create_index(
+            [('branch_id', 1), ('customer_phone_normalized', 1), ('created_at', -1), ('id', -1)],
+            partialFilterExpression={'customer_phone_normalized': {'$type': 'string'}}
+        )
+        await self.db.orders.create_index(
+            [('branch_id', 1), ('customer_name_normalized', 1), ('created_at', -1), ('id', -1)],
+            partialFilterExpression={'customer_name_normalized': {'$gt': ''}}
+        )
+        # Alanlar zaten katlanmış: dil kuralı (kök bulma / durak kelime) uygulanmaz
+        await self.db.orders.create_index(
+            [('branch_id', 1), ('customer_name_normalized', 'text'), ('notes_normalized', 'text')],
+            name=TEXT_INDEX_NAME,
+            weights={'customer_name_normalized': 5, 'notes_normalized': 1},
+            default_language='none'
+        )
+
+    async def search(self, branch_id: str, number: Optional[str] = None, phone: Optional[str] = None,
+                     name: Optional[str] = None, q: Optional[str] = None, status: Optional[str] = None,
+                     limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """{'items': [...], 'next_cursor': str | None}; kriterler birlikte verilirse VE"""
+        query: dict = {'branch_id': branch_id}
+        if status:
+            query['status'] = status
+        if number:
+            query['order_number'] = number.strip().upper()
+        if phone:
+            prefix = normalize_phone_prefix(phone)
+            if len(prefix) < MIN_PHONE_PREFIX:
+                raise ValueError(f"Telefon için en az {MIN_PHONE_PREFIX} rakam girin")
+            query['customer_phone_normalized'] = {'$regex': f'^{re.escape(prefix)}'}
+        if name:
+            folded = fold_text(name)
+            if len(folded) < MIN_QUERY_LENGTH:
+                raise ValueError(f"İsim için en az {MIN_QUERY_LENGTH} harf girin")
+            query['customer_name_normalized'] = {'$regex': f'^{re.escape(folded)}'}
+        text = fold_text(q)
+        if q is not None and len(text) < MIN_QUERY_LENGTH:
+            raise ValueError(f"Arama için en az {MIN_QUERY_LENGTH} harf girin")
+        if not (number or phone or name or text):
+            raise ValueError("Sipariş no, telefon, isim ya da arama metni gerekli")
+
+        position = _decode_cursor(cursor) if cursor else {}
+        if text:
+            return await self._search_text(query, text, limit, int(position.get('offset', 0)))
+        return await self._search_recent(query, limit, position)
+
+    async def _search_recent(self, query: dict, limit: int, position: dict) -> dict:
+        if position:
+            # Keyset: bir önceki sayfanın son siparişinden eskiler
+            query = {**query, '$or': [
+                {'created_at': {'$lt': position.get('created_at')}},
+                {'created_at': position.get('created_at'), 'id': {'$lt': position.get('id')}},
+            ]}
+        items = await self.db.orders.find(query, SUMMARY_PROJECTION).sort(
+            [('created_at', -1), ('id', -1)]
+        ).limit(limit + 1).to_list(limit + 1)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = _encode_cursor({'created_at': last['created_at'], 'id': last['id']})
+        return {'items': items, 'next_cursor': next_cursor}
+
+    async def _search_text(self, query: dict, text: str, limit: int, offset: int) -> dict:
+        if offset > self.max_text_offset:
+            raise ValueError("Daha fazla sonuç için aramayı daraltın")
+        projection = {**SUMMARY_PROJECTION, 'score': {'$meta': 'textScore'}}
+        items = await self.db.orders.find({**query, '$text': {'$search': text}}, projection).sort(
+            [('score', {'$meta': 'textScore'}), ('created_at', -1)]
+        ).skip(offset).limit(limit + 1).to_list(limit + 1)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = _encode_cursor({'offset': offset + limit})
+        for item in items:
+            item.pop('score', None)
+        return {'items': items, 'next_cursor': next_cursor}
+
+    async def backfill(self, batch_size: int = 1000) -> int:
+        """
+        Arama alanları olmayan eski siparişleri doldur (version değişmez:
+        istemci senkronizasyonu tetiklenmez). Tekrar çalıştırılabilir.
+        """
+        updated = 0
+        last_id = None
+        while True:
+            # _id sırasıyla ilerlenir: doldurulmuş dokümanlar tekrar taranmaz
+            query = {'notes_normalized': {'$exists': False}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            orders = await self.db.orders.find(
+                query, {'_id': 1, 'customer_phone': 1, 'customer_name': 1, 'notes': 1}
+            ).sort('_id', 1).limit(batch_size).to_list(batch_size)
+            if not orders:
+                return updated
+            await self.db.orders.bulk_write(
+                [UpdateOne({'_id': order['_id']}, {'$set': search_fields(order)}) for order in orders],
+                ordered=False
+            )
+            updated += len(orders)
+            last_id = orders[-1]['_id']
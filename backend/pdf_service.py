@@ -1,24 +1,104 @@
-# PDF Fiş Oluşturma Servisi (2 Tip: Paket & İçeride/Gel-Al)
+# PDF Fiş Oluşturma Servisi (2 Tip: Paket & İçeride/Gel-Al, A4 veya 80 mm termal)
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.units import cm, mm
+from reportlab.platypus import (
+    SimpleDocTemplate, BaseDocTemplate, PageTemplate, Frame, NextPageTemplate,
+    Table, TableStyle, Paragraph, Spacer, PageBreak
+)
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+from collections import OrderedDict
 from io import BytesIO
 from datetime import datetime
+from struct import pack
 from typing import Dict, List
+from xml.sax.saxutils import escape
 import os
+import threading
+
+# İkili akışlar ASCII85 ile kodlanmasın (%25 daha büyük çıktı; fişler indirilip basılıyor)
+rl_config.useA85 = 0
+
+LAYOUTS = ('a4', 'thermal')
+THERMAL_WIDTH = 80 * mm
+THERMAL_MARGIN = 3 * mm
+
+ORDER_TYPE_LABELS = {
+    'takeaway': 'PAKET SİPARİŞİ',
+    'dine-in': 'İÇERİDE',
+    'delivery': 'GEL-AL',
+}
+
+
+def _name_table(face: TTFontFace) -> bytes:
+    """Sadece aile / stil / tam ad / PostScript adı içeren küçük 'name' tablosu"""
+    names = [
+        (1, face.familyName), (2, face.styleName), (3, face.name),
+        (4, face.fullName), (6, face.name),
+    ]
+    records = b''
+    strings = b''
+    for name_id, value in names:
+        encoded = value.decode('latin-1').encode('utf-16-be')
+        records += pack('>6H', 3, 1, 0x409, name_id, len(encoded), len(strings))
+        strings += encoded
+    return pack('>3H', 0, len(names), 6 + len(records)) + records + strings
+
+
+class SubsetFontFace(TTFontFace):
+    """
+    Fiş fontu:
+    - Gömülen alt küme glif kümesi başına önbellekte tutulur (aynı karakterlerle tekrar kurulmaz)
+    - Orijinal fontun ~15 KB'lık 'name' tablosu her alt kümeye kopyalanmaz
+    - Font dosyası okuyucusu konum durumu tuttuğu için alt küme oluşturma kilitli
+    """
+
+    def __init__(self, filename, cache_size: int = 256):
+        self._compact_name = None
+        super().__init__(filename)
+        self._compact_name = _name_table(self)
+        self._subsets: OrderedDict = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def get_table(self, tag):
+        if tag == 'name' and self._compact_name is not None:
+            return self._compact_name
+        return super().get_table(tag)
+
+    def makeSubset(self, subset):
+        key = tuple(subset)
+        with self._lock:
+            data = self._subsets.get(key)
+            if data is None:
+                data = super().makeSubset(subset)
+                self._subsets[key] = data
+                if len(self._subsets) > self._cache_size:
+                    self._subsets.popitem(last=False)
+            else:
+                self._subsets.move_to_end(key)
+            return data
+
+
+class SubsetTTFont(TTFont):
+    """Sadece kullanılan glifleri gömer (ASCII aralığı önceden ayrılmaz)"""
+
+    def __init__(self, name, filename):
+        super().__init__(name, filename, asciiReadable=False)
+        self.face = SubsetFontFace(filename)
+
 
 # Türkçe karakter desteği için font kaydet
 try:
     # DejaVu Sans font (Türkçe karakterleri destekler)
     font_path = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
     if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-        pdfmetrics.registerFont(TTFont('DejaVu-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
+        pdfmetrics.registerFont(SubsetTTFont('DejaVu', font_path))
+        pdfmetrics.registerFont(SubsetTTFont('DejaVu-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
         FONT_NAME = 'DejaVu'
         FONT_BOLD = 'DejaVu-Bold'
     else:
@@ -54,24 +134,221 @@ class PDFReceiptService:
             fontSize=10,
             fontName=FONT_NAME
         ))
+        
+        self.styles.add(ParagraphStyle(
+            name='Footer',
+            parent=self.styles['Normal'],
+            alignment=TA_CENTER,
+            fontSize=9,
+            fontName=FONT_NAME
+        ))
+        
+        # Termal (80 mm) düzen
+        self.styles.add(ParagraphStyle(
+            name='ThermalTitle',
+            parent=self.styles['Normal'],
+            alignment=TA_CENTER,
+            fontSize=11,
+            leading=14,
+            fontName=FONT_BOLD
+        ))
+        
+        self.styles.add(ParagraphStyle(
+            name='ThermalCenter',
+            parent=self.styles['Normal'],
+            alignment=TA_CENTER,
+            fontSize=8,
+            leading=10,
+            fontName=FONT_NAME
+        ))
+        
+        self.styles.add(ParagraphStyle(
+            name='ThermalText',
+            parent=self.styles['Normal'],
+            fontSize=8,
+            leading=10,
+            fontName=FONT_NAME
+        ))
+    
+    def _item_rows(self, order_data: Dict) -> List[list]:
+        """Ürün satırları (satır toplamı siparişte kayıtlıysa o kullanılır)"""
+        rows = []
+        for item in order_data.get('items', []):
+            quantity = item.get('quantity', 0)
+            price = item.get('price', 0)
+            line_total = item.get('line_total')
+            if line_total is None:
+                line_total = quantity * price
+            
+            rows.append([
+                item.get('product_name', 'Ürün'),
+                str(quantity),
+                f"{price:.2f} TL",
+                f"{line_total:.2f} TL"
+            ])
+        return rows
     
-    def generate_receipt(self, order_data: Dict) -> bytes:
+    def _totals(self, order_data: Dict):
+        """Ara toplam, KDV ve genel toplam (sipariş oluşturulurken hesaplanıp kaydedilir)"""
+        if order_data.get('grand_total') is not None:
+            return order_data['total_amount'], order_data['tax_amount'], order_data['grand_total']
+        
+        # Eski siparişler: toplamlar kayıtlı değil
+        total = sum(item.get('quantity', 0) * item.get('price', 0) for item in order_data.get('items', []))
+        return total, total * 0.10, total * 1.10
+    
+    def generate_receipt(self, order_data: Dict, layout: str = 'a4') -> bytes:
         """
         Sipariş tipine göre uygun fişi oluşturur
         - Paket: Müşteri adresi + telefon
         - İçeride/Gel-Al: Standart fiş
+        - layout='thermal': 80 mm genişlikte, içerik boyunda tek sayfa
         """
+        if layout == 'thermal':
+            return self._build_thermal([self._thermal_story(order_data)])
+        return self._build(self._receipt_story(order_data))
+    
+    def generate_receipts(self, orders: List[Dict], layout: str = 'a4') -> bytes:
+        """
+        Birden çok fişi tek PDF'te, her sipariş ayrı sayfada oluşturur.
+        Fontlar ve stiller bir kez gömülür; doküman kurulumu tek sefer yapılır.
+        """
+        if layout == 'thermal':
+            return self._build_thermal([self._thermal_story(order_data) for order_data in orders])
+        story = []
+        for index, order_data in enumerate(orders):
+            if index:
+                story.append(PageBreak())
+            story.extend(self._receipt_story(order_data))
+        return self._build(story)
+    
+    def _build(self, story: list) -> bytes:
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*cm, bottomMargin=1*cm)
+        doc.build(story)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        
+        return pdf_bytes
+    
+    def _build_thermal(self, stories: List[list]) -> bytes:
+        """Her fiş kendi yüksekliğinde bir sayfa (rulo kağıt boşa gitmez)"""
+        buffer = BytesIO()
+        width = THERMAL_WIDTH - 2 * THERMAL_MARGIN
+        templates = []
+        flowables = []
+        for index, story in enumerate(stories):
+            height = sum(
+                flowable.wrap(width, 10000)[1] + flowable.getSpaceBefore() + flowable.getSpaceAfter()
+                for flowable in story
+            ) + 2 * mm
+            frame = Frame(THERMAL_MARGIN, THERMAL_MARGIN, width, height,
+                          leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+            templates.append(PageTemplate(
+                id=f'fis{index}', frames=[frame],
+                pagesize=(THERMAL_WIDTH, height + 2 * THERMAL_MARGIN)
+            ))
+            if index:
+                flowables.extend([NextPageTemplate(f'fis{index}'), PageBreak()])
+            flowables.extend(story)
+        
+        doc = BaseDocTemplate(buffer, pagesize=templates[0].pagesize, pageTemplates=templates)
+        doc.build(flowables)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        
+        return pdf_bytes
+    
+    def _thermal_story(self, order_data: Dict) -> list:
+        """80 mm termal yazıcı düzeni (tek renk, dar sütunlar)"""
+        width = THERMAL_WIDTH - 2 * THERMAL_MARGIN
+        text = self.styles['ThermalText']
         order_type = order_data.get('order_type', 'dine-in')
+        story = [
+            Paragraph("<b>ANADOLU BT</b>", self.styles['ThermalTitle']),
+            Paragraph(ORDER_TYPE_LABELS.get(order_type, 'N/A'), self.styles['ThermalCenter']),
+            Spacer(1, 2*mm),
+        ]
         
+        order_info = [
+            ['Fiş No:', order_data.get('order_number', 'N/A')],
+            ['Tarih:', datetime.fromisoformat(order_data.get('created_at', datetime.now().isoformat())).strftime('%d.%m.%Y %H:%M')],
+        ]
         if order_type == 'takeaway':
-            return self._generate_package_receipt(order_data)
-        else:
-            return self._generate_standard_receipt(order_data)
+            order_info.append(['Müşteri:', Paragraph(escape(order_data.get('customer_name') or 'Belirtilmemiş'), text)])
+            order_info.append(['Telefon:', order_data.get('customer_phone') or 'Belirtilmemiş'])
+            order_info.append(['Adres:', Paragraph(escape(order_data.get('customer_address') or 'Belirtilmemiş'), text)])
+        elif order_data.get('table_name'):
+            order_info.append(['Masa:', order_data['table_name']])
+        if order_data.get('courier_name'):
+            order_info.append(['Kurye:', order_data['courier_name']])
+        
+        info_table = Table(order_info, colWidths=[16*mm, width - 16*mm])
+        info_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('FONTNAME', (0, 0), (0, -1), FONT_BOLD),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ]))
+        story.append(info_table)
+        story.append(Spacer(1, 2*mm))
+        
+        # Ürün Listesi (birim fiyat yerine sadece satır toplamı)
+        items_data = [['Ürün', 'Adet', 'Toplam']] + [
+            [Paragraph(escape(name), text), quantity, line_total]
+            for name, quantity, _, line_total in self._item_rows(order_data)
+        ]
+        items_table = Table(items_data, colWidths=[width - 30*mm, 9*mm, 21*mm], repeatRows=1)
+        items_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('FONTNAME', (0, 1), (-1, -1), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ]))
+        story.append(items_table)
+        story.append(Spacer(1, 2*mm))
+        
+        subtotal, tax_amount, grand_total = self._totals(order_data)
+        total_table = Table([
+            ['Ara Toplam:', f"{subtotal:.2f} TL"],
+            ['KDV (%10):', f"{tax_amount:.2f} TL"],
+            ['TOPLAM:', f"{grand_total:.2f} TL"],
+        ], colWidths=[width - 25*mm, 25*mm])
+        total_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -2), FONT_NAME),
+            ('FONTNAME', (0, -1), (-1, -1), FONT_BOLD),
+            ('FONTSIZE', (0, 0), (-1, -2), 8),
+            ('FONTSIZE', (0, -1), (-1, -1), 10),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.black),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ]))
+        story.append(total_table)
+        story.append(Spacer(1, 3*mm))
+        story.append(Paragraph("Afiyet olsun!", self.styles['ThermalCenter']))
+        
+        return story
     
-    def _generate_package_receipt(self, order_data: Dict) -> bytes:
+    def _receipt_story(self, order_data: Dict) -> list:
+        if order_data.get('order_type', 'dine-in') == 'takeaway':
+            return self._package_story(order_data)
+        return self._standard_story(order_data)
+    
+    def _package_story(self, order_data: Dict) -> list:
         """PAKET siparişi için fiş (Müşteri bilgileri ile)"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*cm, bottomMargin=1*cm)
         story = []
         
         # Başlık
@@ -110,21 +387,7 @@ class PDFReceiptService:
         story.append(Spacer(1, 0.7*cm))
         
         # Ürün Listesi
-        items_data = [['Ürün', 'Adet', 'Fiyat', 'Toplam']]
-        
-        total = 0
-        for item in order_data.get('items', []):
-            quantity = item.get('quantity', 0)
-            price = item.get('price', 0)
-            subtotal = quantity * price
-            total += subtotal
-            
-            items_data.append([
-                item.get('product_name', 'Ürün'),
-                str(quantity),
-                f"{price:.2f} TL",
-                f"{subtotal:.2f} TL"
-            ])
+        items_data = [['Ürün', 'Adet', 'Fiyat', 'Toplam']] + self._item_rows(order_data)
         
         items_table = Table(items_data, colWidths=[8*cm, 2*cm, 3*cm, 3*cm])
         items_table.setStyle(TableStyle([
@@ -143,10 +406,11 @@ class PDFReceiptService:
         story.append(Spacer(1, 0.5*cm))
         
         # Toplam
+        subtotal, tax_amount, grand_total = self._totals(order_data)
         total_data = [
-            ['Ara Toplam:', f"{total:.2f} TL"],
-            ['KDV (%10):', f"{total * 0.10:.2f} TL"],
-            ['GENEL TOPLAM:', f"{total * 1.10:.2f} TL"],
+            ['Ara Toplam:', f"{subtotal:.2f} TL"],
+            ['KDV (%10):', f"{tax_amount:.2f} TL"],
+            ['GENEL TOPLAM:', f"{grand_total:.2f} TL"],
         ]
         
         total_table = Table(total_data, colWidths=[13*cm, 3*cm])
@@ -162,27 +426,13 @@ class PDFReceiptService:
         story.append(Spacer(1, 1*cm))
         
         # Alt bilgi
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=self.styles['Normal'],
-            alignment=TA_CENTER,
-            fontSize=9,
-            fontName=FONT_NAME
-        )
-        footer = Paragraph("<i>Afiyet olsun! Bizi tercih ettiğiniz için teşekkür ederiz.</i><br/><b>Powered by Anadolu BT</b>", footer_style)
+        footer = Paragraph("<i>Afiyet olsun! Bizi tercih ettiğiniz için teşekkür ederiz.</i><br/><b>Powered by Anadolu BT</b>", self.styles['Footer'])
         story.append(footer)
         
-        # PDF oluştur
-        doc.build(story)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        
-        return pdf_bytes
+        return story
     
-    def _generate_standard_receipt(self, order_data: Dict) -> bytes:
+    def _standard_story(self, order_data: Dict) -> list:
         """İÇERİDE ve GEL-AL siparişleri için standart fiş"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*cm, bottomMargin=1*cm)
         story = []
         
         # Başlık
@@ -191,15 +441,10 @@ class PDFReceiptService:
         story.append(Spacer(1, 0.5*cm))
         
         # Sipariş Bilgileri
-        order_type_map = {
-            'dine-in': 'İÇERİDE',
-            'delivery': 'GEL-AL'
-        }
-        
         order_info = [
             ['Fiş No:', order_data.get('order_number', 'N/A')],
             ['Tarih:', datetime.fromisoformat(order_data.get('created_at', datetime.now().isoformat())).strftime('%d.%m.%Y %H:%M')],
-            ['Sipariş Tipi:', order_type_map.get(order_data.get('order_type'), 'N/A')],
+            ['Sipariş Tipi:', ORDER_TYPE_LABELS.get(order_data.get('order_type'), 'N/A')],
         ]
         
         if order_data.get('table_name'):
@@ -216,21 +461,7 @@ class PDFReceiptService:
         story.append(Spacer(1, 0.7*cm))
         
         # Ürün Listesi
-        items_data = [['Ürün', 'Adet', 'Fiyat', 'Toplam']]
-        
-        total = 0
-        for item in order_data.get('items', []):
-            quantity = item.get('quantity', 0)
-            price = item.get('price', 0)
-            subtotal = quantity * price
-            total += subtotal
-            
-            items_data.append([
-                item.get('product_name', 'Ürün'),
-                str(quantity),
-                f"{price:.2f} TL",
-                f"{subtotal:.2f} TL"
-            ])
+        items_data = [['Ürün', 'Adet', 'Fiyat', 'Toplam']] + self._item_rows(order_data)
         
         items_table = Table(items_data, colWidths=[8*cm, 2*cm, 3*cm, 3*cm])
         items_table.setStyle(TableStyle([
@@ -249,10 +480,11 @@ class PDFReceiptService:
         story.append(Spacer(1, 0.5*cm))
         
         # Toplam
+        subtotal, tax_amount, grand_total = self._totals(order_data)
         total_data = [
-            ['Ara Toplam:', f"{total:.2f} TL"],
-            ['KDV (%10):', f"{total * 0.10:.2f} TL"],
-            ['GENEL TOPLAM:', f"{total * 1.10:.2f} TL"],
+            ['Ara Toplam:', f"{subtotal:.2f} TL"],
+            ['KDV (%10):', f"{tax_amount:.2f} TL"],
+            ['GENEL TOPLAM:', f"{grand_total:.2f} TL"],
         ]
         
         total_table = Table(total_data, colWidths=[13*cm, 3*cm])
@@ -268,19 +500,7 @@ class PDFReceiptService:
         story.append(Spacer(1, 1*cm))
         
         # Alt bilgi
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=self.styles['Normal'],
-            alignment=TA_CENTER,
-            fontSize=9,
-            fontName=FONT_NAME
-        )
-        footer = Paragraph("<i>Afiyet olsun! Bizi tercih ettiğiniz için teşekkür ederiz.</i><br/><b>Powered by Anadolu BT</b>", footer_style)
+        footer = Paragraph("<i>Afiyet olsun! Bizi tercih ettiğiniz için teşekkür ederiz.</i><br/><b>Powered by Anadolu BT</b>", self.styles['Footer'])
         story.append(footer)
         
-        # PDF oluştur
-        doc.build(story)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        
-        return pdf_bytes
+        return story
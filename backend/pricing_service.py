@@ -0,0 +1,105 @@
+# Sipariş Fiyatlandırma Servisi (fiyatlar katalogdan, kesin ondalık hesap)
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional
+
+from branch_service import DEFAULT_BRANCH_ID
+
+TAX_RATE = Decimal('0.10')  # KDV %10
+CENT = Decimal('0.01')
+
+
+def to_money(value) -> Decimal:
+    """Tutarı kuruşa yuvarlanmış Decimal'e çevir"""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PricingError(Exception):
+    """Sepet fiyatlandırılamadığında (bilinmeyen / satışta olmayan ürün)"""
+
+
+class PricingService:
+    """
+    Sipariş kalemlerini ürün kataloğundan fiyatlandırır.
+    - Ürünler tek bir $in sorgusuyla çekilir ve önbellekte tutulur
+    - Satır toplamı, KDV ve genel toplam sipariş oluşturulurken bir kez hesaplanır
+    """
+
+    def __init__(self, db, ttl: float = 60.0, tax_rate: Decimal = TAX_RATE):
+        self.db = db
+        self.ttl = ttl
+        self.tax_rate = tax_rate
+        self._cache: Dict[str, tuple] = {}
+
+    def put(self, product: dict):
+        """Ürünü önbelleğe yaz (ürün oluşturulunca)"""
+        self._cache[product['id']] = ({
+            'name': product['name'],
+            'price': to_money(product['price']),
+            'is_available': product.get('is_available', True),
+            'category_id': product.get('category_id'),
+            'branch_id': product.get('branch_id', DEFAULT_BRANCH_ID),
+        }, time.monotonic())
+
+    def invalidate(self, product_id: Optional[str] = None):
+        """Önbelleği temizle"""
+        if product_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(product_id, None)
+
+    async def get_products(self, product_ids: List[str]) -> Dict[str, dict]:
+        """Ürünleri önbellekten, eksikleri tek sorguda veritabanından getir"""
+        now = time.monotonic()
+        found: Dict[str, dict] = {}
+        missing = []
+        for product_id in set(product_ids):
+            cached = self._cache.get(product_id)
+            if cached is not None and now - cached[1] < self.ttl:
+                found[product_id] = cached[0]
+            else:
+                missing.append(product_id)
+
+        if missing:
+            docs = await self.db.products.find(
+                {'id': {'$in': missing}},
+                {'_id': 0, 'id': 1, 'name': 1, 'price': 1, 'is_available': 1, 'category_id': 1, 'branch_id': 1}
+            ).to_list(len(missing))
+            for doc in docs:
+                self.put(doc)
+                found[doc['id']] = self._cache[doc['id']][0]
+        return found
+
+    async def price_items(self, items: List[dict], branch_id: Optional[str] = None) -> dict:
+        """
+        Sepeti fiyatlandır (branch_id verilirse ürün o şubenin menüsünde olmalı).
+        items: [{'product_id': ..., 'quantity': ...}]
+        """
+        products = await self.get_products([item['product_id'] for item in items])
+
+        priced = []
+        subtotal = Decimal('0.00')
+        for item in items:
+            product = products.get(item['product_id'])
+            if product is None or (branch_id and product['branch_id'] != branch_id):
+                raise PricingError(f"Ürün bulunamadı: {item['product_id']}")
+            if not product['is_available']:
+                raise PricingError(f"Ürün satışta değil: {product['name']}")
+
+            line_total = product['price'] * item['quantity']
+            subtotal += line_total
+            priced.append({
+                **item,
+                'product_name': product['name'],
+                'price': float(product['price']),
+                'line_total': float(line_total),
+            })
+
+        tax_amount = (subtotal * self.tax_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+        return {
+            'items': priced,
+            'subtotal': float(subtotal),
+            'tax_rate': float(self.tax_rate),
+            'tax_amount': float(tax_amount),
+            'grand_total': float(subtotal + tax_amount),
+        }
@@ -0,0 +1,447 @@
+# İstek Profilleme (örnekleyici profiler, Mongo komutları + explain, süre dağılımı)
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional['RequestProfile']] = ContextVar('request_profile', default=None)
+
+# explain edilebilen komutlar
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify')
+# Sürücünün eklediği, explain'e gönderilmeyecek alanlar
+DRIVER_FIELDS = ('lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'signature',
+                 'readConcern', 'writeConcern', 'startTransaction', 'autocommit')
+# Boşta bekleyen thread'lerin son çerçeveleri (örneklemeye katılmaz)
+IDLE_FUNCTIONS = {'wait', 'select', 'poll', 'epoll', '_worker', 'get', 'accept', 'sleep', '_run_once'}
+# Komutun filtresinin bulunduğu alan(lar)
+FILTER_FIELDS = {
+    'find': 'filter', 'count': 'query', 'distinct': 'query', 'findAndModify': 'query',
+    'aggregate': 'pipeline', 'update': 'updates', 'delete': 'deletes',
+}
+# Sorgu planında değer taşıyan alanlar
+PLAN_VALUE_FIELDS = ('parsedQuery', 'filter', 'indexBounds')
+
+
+def _shape(value):
+    """Filtrenin şekli: alan ve operatör adları kalır, değerler '?' olur"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shaped = [_shape(item) for item in value]
+        # $in listeleri gibi: eleman sayısı da gizlenir
+        return shaped if any(isinstance(item, dict) for item in shaped) else ['?']
+    return '?'
+
+
+def redact_command(name: str, command: dict) -> dict:
+    """Kaydedilecek komut: ad, koleksiyon ve filtre şekli (değer yok: şifre hash'i, telefon...)"""
+    collection = command.get(name)
+    field = FILTER_FIELDS.get(name)
+    value = command.get(field) if field else None
+    if name in ('update', 'delete') and isinstance(value, list):
+        value = [statement.get('q') for statement in value if isinstance(statement, dict)]
+    return {
+        'name': name,
+        'collection': collection if isinstance(collection, str) else None,
+        'filter': _shape(value) if value is not None else None,
+    }
+
+
+def redact_plan(plan):
+    """Sorgu planında filtre ve indeks sınırlarındaki değerleri gizle"""
+    if isinstance(plan, dict):
+        return {key: _shape(item) if key in PLAN_VALUE_FIELDS else redact_plan(item)
+                for key, item in plan.items()}
+    if isinstance(plan, list):
+        return [redact_plan(item) for item in plan]
+    return plan
+
+
+class RequestProfile:
+    """Tek bir isteğin süreleri ve Mongo komutları"""
+
+    def __init__(self, method: str, path: str, query: str, forced: bool):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.query = query
+        self.forced = forced
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status: Optional[int] = None
+        self.streaming = False
+        self.sections: Dict[str, float] = {}
+        self.commands: List[dict] = []
+        self._pending: Dict[tuple, tuple] = {}
+
+    @property
+    def total_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def add_section(self, name: str, seconds: float):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def timings(self) -> dict:
+        """auth / db / render / diğer (ms)"""
+        db_ms = sum(command['duration_ms'] for command in self.commands)
+        result = {name: round(seconds * 1000, 3) for name, seconds in self.sections.items()}
+        result['db'] = round(db_ms, 3)
+        result['total'] = round(self.total_ms, 3)
+        result['other'] = round(max(0.0, result['total'] - sum(v for k, v in result.items() if k != 'total')), 3)
+        return result
+
+
+@contextmanager
+def timed(section: str):
+    """Aktif profile süre ekle (profil yoksa maliyeti bir ContextVar okuması)"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_section(section, time.perf_counter() - start)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Motor komutları thread havuzunda çalışır; Motor ContextVar bağlamını kopyaladığı
+    için komut hangi isteğe aitse o profile yazılır.
+    """
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile._pending[(event.request_id, event.connection_id)] = (event.command_name, event.command)
+
+    def _finish(self, event, error: Optional[str] = None):
+        profile = _current.get()
+        if profile is None:
+            return
+        started = profile._pending.pop((event.request_id, event.connection_id), None)
+        if started is None:
+            return
+        name, command = started
+        profile.commands.append({
+            'name': name,
+            'collection': command.get(name) if isinstance(command.get(name), str) else None,
+            'duration_ms': round(event.duration_micros / 1000, 3),
+            'error': error,
+            # Ham komut sadece explain için bellekte kalır, dosyaya yazılmaz
+            'command': command,
+        })
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        # Hata mesajı değer içerebilir (E11000 dup key {...}): sadece kod adı
+        failure = event.failure if isinstance(event.failure, dict) else {}
+        self._finish(event, error=f"{failure.get('codeName', 'Error')} ({failure.get('code', '?')})")
+
+
+class StackSampler:
+    """
+    Arka planda tüm thread'lerin yığınlarını örnekler (sys._current_frames).
+    Son `window` saniyelik örnekler tutulur; yavaş istek bittiğinde
+    kendi zaman aralığındaki örnekler alınır.
+    Sadece profillenen bir istek sürerken örnekler (`acquire` / `release`);
+    diğer zamanlarda thread bir Event üzerinde bekler, maliyeti yoktur.
+    """
+
+    def __init__(self, interval: float = 0.005, window: float = 120.0, max_depth: int = 48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._samples: deque = deque(maxlen=max(1, int(window / interval)))
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def acquire(self):
+        with self._active_lock:
+            self._active += 1
+            self._wake.set()
+
+    def release(self):
+        with self._active_lock:
+            self._active -= 1
+            if self._active <= 0:
+                self._active = 0
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if not self._wake.is_set():
+                self._wake.wait()
+                continue
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._samples.append((now, ';'.join(reversed(stack))))
+
+    def collect(self, start: float, end: float) -> Dict[str, int]:
+        """Aralıktaki örnekler: katlanmış yığın -> adet (flamegraph formatı)"""
+        return dict(Counter(stack for ts, stack in list(self._samples) if start <= ts <= end))
+
+
+def _query_shape(query: str) -> str:
+    """Sorgu dizesinde sadece parametre adları"""
+    return '&'.join(f"{part.split('=', 1)[0]}=?" for part in query.split('&') if part)
+
+
+class ProfileStore:
+    """Diskte sınırlı halka tampon: en eski profil silinir"""
+
+    def __init__(self, directory: Path, max_files: int = 200):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._index: List[dict] = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index = []
+        for path in sorted(self.directory.glob('*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    index.append(json.load(f)['summary'])
+            except (OSError, ValueError, KeyError):
+                continue
+        self._index = index[-self.max_files:]
+
+    def save(self, data: dict):
+        """Thread havuzunda çağrılır"""
+        summary = data['summary']
+        path = self.directory / f"{summary['captured_at_ms']:013d}-{summary['id']}.json"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+            self._index.append(summary)
+            files = sorted(self.directory.glob('*.json'))
+            for old in files[:max(0, len(files) - self.max_files)]:
+                old.unlink(missing_ok=True)
+            self._index = self._index[-self.max_files:]
+
+    def list(self) -> List[dict]:
+        return list(reversed(self._index))
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not profile_id.isalnum():
+            return None
+        for path in self.directory.glob(f'*-{profile_id}.json'):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+
+class RequestProfiler:
+    """
+    - Admin `X-Profile: 1` başlığı veya `?profile=1` ile isteği profiller
+    - `slow_ms` > 0 ise bu sürenin üstündeki istekler otomatik kaydedilir (varsayılan kapalı)
+    - Kayıt yanıt gönderildikten sonra (explain dahil) arka planda yapılır
+    - Dosyaya komut değerleri yazılmaz: komut adı, koleksiyon ve filtre şekli
+    """
+
+    def __init__(self, store: ProfileStore, slow_ms: float = 0.0, sample_interval: float = 0.005,
+                 max_explain: int = 5):
+        self.store = store
+        self.slow_ms = slow_ms
+        self.max_explain = max_explain
+        self.sampler = StackSampler(interval=sample_interval)
+        self.listener = MongoCommandListener()
+        self.db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0
+
+    def start(self, db):
+        self.db = db
+        self.store.load()
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+
+    @staticmethod
+    def is_admin_request(headers: Dict[bytes, bytes]) -> bool:
+        authorization = headers.get(b'authorization', b'').decode('latin-1')
+        if not authorization.lower().startswith('bearer '):
+            return False
+        from auth import decode_token  # auth bu modülden timed kullanır
+        try:
+            return decode_token(authorization[7:]).get('role') == 'admin'
+        except HTTPException:
+            return False
+
+    async def capture(self, profile: RequestProfile, reason: str):
+        try:
+            explains = await self._explain(profile)
+            samples = self.sampler.collect(profile.start, profile.end)
+            data = {
+                'summary': {
+                    'id': profile.id,
+                    'method': profile.method,
+                    'path': profile.path,
+                    'status': profile.status,
+                    'reason': reason,
+                    'total_ms': round(profile.total_ms, 3),
+                    'captured_at': profile.started_at.isoformat(),
+                    'captured_at_ms': int(profile.started_at.timestamp() * 1000),
+                },
+                'query': _query_shape(profile.query),
+                'timings': profile.timings(),
+                'commands': [
+                    {**redact_command(command['name'], command['command']),
+                     'duration_ms': command['duration_ms'], 'error': command['error']}
+                    for command in profile.commands
+                ],
+                'explain': explains,
+                'samples': {'interval_ms': self.sampler.interval * 1000, 'stacks': samples},
+            }
+            await asyncio.get_running_loop().run_in_executor(None, self.store.save, data)
+        except Exception as e:
+            logger.error(f"Profil kaydedilemedi: {str(e)}")
+
+    async def _explain(self, profile: RequestProfile) -> List[dict]:
+        """En yavaş komutların sorgu planları"""
+        if self.db is None:
+            return []
+        candidates = sorted(
+            (c for c in profile.commands if c['name'] in EXPLAINABLE and c['error'] is None),
+            key=lambda c: c['duration_ms'], reverse=True
+        )[:self.max_explain]
+        results = []
+        token = _current.set(None)  # explain komutları profile yazılmasın
+        try:
+            for command in candidates:
+                cleaned = {k: v for k, v in command['command'].items() if k not in DRIVER_FIELDS}
+                try:
+                    plan = await self.db.command({'explain': cleaned, 'verbosity': 'queryPlanner'})
+                    results.append({
+                        'name': command['name'],
+                        'collection': command['collection'],
+                        'duration_ms': command['duration_ms'],
+                        'plan': redact_plan(plan.get('queryPlanner', plan.get('stages', plan))),
+                    })
+                except Exception as e:
+                    results.append({'name': command['name'], 'collection': command['collection'], 'error': str(e)[:300]})
+        finally:
+            _current.reset(token)
+        return results
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: her /api isteği için RequestProfile açar"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api'):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        query = scope.get('query_string', b'').decode('latin-1')
+        requested = headers.get(b'x-profile') == b'1' or 'profile=1' in query.split('&')
+        forced = requested and self.profiler.is_admin_request(headers)
+        if not forced and not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope['method'], scope['path'], query, forced)
+        sampling = True
+        self.profiler.sampler.acquire()
+
+        def stop_sampling():
+            nonlocal sampling
+            if sampling:
+                sampling = False
+                self.profiler.sampler.release()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                profile.status = message['status']
+                content_type = dict(message.get('headers', [])).get(b'content-type', b'')
+                profile.streaming = content_type.startswith(b'text/event-stream')
+                if profile.streaming and not forced:
+                    # SSE yavaş sayılmaz: bağlantı boyunca örnekleme sürmesin
+                    stop_sampling()
+                if forced:
+                    message = {**message, 'headers': list(message.get('headers', [])) + [
+                        (b'x-profile-id', profile.id.encode())
+                    ]}
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop_sampling()
+            _current.reset(token)
+            profile.end = time.perf_counter()
+            # SSE bağlantıları doğası gereği uzun sürer, yavaş sayılmaz
+            slow = self.profiler.enabled and not profile.streaming and profile.total_ms >= self.profiler.slow_ms
+            if forced or slow:
+                asyncio.ensure_future(self.profiler.capture(profile, 'requested' if forced else 'slow'))
+
+
+def create_profiler(root_dir: Path) -> RequestProfiler:
+    store = ProfileStore(
+        Path(os.environ.get('PROFILE_DIR', root_dir / 'profiles')),
+        max_files=int(os.environ.get('PROFILE_MAX_FILES', '200'))
+    )
+    return RequestProfiler(
+        store,
+        # 0: sadece admin isteğiyle (X-Profile: 1) profillenir
+        slow_ms=float(os.environ.get('PROFILE_SLOW_MS', '0')),
+        sample_interval=float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5')) / 1000,
+    )
@@ -0,0 +1,109 @@
+# Rapor Önbelleği (oluşturulmuş Excel dosyaları diskte, dönem ve veri sürümüne göre)
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def current_month() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m')
+
+
+def is_closed_month(month: Optional[str]) -> bool:
+    """Geçmiş aylar kapalıdır (içinde bulunulan ay ve 'tüm zamanlar' açık)"""
+    return month is not None and month < current_month()
+
+
+async def orders_data_version(db, query: dict) -> str:
+    """
+    Dönemdeki siparişlerin sürümü: adet + en büyük `version`.
+    Ekleme / düzenleme en büyük sürümü, silme adedi değiştirir.
+    (branch_id, order_number, version) indeksi ile dokümanlar okunmadan hesaplanır.
+    """
+    result = await db.orders.aggregate([
+        {'$match': query},
+        {'$group': {'_id': None, 'count': {'$sum': 1}, 'version': {'$max': '$version'}}},
+    ]).to_list(1)
+    if not result:
+        return '0.0'
+    return f"{result[0]['count']}.{result[0]['version'] or 0}"
+
+
+class ReportCache:
+    """
+    Dosya adı: <tür>.<şube>.<dönem>.<veri sürümü>.<uzantı>
+    - Kapanmış dönemler süresiz saklanır; geç bir düzenleme veri sürümünü değiştirir,
+      yeni dosya yazılınca dönemin eski dosyası silinir
+    - Açık dönemler `open_ttl` saniye boyunca veri sürümüne bakılmadan sunulur
+    - Yazma geçici dosya + os.replace ile atomik (yarım dosya sunulmaz)
+    """
+
+    def __init__(self, directory: Path, open_ttl: float = 60.0):
+        self.directory = Path(directory)
+        self.open_ttl = open_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _prefix(self, kind: str, branch_id: str, period: str) -> str:
+        # '.' parçalarda bulunmaz: şube ID'sindeki '-' anahtarları karıştırmaz
+        return '.'.join(_UNSAFE.sub('_', part) for part in (kind, branch_id, period)) + '.'
+
+    def _path(self, kind: str, branch_id: str, period: str, version: str, suffix: str) -> Path:
+        return self.directory / f"{self._prefix(kind, branch_id, period)}{_UNSAFE.sub('_', version)}{suffix}"
+
+    def recent(self, kind: str, branch_id: str, period: str) -> Optional[Path]:
+        """Açık dönem: TTL içinde yazılmış/doğrulanmış en yeni dosya"""
+        newest = None
+        newest_mtime = time.time() - self.open_ttl
+        for path in self.directory.glob(self._prefix(kind, branch_id, period) + '*'):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime >= newest_mtime:
+                newest, newest_mtime = path, mtime
+        if newest is not None:
+            self.hits += 1
+        return newest
+
+    def lookup(self, kind: str, branch_id: str, period: str, version: str, suffix: str,
+               closed: bool) -> Optional[Path]:
+        path = self._path(kind, branch_id, period, version, suffix)
+        try:
+            if not closed:
+                # Veri değişmemiş: açık dönem TTL'i yeniden başlar
+                os.utime(path)
+            elif not path.exists():
+                raise FileNotFoundError(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, kind: str, branch_id: str, period: str, version: str, suffix: str,
+              data: bytes) -> Path:
+        """Thread havuzunda çağrılır"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(kind, branch_id, period, version, suffix)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        for old in self.directory.glob(self._prefix(kind, branch_id, period) + '*'):
+            if old != path:
+                old.unlink(missing_ok=True)
+        return path
+
+    def metrics(self) -> dict:
+        files = [f for f in self.directory.glob('*') if not f.name.startswith('.')] if self.directory.exists() else []
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'files': len(files),
+            'bytes': sum(f.stat().st_size for f in files if f.exists()),
+        }
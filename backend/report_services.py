@@ -0,0 +1,133 @@
+# Rapor servisleri (ReportLab / openpyxl) ilk kullanımda yüklenir.
+# Bu modüller ağırdır; sunucu açılışını ve worker başlatmayı yavaşlatmasınlar.
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from profiling import timed
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# pdf_service.LAYOUTS ile aynı (doğrulama için ReportLab yüklenmesin)
+RECEIPT_LAYOUTS = ('a4', 'thermal')
+
+_lock = threading.Lock()
+_pdf_service = None
+_excel_service = None
+_process_pool: Optional[Executor] = None
+_process_pool_failed = False
+
+
+def get_pdf_service():
+    """PDFReceiptService (ilk çağrıda font kaydı ve stiller hazırlanır)"""
+    global _pdf_service
+    if _pdf_service is None:
+        with _lock:
+            if _pdf_service is None:
+                from pdf_service import PDFReceiptService
+                _pdf_service = PDFReceiptService()
+    return _pdf_service
+
+
+def get_excel_service():
+    """ExcelExportService (openpyxl ilk çağrıda yüklenir)"""
+    global _excel_service
+    if _excel_service is None:
+        with _lock:
+            if _excel_service is None:
+                from excel_service import ExcelExportService
+                _excel_service = ExcelExportService()
+    return _excel_service
+
+
+def prewarm():
+    """Açılıştan sonra arka planda servisleri hazırla (ilk fiş beklemesin)"""
+    try:
+        get_pdf_service()
+        get_excel_service()
+    except Exception as e:
+        logger.error(f"Rapor servisleri hazırlanamadı: {str(e)}")
+
+
+def render_orders_report(orders, title: str) -> bytes:
+    """Sipariş raporu Excel'i (thread havuzunda çağrılır, yükleme de orada olur)"""
+    with timed('render'), span('excel.orders_report', orders=len(orders)):
+        return get_excel_service().generate_orders_report(orders, title=title)
+
+
+def get_process_pool() -> Optional[Executor]:
+    """
+    Toplu Excel üretimi için süreç havuzu (openpyxl CPU'ya bağlı, GIL'i bırakmaz).
+    'spawn': Motor/uvicorn thread'leri olan süreç fork edilmez.
+    Süreç açılamayan ortamlarda None (thread havuzu kullanılır).
+    """
+    global _process_pool, _process_pool_failed
+    if _process_pool is None and not _process_pool_failed:
+        with _lock:
+            if _process_pool is None and not _process_pool_failed:
+                try:
+                    _process_pool = ProcessPoolExecutor(
+                        max_workers=int(os.environ.get('REPORT_PROCESSES', min(4, os.cpu_count() or 1))),
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                except (OSError, NotImplementedError) as e:
+                    logger.error(f"Rapor süreç havuzu açılamadı, thread havuzu kullanılacak: {str(e)}")
+                    _process_pool_failed = True
+    return _process_pool
+
+
+async def render_workbooks(jobs: List[Tuple[list, str]]) -> List[bytes]:
+    """(siparişler, başlık) listesi -> Excel dosyaları; işler süreç havuzunda paralel"""
+    global _process_pool
+    from excel_service import render_orders_workbook
+    pool = get_process_pool()
+    with timed('render'), span('excel.workbooks', jobs=len(jobs), process_pool=pool is not None):
+        if pool is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                return list(await asyncio.gather(*(
+                    loop.run_in_executor(pool, render_orders_workbook, orders, title) for orders, title in jobs
+                )))
+            except BrokenProcessPool as e:
+                # Ölen worker havuzu bozar: bir sonraki çağrıda yeniden açılır, bu seferlik thread havuzu
+                logger.error(f"Rapor süreç havuzu bozuldu: {str(e)}")
+                with _lock:
+                    if _process_pool is pool:
+                        _process_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+        return list(await asyncio.gather(*(
+            run_in_threadpool(render_orders_workbook, orders, title) for orders, title in jobs
+        )))
+
+
+def render_settlement_summary(rows: List[dict], title: str) -> bytes:
+    """Toplu kurye hesabı özet sayfası (thread havuzunda çağrılır)"""
+    with timed('render'), span('excel.settlement_summary', rows=len(rows)):
+        return get_excel_service().generate_settlement_summary(rows, title=title)
+
+
+def shutdown():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def render_receipt(order: dict, layout: str = 'a4') -> bytes:
+    """Sipariş fişi PDF'i (thread havuzunda çağrılır)"""
+    with timed('render'), span('pdf.receipt', layout=layout):
+        return get_pdf_service().generate_receipt(order, layout=layout)
+
+
+def render_receipts(orders, layout: str = 'a4') -> bytes:
+    """Toplu fiş: tüm siparişler tek çok sayfalı PDF'te (thread havuzunda çağrılır)"""
+    with timed('render'), span('pdf.receipts', layout=layout, orders=len(orders)):
+        return get_pdf_service().generate_receipts(orders, layout=layout)
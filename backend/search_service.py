@@ -0,0 +1,237 @@
+# Ürün Arama Servisi (POS ekranı için bellek içi ters indeks)
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from text_utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Eşleşme türü puanları
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+# Yazım hatası toleransı bu uzunluktan itibaren devreye girer
+MIN_FUZZY_LENGTH = 4
+
+
+def _deletes(term: str) -> Set[str]:
+    """Terimden tek harf silinerek elde edilen varyantlar"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """İki kelime arasında en fazla bir düzenleme (ekleme/silme/değiştirme/yer değiştirme) var mı"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    # a kısa olan: b'den bir harf silince a olmalı
+    for i in range(len(b)):
+        if b[:i] + b[i + 1:] == a:
+            return True
+    return False
+
+
+class ProductSearchIndex:
+    """
+    Ürün adı ve açıklaması üzerinde ters indeks.
+    - Türkçe normalizasyon (ı/i, ş/s, ğ/g ...)
+    - Önek eşleşmesi ve tek harflik yazım hatası toleransı
+    - Ürün eklendikçe artımlı güncellenir
+    - `db` verilirse diğer worker'ların değişiklikleri `version` alanı üzerinden periyodik alınır
+    """
+
+    def __init__(self, db=None, refresh_interval: float = 5.0, full_reload_every: int = 60):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.full_reload_every = full_reload_every
+        self._since = 0
+        self._task: Optional[asyncio.Task] = None
+        self._docs: Dict[str, dict] = {}
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._vocab: List[str] = []
+        self._delete_map: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def load(self, products: List[dict]):
+        """İndeksi baştan kur"""
+        self._docs, self._doc_terms, self._postings = {}, {}, {}
+        self._vocab, self._delete_map = [], {}
+        for product in products:
+            self.add(product)
+
+    def add(self, product: dict):
+        """Ürünü indekse ekle (varsa günceller)"""
+        product_id = product['id']
+        current = self._docs.get(product_id)
+        if current is not None and product.get('version') is not None \
+                and current.get('version', 0) > product['version']:
+            return
+        self._since = max(self._since, product.get('version') or 0)
+        if current is not None:
+            self.remove(product_id)
+
+        # İsim kelimeleri açıklamadan daha ağır
+        weights: Dict[str, int] = {}
+        for term in tokenize(product.get('description')):
+            weights[term] = 1
+        for term in tokenize(product.get('name')):
+            weights[term] = 2
+
+        self._docs[product_id] = product
+        self._doc_terms[product_id] = set(weights)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._vocab, term)
+                if len(term) >= MIN_FUZZY_LENGTH - 1:
+                    for variant in _deletes(term):
+                        self._delete_map.setdefault(variant, set()).add(term)
+            postings[product_id] = weight
+
+    def remove(self, product_id: str):
+        """Ürünü indeksten çıkar"""
+        self._docs.pop(product_id, None)
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect_left(self._vocab, term)
+                if i < len(self._vocab) and self._vocab[i] == term:
+                    del self._vocab[i]
+                for variant in _deletes(term):
+                    terms = self._delete_map.get(variant)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._delete_map[variant]
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        i = bisect_left(self._vocab, prefix)
+        terms = []
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            terms.append(self._vocab[i])
+            i += 1
+        return terms
+
+    def _fuzzy_terms(self, token: str) -> Set[str]:
+        candidates = set(self._delete_map.get(token, ()))
+        for variant in _deletes(token):
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates |= self._delete_map.get(variant, set())
+        return {term for term in candidates if _within_one_edit(token, term)}
+
+    def _match_token(self, token: str) -> Dict[str, int]:
+        scores: Dict[str, int] = {}
+
+        def apply(term: str, kind_score: int):
+            for product_id, weight in self._postings[term].items():
+                score = kind_score * weight
+                if score > scores.get(product_id, 0):
+                    scores[product_id] = score
+
+        for term in self._prefix_terms(token):
+            apply(term, EXACT_SCORE if term == token else PREFIX_SCORE)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for term in self._fuzzy_terms(token):
+                if term != token:
+                    apply(term, FUZZY_SCORE)
+        return scores
+
+    def search(self, query: str, limit: int = 20, available_only: bool = True,
+               category_id: Optional[str] = None, branch_id: Optional[str] = None) -> List[dict]:
+        """Sorgudaki tüm kelimelerle eşleşen ürünler, puana göre sıralı"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        totals: Optional[Dict[str, int]] = None
+        for token in tokens:
+            scores = self._match_token(token)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {pid: totals[pid] + s for pid, s in scores.items() if pid in totals}
+            if not totals:
+                return []
+
+        results = []
+        for product_id, score in totals.items():
+            product = self._docs[product_id]
+            if available_only and not product.get('is_available', True):
+                continue
+            if category_id and product.get('category_id') != category_id:
+                continue
+            if branch_id and product.get('branch_id') != branch_id:
+                continue
+            results.append((-score, product.get('name', ''), product))
+        results.sort(key=lambda r: (r[0], r[1]))
+        return [product for _, _, product in results[:limit]]
+
+    # ---- Veritabanından yükleme / diğer worker'larla eşitleme ----
+
+    @staticmethod
+    def _from_db(product: dict) -> dict:
+        if isinstance(product.get('created_at'), str):
+            product['created_at'] = datetime.fromisoformat(product['created_at'])
+        return product
+
+    async def reload(self):
+        """Tüm ürünleri baştan yükle"""
+        products = {p['id']: self._from_db(p) for p in await self.db.products.find({}, {'_id': 0}).to_list(None)}
+        # Yükleme sürerken bu worker'da yazılan daha yeni sürümleri koru
+        for product_id, doc in self._docs.items():
+            if product_id in products and doc.get('version', 0) > products[product_id].get('version', 0):
+                products[product_id] = doc
+        self.load(list(products.values()))
+
+    async def poll(self):
+        """Son görülen sürümden sonra değişen ürünleri al"""
+        async for product in self.db.products.find({'version': {'$gt': self._since}}, {'_id': 0}):
+            self.add(self._from_db(product))
+
+    async def _run(self):
+        rounds = 0
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            rounds += 1
+            try:
+                # Sürüm sırası dışında tamamlanan yazmalar için ara ara tam yükleme
+                if rounds % self.full_reload_every == 0:
+                    await self.reload()
+                else:
+                    await self.poll()
+            except Exception as e:
+                logger.error(f"Ürün arama indeksi güncellenemedi: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,33 +1,148 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Response, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
+import json
 import logging
+import re
+import zipfile
+from io import BytesIO
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone
-from pdf_service import PDFReceiptService
 from auth import (
     hash_password, verify_password, create_access_token,
     get_current_user, require_admin, require_courier
 )
-from excel_service import ExcelExportService
+from report_services import (
+    RECEIPT_LAYOUTS, render_orders_report, render_receipt, render_receipts, render_workbooks,
+    render_settlement_summary, prewarm as prewarm_report_services, shutdown as shutdown_report_services
+)
+from location_service import CourierLocationService
+from customer_service import CustomerDirectory
+from search_service import ProductSearchIndex
+from pricing_service import PricingService, PricingError
+from analytics_service import SalesAnalytics, parse_range
+from forecast_service import DemandForecaster
+from sync_service import ChangeTracker, parse_collections
+from singleflight import SingleFlight
+from floor_service import FloorService
+from order_event_service import OrderEventLog
+from idempotency import IdempotencyStore
+from image_service import ImageError, ProductImageStore
+from backup_service import BackupService
+from order_search_service import OrderSearch, search_fields
+from report_cache import ReportCache, is_closed_month, orders_data_version
+from http_range import file_response, iter_bytes
+from profiling import ProfilingMiddleware, create_profiler
+from tracing import TracingMiddleware, create_tracer
+from branch_service import BranchService, DEFAULT_BRANCH_ID, branch_of
+from http_cache import CollectionVersions, CompressionMiddleware, not_modified, set_cache_headers
+from admission import (
+    AdmissionController, AdmissionMiddleware, PriorityClass,
+    ORDER_ENTRY, COURIER, RECEIPTS, DASHBOARD, REPORTS
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Profil açık isteklerin Mongo komutları listener üzerinden toplanır
+request_profiler = create_profiler(ROOT_DIR)
+tracer = create_tracer(ROOT_DIR)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[request_profiler.listener, tracer.listener])
 db = client[os.environ['DB_NAME']]
 
 # Services
-pdf_service = PDFReceiptService()
-excel_service = ExcelExportService()
+branch_service = BranchService(db)
+collection_versions = CollectionVersions(db)
+change_tracker = ChangeTracker(
+    db,
+    collection_versions=collection_versions,
+    settle_seconds=float(os.environ.get('SYNC_SETTLE_SECONDS', '5'))
+)
+location_service = CourierLocationService(
+    db,
+    flush_interval=float(os.environ.get('LOCATION_FLUSH_INTERVAL', '2')),
+    max_buffer=int(os.environ.get('LOCATION_MAX_BUFFER', '5000')),
+    # uvicorn --workers sayısı WEB_CONCURRENCY ile de verilir
+    single_worker=int(os.environ.get('WEB_CONCURRENCY', '1')) <= 1
+)
+customer_directory = CustomerDirectory(
+    db,
+    change_tracker=change_tracker,
+    refresh_interval=float(os.environ.get('CUSTOMER_REFRESH_INTERVAL', '5'))
+)
+product_search = ProductSearchIndex(
+    db, refresh_interval=float(os.environ.get('PRODUCT_SEARCH_REFRESH_INTERVAL', '5'))
+)
+pricing_service = PricingService(db, ttl=float(os.environ.get('PRICE_CACHE_TTL', '60')))
+sales_analytics = SalesAnalytics(db, catalog=pricing_service)
+order_events = OrderEventLog(
+    db,
+    flush_interval=float(os.environ.get('ORDER_EVENTS_FLUSH_INTERVAL', '1')),
+    compact_after_days=int(os.environ.get('ORDER_EVENTS_COMPACT_AFTER_DAYS', '7'))
+)
+demand_forecaster = DemandForecaster(db, weeks=int(os.environ.get('FORECAST_WEEKS', '8')))
+floor_service = FloorService(db, refresh_interval=float(os.environ.get('FLOOR_REFRESH_INTERVAL', '1')))
+single_flight = SingleFlight(ttl=float(os.environ.get('SINGLEFLIGHT_TTL', '0.5')))
+report_cache = ReportCache(
+    Path(os.environ.get('REPORT_CACHE_DIR', ROOT_DIR / 'report_cache')),
+    open_ttl=float(os.environ.get('REPORT_CACHE_OPEN_TTL', '60'))
+)
+idempotency = IdempotencyStore(
+    db,
+    ttl_hours=float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24')),
+    max_entries=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+)
+image_store = ProductImageStore(
+    Path(os.environ.get('IMAGE_DIR', ROOT_DIR / 'images')),
+    sizes=[int(size) for size in os.environ.get('IMAGE_SIZES', '128,256,512').split(',')],
+    max_bytes=int(os.environ.get('IMAGE_MAX_BYTES', str(5 * 1024 * 1024))),
+    workers=int(os.environ.get('IMAGE_WORKERS', '2'))
+)
+IMAGE_DEFAULT_SIZE = os.environ.get('IMAGE_DEFAULT_SIZE', '256')
+backup_service = BackupService(
+    db,
+    Path(os.environ.get('BACKUP_DIR', ROOT_DIR / 'backups')),
+    batch_size=int(os.environ.get('BACKUP_BATCH_SIZE', '1000')),
+    keep=int(os.environ.get('BACKUP_KEEP', '14')),
+    change_tracker=change_tracker
+)
+BACKUP_BEFORE_DELETE = os.environ.get('BACKUP_BEFORE_DELETE', '1') == '1'
+order_search = OrderSearch(db)
+
+
+def _priority_class(name: str, concurrency: int, queue_timeout: float, max_queue: int,
+                    rate: float, burst: float) -> PriorityClass:
+    # Örn: ADMISSION_REPORTS_CONCURRENCY=2, ADMISSION_REPORTS_RATE=0.2
+    prefix = f"ADMISSION_{name.upper()}_"
+    return PriorityClass(
+        name,
+        concurrency=int(os.environ.get(prefix + 'CONCURRENCY', concurrency)),
+        queue_timeout=float(os.environ.get(prefix + 'QUEUE_TIMEOUT', queue_timeout)),
+        max_queue=int(os.environ.get(prefix + 'MAX_QUEUE', max_queue)),
+        rate=float(os.environ.get(prefix + 'RATE', rate)),
+        burst=float(os.environ.get(prefix + 'BURST', burst)),
+    )
+
+admission_controller = AdmissionController({
+    ORDER_ENTRY: _priority_class(ORDER_ENTRY, 64, 5.0, 256, 20, 40),
+    COURIER: _priority_class(COURIER, 32, 3.0, 128, 10, 20),
+    RECEIPTS: _priority_class(RECEIPTS, 8, 5.0, 32, 2, 10),
+    DASHBOARD: _priority_class(DASHBOARD, 8, 2.0, 32, 5, 10),
+    REPORTS: _priority_class(REPORTS, 2, 10.0, 4, 0.2, 2),
+}, trusted_proxies=os.environ.get('TRUSTED_PROXIES', '').split(','))
+# TRUSTED_PROXIES: ters proxy adresleri / ağları (örn. 10.0.0.0/8,127.0.0.1);
+# boşsa X-Forwarded-For okunmaz, token'sız istekler bağlantı IP'sine göre sınırlanır
 
 # Create the main app
 app = FastAPI(title="Döner Restoranı POS API")
@@ -38,12 +153,27 @@ api_router = APIRouter(prefix="/api")
 
 # ==================== MODELS ====================
 
+class Branch(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    address: Optional[str] = None
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class BranchCreate(BaseModel):
+    name: str
+    address: Optional[str] = None
+
+class UserBranchUpdate(BaseModel):
+    branch_id: str
+
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     username: str
     role: str  # "admin" or "courier"
     is_approved: bool = False
     courier_id: Optional[str] = None
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserRegister(BaseModel):
@@ -55,6 +185,7 @@ class UserRegister(BaseModel):
     phone_number: str
     vehicle_type: str
     vehicle_plate: Optional[str] = None
+    branch_id: str = DEFAULT_BRANCH_ID
 
 class UserLogin(BaseModel):
     username: str
@@ -65,6 +196,7 @@ class Category(BaseModel):
     name: str
     description: Optional[str] = None
     is_active: bool = True
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CategoryCreate(BaseModel):
@@ -78,7 +210,9 @@ class Product(BaseModel):
     price: float
     category_id: str
     image_url: Optional[str] = None
+    image_id: Optional[str] = None
     is_available: bool = True
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProductCreate(BaseModel):
@@ -93,6 +227,8 @@ class Table(BaseModel):
     table_number: str
     capacity: int
     is_occupied: bool = False
+    active_order_ids: List[str] = Field(default_factory=list)
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TableCreate(BaseModel):
@@ -110,6 +246,7 @@ class Courier(BaseModel):
     current_location: Optional[str] = None
     user_id: Optional[str] = None
     is_approved: bool = False
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CourierCreate(BaseModel):
@@ -121,25 +258,31 @@ class CourierCreate(BaseModel):
 
 class OrderItem(BaseModel):
     product_id: str
-    product_name: str
-    quantity: int
-    price: float
+    quantity: int = Field(gt=0)
+    # Ad ve fiyat sunucuda katalogdan doldurulur, istemcinin gönderdiği dikkate alınmaz
+    product_name: Optional[str] = None
+    price: Optional[float] = None
+    line_total: Optional[float] = None
 
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     order_number: str
     items: List[OrderItem]
-    total_amount: float
+    total_amount: float  # KDV hariç ara toplam
+    tax_amount: Optional[float] = None
+    grand_total: Optional[float] = None
     status: str = "pending"
     order_type: str = "dine-in"
     table_id: Optional[str] = None
     table_name: Optional[str] = None
+    # Müşteri alanları ve not oluşturulduktan sonra değişmez (arama alanları: search_fields)
     customer_name: Optional[str] = None
     customer_phone: Optional[str] = None
     customer_address: Optional[str] = None
     courier_id: Optional[str] = None
     courier_name: Optional[str] = None
     notes: Optional[str] = None
+    branch_id: str = DEFAULT_BRANCH_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -152,16 +295,50 @@ class OrderCreate(BaseModel):
     customer_address: Optional[str] = None
     notes: Optional[str] = None
 
+class ReceiptBatch(BaseModel):
+    """order_ids verilirse sadece onlar, verilmezse filtre (varsayılan: bugün)"""
+    order_ids: Optional[List[str]] = None
+    date: Optional[str] = None  # YYYYMMDD
+    order_type: Optional[str] = None
+    courier_id: Optional[str] = None
+    status: Optional[str] = None
+    layout: str = "a4"  # a4 | thermal (80 mm)
+
 class AssignCourier(BaseModel):
     courier_id: str
 
+class LocationPoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    ts: Optional[datetime] = None
+    accuracy: Optional[float] = None
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+
+class LocationBatch(BaseModel):
+    # Telefon birden fazla noktayı tek istekte gönderebilir
+    points: List[LocationPoint] = Field(min_length=1, max_length=500)
+
 
 # ==================== HELPER FUNCTIONS ====================
 
-async def get_next_order_number() -> str:
-    today = datetime.now(timezone.utc).strftime('%Y%m%d')
-    count = await db.orders.count_documents({'order_number': {'$regex': f'^SIP-{today}'}})
-    return f"SIP-{today}-{count + 1:04d}"
+async def get_next_order_number(branch_id: str) -> str:
+    return await branch_service.next_order_number(branch_id)
+
+
+def read_key(name: str, user: Optional[dict], *parts) -> str:
+    """İstek birleştirme anahtarı: uç nokta + rol + şube + sorgu / sürüm parçaları"""
+    role = user.get('role', '') if user else 'public'
+    branch_id = branch_of(user) if user else ''
+    return '|'.join([name, role, branch_id, *map(str, parts)])
+
+
+async def record_sales(order: dict):
+    """Kapanan siparişi analitik kovalarına işle (hata siparişi engellemez)"""
+    try:
+        await sales_analytics.record_closed_order(order)
+    except Exception as e:
+        logging.error(f"Satış analitiği güncellenemedi: {str(e)}")
 
 
 # ==================== AUTH ROUTES ====================
@@ -173,6 +350,9 @@ async def register(input: UserRegister):
     if existing:
         raise HTTPException(status_code=400, detail="Bu kullanıcı adı zaten kullanılıyor")
     
+    if not await branch_service.exists(input.branch_id):
+        raise HTTPException(status_code=404, detail="Şube bulunamadı")
+    
     # Kurye kaydı oluştur
     courier = Courier(
         first_name=input.first_name,
@@ -181,18 +361,22 @@ async def register(input: UserRegister):
         vehicle_type=input.vehicle_type,
         vehicle_plate=input.vehicle_plate,
         is_available=True,
-        is_approved=False
+        is_approved=False,
+        branch_id=input.branch_id
     )
     courier_doc = courier.model_dump()
     courier_doc['created_at'] = courier_doc['created_at'].isoformat()
-    await db.couriers.insert_one(courier_doc)
+    async with change_tracker.write('couriers') as version:
+        courier_doc['version'] = version
+        await db.couriers.insert_one(courier_doc)
     
     # User kaydı oluştur
     user = User(
         username=input.username,
         role="courier",
         is_approved=False,
-        courier_id=courier.id
+        courier_id=courier.id,
+        branch_id=input.branch_id
     )
     user_doc = user.model_dump()
     user_doc['password'] = hash_password(input.password)
@@ -216,7 +400,8 @@ async def login(input: UserLogin):
         "username": user['username'],
         "role": user['role'],
         "is_approved": user.get('is_approved', False),
-        "courier_id": user.get('courier_id')
+        "courier_id": user.get('courier_id'),
+        "branch_id": branch_of(user)
     })
     
     return {
@@ -227,7 +412,8 @@ async def login(input: UserLogin):
             "username": user['username'],
             "role": user['role'],
             "is_approved": user.get('is_approved', False),
-            "courier_id": user.get('courier_id')
+            "courier_id": user.get('courier_id'),
+            "branch_id": branch_of(user)
         }
     }
 
@@ -239,10 +425,50 @@ async def get_me(user: dict = Depends(get_current_user)):
 
 # ==================== ADMIN ROUTES ====================
 
+@api_router.post("/admin/branches", response_model=Branch)
+async def create_branch(input: BranchCreate, user: dict = Depends(require_admin)):
+    """Yeni şube oluştur"""
+    branch = Branch(**input.model_dump())
+    doc = branch.model_dump()
+    doc['created_at'] = doc['created_at'].isoformat()
+    await db.branches.insert_one(doc)
+    branch_service.remember(branch.id)
+    return branch
+
+@api_router.put("/admin/users/{user_id}/branch")
+async def assign_user_branch(user_id: str, input: UserBranchUpdate, user: dict = Depends(require_admin)):
+    """
+    Kendi şubesindeki bir kullanıcıyı başka şubeye ata (yeni şubeye yönetici vermek için).
+    Kuryenin kaydı da taşınır. Kullanıcı yeni şubeyi tekrar giriş yapınca görür.
+    """
+    if not await branch_service.exists(input.branch_id):
+        raise HTTPException(status_code=404, detail="Şube bulunamadı")
+    branch_id = branch_of(user)
+    target = await db.users.find_one_and_update(
+        {"id": user_id, "branch_id": branch_id},
+        {"$set": {"branch_id": input.branch_id}},
+        projection={"_id": 0, "password": 0}
+    )
+    if not target:
+        raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    
+    if target.get('courier_id') and input.branch_id != branch_id:
+        async with change_tracker.write('couriers') as version:
+            await db.couriers.update_one(
+                {"id": target['courier_id'], "branch_id": branch_id},
+                {"$set": {"branch_id": input.branch_id, "version": version}}
+            )
+            # Eski şubenin terminallerinden düşsün
+            await change_tracker.tombstone('couriers', [target['courier_id']], version, branch_id)
+        location_service.forget(target['courier_id'])
+    return {**target, "branch_id": input.branch_id}
+
 @api_router.get("/admin/couriers/pending")
 async def get_pending_couriers(user: dict = Depends(require_admin)):
     """Onay bekleyen kuryeler"""
-    couriers = await db.couriers.find({"is_approved": False}, {"_id": 0}).to_list(100)
+    couriers = await db.couriers.find(
+        {"branch_id": branch_of(user), "is_approved": False}, {"_id": 0}
+    ).to_list(100)
     for courier in couriers:
         if isinstance(courier['created_at'], str):
             courier['created_at'] = datetime.fromisoformat(courier['created_at'])
@@ -252,10 +478,11 @@ async def get_pending_couriers(user: dict = Depends(require_admin)):
 async def approve_courier(courier_id: str, user: dict = Depends(require_admin)):
     """Kuryeyi onayla"""
     # Courier'i onayla
-    result = await db.couriers.update_one(
-        {"id": courier_id},
-        {"$set": {"is_approved": True}}
-    )
+    async with change_tracker.write('couriers') as version:
+        result = await db.couriers.update_one(
+            {"id": courier_id, "branch_id": branch_of(user)},
+            {"$set": {"is_approved": True, "version": version}}
+        )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Kurye bulunamadı")
@@ -271,37 +498,212 @@ async def approve_courier(courier_id: str, user: dict = Depends(require_admin)):
 @api_router.delete("/admin/couriers/{courier_id}")
 async def delete_courier(courier_id: str, user: dict = Depends(require_admin)):
     """Kuryeyi sil"""
-    # User'ı sil
-    await db.users.delete_one({"courier_id": courier_id})
+    branch_id = branch_of(user)
     
     # Courier'i sil
-    result = await db.couriers.delete_one({"id": courier_id})
+    async with change_tracker.write('couriers') as version:
+        result = await db.couriers.delete_one({"id": courier_id, "branch_id": branch_id})
+        if result.deleted_count:
+            await change_tracker.tombstone('couriers', [courier_id], version, branch_id)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Kurye bulunamadı")
     
+    # User'ı sil
+    await db.users.delete_one({"courier_id": courier_id})
+    
+    location_service.forget(courier_id)
+    
     return {"message": "Kurye silindi"}
 
+@api_router.get("/admin/couriers/locations")
+async def get_courier_locations(user: dict = Depends(require_admin)):
+    """Kuryelerin son bilinen konumları (tek worker'da bellekten)"""
+    return await location_service.get_latest(branch_id=branch_of(user))
+
+@api_router.get("/admin/dispatch/nearest-couriers")
+async def get_nearest_couriers(
+    lat: float,
+    lng: float,
+    limit: int = 5,
+    max_km: float = 10.0,
+    user: dict = Depends(require_admin)
+):
+    """Teslimat adresine en yakın müsait kuryeler"""
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise HTTPException(status_code=400, detail="Geçersiz koordinat")
+    
+    return await location_service.nearest_available(
+        lat, lng, limit=min(limit, 50), max_km=max_km, branch_id=branch_of(user)
+    )
+
+@api_router.get("/admin/admission/metrics")
+async def get_admission_metrics(user: dict = Depends(require_admin)):
+    """Öncelik sınıflarına göre kabul / kuyruk / reddetme sayaçları"""
+    return admission_controller.metrics()
+
+@api_router.get("/admin/singleflight/metrics")
+async def get_singleflight_metrics(user: dict = Depends(require_admin)):
+    """Birleştirilen / önbellekten dönen okuma sayaçları"""
+    return single_flight.metrics()
+
+@api_router.get("/admin/report-cache/metrics")
+async def get_report_cache_metrics(user: dict = Depends(require_admin)):
+    """Rapor önbelleği isabet / dosya sayaçları"""
+    return await run_in_threadpool(report_cache.metrics)
+
+@api_router.get("/admin/backups")
+async def list_backups(user: dict = Depends(require_admin)):
+    """Alınan yedekler (manifestler, en yeni önce)"""
+    branch_id = branch_of(user)
+    manifests = await run_in_threadpool(backup_service.list)
+    # Tam yedekler (branch_id None) zamanlanmış işten gelir, tüm şubeleri kapsar
+    return [m for m in manifests if m['branch_id'] in (branch_id, None)]
+
+@api_router.post("/admin/backups")
+async def create_backup(user: dict = Depends(require_admin)):
+    """Şubenin tüm koleksiyonlarını yedekle (geri yükleme: backup.py restore)"""
+    return await backup_service.create(label='manual', branch_id=branch_of(user))
+
+@api_router.get("/admin/idempotency/metrics")
+async def get_idempotency_metrics(user: dict = Depends(require_admin)):
+    """Idempotency-Key tekrar / çalıştırma sayaçları"""
+    return idempotency.metrics()
+
+@api_router.get("/admin/images/metrics")
+async def get_image_metrics(user: dict = Depends(require_admin)):
+    """Küçük görsel üretim kuyruğu"""
+    return image_store.metrics()
+
+@api_router.get("/admin/profiles")
+async def list_profiles(user: dict = Depends(require_admin)):
+    """Kaydedilen istek profilleri (en yeni önce)"""
+    return request_profiler.store.list()
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, user: dict = Depends(require_admin)):
+    """Süre dağılımı, Mongo komutları, explain planları ve yığın örnekleri"""
+    profile = await run_in_threadpool(request_profiler.store.get, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil bulunamadı")
+    return profile
+
+@api_router.get("/admin/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+async def get_profile_folded(profile_id: str, user: dict = Depends(require_admin)):
+    """Yığın örnekleri katlanmış formatta (flamegraph.pl / speedscope)"""
+    profile = await run_in_threadpool(request_profiler.store.get, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil bulunamadı")
+    stacks = profile['samples']['stacks']
+    return '\n'.join(f"{stack} {count}" for stack, count in stacks.items())
+
+@api_router.get("/admin/analytics/top-products")
+async def get_top_products(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 10,
+    order_type: Optional[str] = None,
+    user: dict = Depends(require_admin)
+):
+    """En çok satan ürünler (tarih: YYYY-MM-DD, bitiş dahil)"""
+    try:
+        start_dt, end_dt = parse_range(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih")
+    return await sales_analytics.top_products(
+        start_dt, end_dt, limit=min(limit, 100), order_type=order_type, branch_id=branch_of(user)
+    )
+
+@api_router.get("/admin/analytics/heatmap")
+async def get_sales_heatmap(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    product_id: Optional[str] = None,
+    user: dict = Depends(require_admin)
+):
+    """Haftanın günü x saat satış ısı haritası"""
+    try:
+        start_dt, end_dt = parse_range(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih")
+    return await sales_analytics.hourly_heatmap(start_dt, end_dt, product_id=product_id, branch_id=branch_of(user))
+
+@api_router.get("/admin/analytics/category-mix")
+async def get_category_mix(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    order_type: Optional[str] = None,
+    user: dict = Depends(require_admin)
+):
+    """Kategori bazında satış dağılımı"""
+    try:
+        start_dt, end_dt = parse_range(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih")
+    return await sales_analytics.category_mix(start_dt, end_dt, order_type=order_type, branch_id=branch_of(user))
+
+@api_router.get("/admin/analytics/durations")
+async def get_order_durations(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user: dict = Depends(require_admin)
+):
+    """Hazırlık ve teslim süreleri (kurye bazında), sipariş olay günlüğünden"""
+    try:
+        start_dt, end_dt = parse_range(start, end, default_days=7)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih")
+    return await order_events.duration_metrics(start_dt, end_dt, branch_of(user))
+
+@api_router.get("/admin/orders/{order_id}/events")
+async def get_order_events(order_id: str, user: dict = Depends(require_admin)):
+    """Siparişin durum geçmişi (silinmiş siparişler dahil)"""
+    return await order_events.history(order_id, branch_of(user))
+
+@api_router.get("/admin/forecast")
+async def get_forecast(refresh: bool = False, user: dict = Depends(require_admin)):
+    """Ertesi gün için ürün bazında saatlik satış tahmini (gün sonuna kadar önbellekte)"""
+    branch_id = branch_of(user)
+    target = demand_forecaster.next_day()
+    if not refresh:
+        cached = demand_forecaster.cached(target, branch_id)
+        if cached:
+            return cached
+    
+    history = await demand_forecaster.load_history(target, branch_id)
+    forecast = await run_in_threadpool(demand_forecaster.fit_predict, history, target)
+    demand_forecaster.store(forecast)
+    return forecast
+
 @api_router.get("/admin/stats/monthly")
 async def get_monthly_stats(user: dict = Depends(require_admin)):
     """Aylık istatistikler"""
     now = datetime.now(timezone.utc)
     current_month = now.strftime('%Y%m')
     
-    orders = await db.orders.find(
-        {'order_number': {'$regex': f'^SIP-{current_month}'}, 'status': {'$ne': 'cancelled'}},
-        {"_id": 0, "total_amount": 1, "status": 1}
-    ).to_list(10000)
-    
-    total_revenue = sum(order.get('total_amount', 0) for order in orders)
-    total_orders = len(orders)
+    async def load():
+        orders = await db.orders.find(
+            {
+                'branch_id': branch_of(user),
+                'order_number': {'$regex': f'^SIP-{current_month}'},
+                'status': {'$ne': 'cancelled'}
+            },
+            {"_id": 0, "total_amount": 1, "status": 1}
+        ).to_list(10000)
+        
+        total_revenue = sum(order.get('total_amount', 0) for order in orders)
+        total_orders = len(orders)
+        
+        return {
+            "month": now.strftime('%Y-%m'),
+            "total_orders": total_orders,
+            "total_revenue": total_revenue,
+            "average_order": total_revenue / total_orders if total_orders > 0 else 0
+        }
     
-    return {
-        "month": now.strftime('%Y-%m'),
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "average_order": total_revenue / total_orders if total_orders > 0 else 0
-    }
+    return await single_flight.do(
+        read_key('stats/monthly', user, current_month, collection_versions.get('orders')), load
+    )
 
 @api_router.get("/admin/stats/yearly")
 async def get_yearly_stats(user: dict = Depends(require_admin)):
@@ -309,55 +711,104 @@ async def get_yearly_stats(user: dict = Depends(require_admin)):
     now = datetime.now(timezone.utc)
     current_year = now.strftime('%Y')
     
-    orders = await db.orders.find(
-        {'order_number': {'$regex': f'^SIP-{current_year}'}, 'status': {'$ne': 'cancelled'}},
-        {"_id": 0, "total_amount": 1}
-    ).to_list(100000)
-    
-    total_revenue = sum(order.get('total_amount', 0) for order in orders)
-    total_orders = len(orders)
+    async def load():
+        orders = await db.orders.find(
+            {
+                'branch_id': branch_of(user),
+                'order_number': {'$regex': f'^SIP-{current_year}'},
+                'status': {'$ne': 'cancelled'}
+            },
+            {"_id": 0, "total_amount": 1}
+        ).to_list(100000)
+        
+        total_revenue = sum(order.get('total_amount', 0) for order in orders)
+        total_orders = len(orders)
+        
+        return {
+            "year": current_year,
+            "total_orders": total_orders,
+            "total_revenue": total_revenue,
+            "average_order": total_revenue / total_orders if total_orders > 0 else 0
+        }
     
-    return {
-        "year": current_year,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "average_order": total_revenue / total_orders if total_orders > 0 else 0
-    }
+    return await single_flight.do(
+        read_key('stats/yearly', user, current_year, collection_versions.get('orders')), load
+    )
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 @api_router.get("/admin/export/orders")
 async def export_orders(
+    request: Request,
     format: str = "excel",
     month: Optional[str] = None,
     user: dict = Depends(require_admin)
 ):
-    """Siparişleri export et (Excel veya PDF)"""
-    query = {}
+    """
+    Siparişleri export et (Excel).
+    Oluşturulan dosya dönem + veri sürümüne göre önbellekte tutulur:
+    kapanmış aylar tekrar oluşturulmaz, Range ile kaldığı yerden indirilebilir.
+    """
+    if format != "excel":
+        raise HTTPException(status_code=400, detail="Sadece excel formatı destekleniyor")
+    if month and not re.fullmatch(r'\d{4}-\d{2}', month):
+        raise HTTPException(status_code=400, detail="Ay YYYY-MM formatında olmalı")
+    
+    branch_id = branch_of(user)
+    query = {'branch_id': branch_id}
     if month:
         query['order_number'] = {'$regex': f'^SIP-{month.replace("-", "")}'}
-    
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
-    
-    if format == "excel":
-        excel_bytes = excel_service.generate_orders_report(
-            orders,
-            title=f"Sipariş Raporu - {month or 'Tüm Zamanlar'}"
-        )
-        return StreamingResponse(
-            iter([excel_bytes]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=siparisler-{month or 'tum'}.xlsx"}
+    period = month or 'all'
+    closed = is_closed_month(month)
+    
+    path = None if closed else report_cache.recent('orders', branch_id, period)
+    if path is None:
+        version = await orders_data_version(db, query)
+        path = report_cache.lookup('orders', branch_id, period, version, '.xlsx', closed=closed)
+        if path is None:
+            async def build():
+                orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
+                excel_bytes = await run_in_threadpool(
+                    render_orders_report,
+                    orders,
+                    title=f"Sipariş Raporu - {month or 'Tüm Zamanlar'}"
+                )
+                return await run_in_threadpool(
+                    report_cache.store, 'orders', branch_id, period, version, '.xlsx', excel_bytes
+                )
+            # Aynı rapor eşzamanlı istenirse tek kez oluşturulur
+            path = await single_flight.do(f"report|orders|{branch_id}|{period}|{version}", build, ttl=0)
+    
+    return file_response(
+        request,
+        path,
+        XLSX_MEDIA_TYPE,
+        etag=f'"{path.stem}"',
+        filename=f"siparisler-{month or 'tum'}.xlsx",
+    )
+
+async def backup_before_delete(label: str, branch_id: str, order_ids: List[str]):
+    """Silinecek siparişleri yedekle; yedek alınamazsa silme yapılmaz"""
+    if not BACKUP_BEFORE_DELETE:
+        return
+    try:
+        await backup_service.create(
+            label=label, collections=('orders',),
+            queries={'orders': {'id': {'$in': order_ids}}}, branch_id=branch_id
         )
-    else:
-        raise HTTPException(status_code=400, detail="Sadece excel formatı destekleniyor")
+    except Exception as e:
+        logger.error(f"Silme öncesi yedek alınamadı: {str(e)}")
+        raise HTTPException(status_code=500, detail="Yedek alınamadı, siparişler silinmedi")
 
 @api_router.get("/admin/export/daily")
 async def export_daily_and_clear(user: dict = Depends(require_admin)):
     """Günlük raporu indir ve o günün siparişlerini sil"""
+    branch_id = branch_of(user)
     today = datetime.now(timezone.utc).strftime('%Y%m%d')
     
     # Bugünün siparişlerini getir
     orders = await db.orders.find(
-        {'order_number': {'$regex': f'^SIP-{today}'}},
+        {'branch_id': branch_id, 'order_number': {'$regex': f'^SIP-{today}'}},
         {"_id": 0}
     ).sort("created_at", -1).to_list(10000)
     
@@ -365,13 +816,21 @@ async def export_daily_and_clear(user: dict = Depends(require_admin)):
         raise HTTPException(status_code=404, detail="Bugün sipariş bulunamadı")
     
     # Excel oluştur
-    excel_bytes = excel_service.generate_orders_report(
+    excel_bytes = await run_in_threadpool(
+        render_orders_report,
         orders,
         title=f"Gün Sonu Raporu - {datetime.now(timezone.utc).strftime('%d.%m.%Y')}"
     )
     
-    # Bugünün siparişlerini sil
-    await db.orders.delete_many({'order_number': {'$regex': f'^SIP-{today}'}})
+    # Rapora giren siparişleri sil
+    order_ids = [order['id'] for order in orders]
+    await backup_before_delete(f'day-close-{today}', branch_id, order_ids)
+    async with change_tracker.write('orders') as version:
+        await db.orders.delete_many({'branch_id': branch_id, 'id': {'$in': order_ids}})
+        await change_tracker.tombstone('orders', order_ids, version, branch_id)
+    
+    # Gün kapandı: tahmin bir sonraki istekte yeniden hesaplanır
+    demand_forecaster.invalidate(branch_id)
     
     return StreamingResponse(
         iter([excel_bytes]),
@@ -387,6 +846,7 @@ async def get_courier_daily_stats(user: dict = Depends(require_admin)):
     # Bugün teslim edilen paket siparişleri
     delivered_orders = await db.orders.find(
         {
+            'branch_id': branch_of(user),
             'order_number': {'$regex': f'^SIP-{today}'},
             'order_type': 'takeaway',
             'status': 'delivered',
@@ -419,6 +879,7 @@ async def get_courier_history(courier_id: str, user: dict = Depends(require_admi
     
     orders = await db.orders.find(
         {
+            'branch_id': branch_of(user),
             'order_number': {'$regex': f'^SIP-{today}'},
             'courier_id': courier_id
         },
@@ -436,11 +897,13 @@ async def get_courier_history(courier_id: str, user: dict = Depends(require_admi
 @api_router.post("/admin/courier/{courier_id}/settle")
 async def settle_courier_account(courier_id: str, user: dict = Depends(require_admin)):
     """Kurye hesabı kes - Excel indir ve geçmişi sil"""
+    branch_id = branch_of(user)
     today = datetime.now(timezone.utc).strftime('%Y%m%d')
     
     # Kuryenin bugünkü siparişlerini getir
     orders = await db.orders.find(
         {
+            'branch_id': branch_id,
             'order_number': {'$regex': f'^SIP-{today}'},
             'courier_id': courier_id
         },
@@ -455,16 +918,18 @@ async def settle_courier_account(courier_id: str, user: dict = Depends(require_a
     courier_name = f"{courier['first_name']}_{courier['last_name']}" if courier else "Kurye"
     
     # Excel oluştur
-    excel_bytes = excel_service.generate_orders_report(
+    excel_bytes = await run_in_threadpool(
+        render_orders_report,
         orders,
         title=f"Kurye Hesabı - {courier_name} - {datetime.now(timezone.utc).strftime('%d.%m.%Y')}"
     )
     
-    # Kuryenin bugünkü siparişlerini sil
-    await db.orders.delete_many({
-        'order_number': {'$regex': f'^SIP-{today}'},
-        'courier_id': courier_id
-    })
+    # Kuryenin rapora giren siparişlerini sil
+    order_ids = [order['id'] for order in orders]
+    await backup_before_delete(f'courier-settle-{today}', branch_id, order_ids)
+    async with change_tracker.write('orders') as version:
+        await db.orders.delete_many({'branch_id': branch_id, 'id': {'$in': order_ids}})
+        await change_tracker.tombstone('orders', order_ids, version, branch_id)
     
     return StreamingResponse(
         iter([excel_bytes]),
@@ -472,28 +937,128 @@ async def settle_courier_account(courier_id: str, user: dict = Depends(require_a
         headers={"Content-Disposition": f"attachment; filename=kurye-hesap-{courier_name}-{today}.xlsx"}
     )
 
+def build_zip(files: List[tuple]) -> bytes:
+    """(ad, içerik) listesi -> zip (xlsx zaten sıkıştırılmış: ZIP_STORED)"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+@api_router.post("/admin/couriers/settle")
+async def settle_all_couriers(user: dict = Depends(require_admin)):
+    """
+    Gün sonu: tüm kuryelerin hesabını tek seferde kes.
+    - Bugünün kurye siparişleri tek aggregation ile kuryelere bölünür
+    - Her kuryenin Excel'i süreç havuzunda paralel oluşturulur + özet sayfası
+    - Hepsi tek zip olarak döner; siparişler tek delete_many ile silinir
+    """
+    branch_id = branch_of(user)
+    now = datetime.now(timezone.utc)
+    today = now.strftime('%Y%m%d')
+    
+    groups = await db.orders.aggregate([
+        {'$match': {
+            'branch_id': branch_id,
+            'order_number': {'$regex': f'^SIP-{today}'},
+            'courier_id': {'$ne': None},
+        }},
+        {'$sort': {'created_at': -1}},
+        {'$project': {'_id': 0}},
+        {'$group': {
+            '_id': '$courier_id',
+            'orders': {'$push': '$$ROOT'},
+            'delivered_count': {'$sum': {'$cond': [{'$eq': ['$status', 'delivered']}, 1, 0]}},
+            'total_amount': {'$sum': {'$ifNull': ['$total_amount', 0]}},
+            'grand_total': {'$sum': {'$ifNull': ['$grand_total', '$total_amount']}},
+        }},
+    ], allowDiskUse=True).to_list(None)
+    
+    if not groups:
+        raise HTTPException(status_code=404, detail="Bugün kurye siparişi bulunamadı")
+    
+    couriers = await db.couriers.find(
+        {'branch_id': branch_id, 'id': {'$in': [group['_id'] for group in groups]}},
+        {'_id': 0, 'id': 1, 'first_name': 1, 'last_name': 1}
+    ).to_list(None)
+    names = {c['id']: f"{c['first_name']}_{c['last_name']}" for c in couriers}
+    # Başlık ve dosya adı aynı addan; aynı adlı (veya silinmiş) kuryeler id ile ayrılır
+    labels = {
+        group['_id']: re.sub(r'[^\w.-]', '_', f"{names.get(group['_id'], 'Kurye')}-{group['_id']}")
+        for group in groups
+    }
+    
+    groups.sort(key=lambda group: labels[group['_id']])
+    date_label = now.strftime('%d.%m.%Y')
+    workbooks = await render_workbooks([
+        (group['orders'], f"Kurye Hesabı - {labels[group['_id']]} - {date_label}")
+        for group in groups
+    ])
+    
+    summary_rows = [{
+        'courier_name': labels[group['_id']],
+        'order_count': len(group['orders']),
+        'delivered_count': group['delivered_count'],
+        'total_amount': group['total_amount'],
+        'grand_total': group['grand_total'],
+    } for group in groups]
+    summary = await run_in_threadpool(
+        render_settlement_summary, summary_rows, f"Kurye Hesap Özeti - {date_label}"
+    )
+    
+    files = [(f"00-ozet-{today}.xlsx", summary)]
+    for group, data in zip(groups, workbooks):
+        files.append((f"kurye-hesap-{labels[group['_id']]}-{today}.xlsx", data))
+    archive = await run_in_threadpool(build_zip, files)
+    
+    # Tüm kuryelerin rapora giren siparişleri tek yazma ile silinir
+    order_ids = [order['id'] for group in groups for order in group['orders']]
+    await backup_before_delete(f'couriers-settle-{today}', branch_id, order_ids)
+    async with change_tracker.write('orders') as version:
+        await db.orders.delete_many({'branch_id': branch_id, 'id': {'$in': order_ids}})
+        await change_tracker.tombstone('orders', order_ids, version, branch_id)
+    
+    return StreamingResponse(
+        iter_bytes(archive),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=kurye-hesaplari-{today}.zip",
+            "Content-Length": str(len(archive)),
+        }
+    )
+
 
 # ==================== COURIER ROUTES ====================
 
 @api_router.get("/courier/packages")
-async def get_packages(user: dict = Depends(require_courier)):
+async def get_packages(request: Request, response: Response, user: dict = Depends(require_courier)):
     """Paket siparişleri getir (kurye için)"""
-    orders = await db.orders.find(
-        {
-            "order_type": "takeaway",
-            "status": {"$in": ["pending", "ready"]},
-            "courier_id": None
-        },
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    for order in orders:
-        if isinstance(order['created_at'], str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order['updated_at'], str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
-    
-    return orders
+    branch_id = branch_of(user)
+    etag = collection_versions.etag('orders', extra=f'packages|{branch_id}')
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_cache_headers(response, etag)
+    
+    async def load():
+        orders = await db.orders.find(
+            {
+                "branch_id": branch_id,
+                "order_type": "takeaway",
+                "status": {"$in": ["pending", "ready"]},
+                "courier_id": None
+            },
+            {"_id": 0}
+        ).sort("created_at", -1).to_list(100)
+        
+        for order in orders:
+            if isinstance(order['created_at'], str):
+                order['created_at'] = datetime.fromisoformat(order['created_at'])
+            if isinstance(order['updated_at'], str):
+                order['updated_at'] = datetime.fromisoformat(order['updated_at'])
+        return orders
+    
+    return await single_flight.do(read_key('courier/packages', user, etag), load)
 
 @api_router.get("/courier/my-orders")
 async def get_my_orders(user: dict = Depends(require_courier)):
@@ -503,7 +1068,7 @@ async def get_my_orders(user: dict = Depends(require_courier)):
         raise HTTPException(status_code=400, detail="Kurye ID bulunamadı")
     
     orders = await db.orders.find(
-        {"courier_id": courier_id, "status": {"$nin": ["delivered", "cancelled"]}},
+        {"branch_id": branch_of(user), "courier_id": courier_id, "status": {"$nin": ["delivered", "cancelled"]}},
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
@@ -516,7 +1081,8 @@ async def get_my_orders(user: dict = Depends(require_courier)):
     return orders
 
 @api_router.put("/courier/orders/{order_id}/take")
-async def take_order(order_id: str, user: dict = Depends(require_courier)):
+@idempotency.idempotent
+async def take_order(order_id: str, request: Request, user: dict = Depends(require_courier)):
     """Siparişi al"""
     courier_id = user.get('courier_id')
     if not courier_id:
@@ -529,84 +1095,116 @@ async def take_order(order_id: str, user: dict = Depends(require_courier)):
     
     courier_name = f"{courier['first_name']} {courier['last_name']}"
     
-    # Siparişi güncelle
-    result = await db.orders.update_one(
-        {"id": order_id, "courier_id": None},
-        {"$set": {
-            "courier_id": courier_id,
-            "courier_name": courier_name,
-            "status": "preparing",
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=400, detail="Sipariş zaten alınmış veya bulunamadı")
-    
-    # Kuryeyi meşgul yap
-    await db.couriers.update_one(
-        {"id": courier_id},
-        {"$set": {"is_available": False}}
-    )
+    async with change_tracker.write('orders', 'couriers') as version:
+        # Siparişi güncelle
+        result = await db.orders.update_one(
+            {"id": order_id, "branch_id": branch_of(user), "courier_id": None},
+            {"$set": {
+                "courier_id": courier_id,
+                "courier_name": courier_name,
+                "status": "preparing",
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "version": version
+            }}
+        )
+        
+        if result.matched_count == 0:
+            raise HTTPException(status_code=400, detail="Sipariş zaten alınmış veya bulunamadı")
+        
+        # Kuryeyi meşgul yap
+        await db.couriers.update_one(
+            {"id": courier_id},
+            {"$set": {"is_available": False, "version": version}}
+        )
     
+    order_events.record(order_id, branch_of(user), 'assigned', status='preparing',
+                        courier_id=courier_id, user_id=user.get('user_id'), version=version)
     return {"message": "Sipariş alındı"}
 
 @api_router.put("/courier/orders/{order_id}/deliver")
-async def deliver_order(order_id: str, user: dict = Depends(require_courier)):
+@idempotency.idempotent
+async def deliver_order(order_id: str, request: Request, user: dict = Depends(require_courier)):
     """Siparişi teslim et"""
     courier_id = user.get('courier_id')
     
-    result = await db.orders.update_one(
-        {"id": order_id, "courier_id": courier_id},
-        {"$set": {
-            "status": "delivered",
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+    async with change_tracker.write('orders', 'couriers') as version:
+        order = await db.orders.find_one_and_update(
+            {"id": order_id, "branch_id": branch_of(user), "courier_id": courier_id},
+            {"$set": {
+                "status": "delivered",
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "version": version
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        
+        if order is None:
+            raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+        
+        # Kuryeyi müsait yap
+        await db.couriers.update_one(
+            {"id": courier_id},
+            {"$set": {"is_available": True, "version": version}}
+        )
     
-    # Kuryeyi müsait yap
-    await db.couriers.update_one(
-        {"id": courier_id},
-        {"$set": {"is_available": True}}
-    )
+    order_events.record(order_id, branch_of(user), 'status', status='delivered',
+                        courier_id=courier_id, user_id=user.get('user_id'), version=version)
+    await record_sales(order)
     
     return {"message": "Sipariş teslim edildi"}
 
 @api_router.put("/courier/orders/{order_id}/cancel")
-async def cancel_order_courier(order_id: str, user: dict = Depends(require_courier)):
+@idempotency.idempotent
+async def cancel_order_courier(order_id: str, request: Request, user: dict = Depends(require_courier)):
     """Siparişi iptal et"""
     courier_id = user.get('courier_id')
     
-    result = await db.orders.update_one(
-        {"id": order_id, "courier_id": courier_id},
-        {"$set": {
-            "status": "cancelled",
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    async with change_tracker.write('orders', 'couriers') as version:
+        result = await db.orders.update_one(
+            {"id": order_id, "branch_id": branch_of(user), "courier_id": courier_id},
+            {"$set": {
+                "status": "cancelled",
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "version": version
+            }}
+        )
+        
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+        
+        # Kuryeyi müsait yap
+        await db.couriers.update_one(
+            {"id": courier_id},
+            {"$set": {"is_available": True, "version": version}}
+        )
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+    order_events.record(order_id, branch_of(user), 'status', status='cancelled',
+                        courier_id=courier_id, user_id=user.get('user_id'), version=version)
+    return {"message": "Sipariş iptal edildi"}
+
+@api_router.post("/courier/location")
+async def post_location(input: LocationBatch, user: dict = Depends(require_courier)):
+    """Kurye konumu gönder (toplu gönderim desteklenir)"""
+    courier_id = user.get('courier_id')
+    if not courier_id:
+        raise HTTPException(status_code=400, detail="Kurye ID bulunamadı")
     
-    # Kuryeyi müsait yap
-    await db.couriers.update_one(
-        {"id": courier_id},
-        {"$set": {"is_available": True}}
+    accepted = location_service.add_points(
+        courier_id, [p.model_dump() for p in input.points], branch_id=branch_of(user)
     )
-    
-    return {"message": "Sipariş iptal edildi"}
+    return {"accepted": accepted}
 
 @api_router.get("/courier/my-stats")
 async def get_my_stats(user: dict = Depends(require_courier)):
     """Kuryenin bugünkü istatistikleri"""
     courier_id = user.get('courier_id')
+    branch_id = branch_of(user)
     today = datetime.now(timezone.utc).strftime('%Y%m%d')
     
     # Bugün teslim edilen siparişler
     delivered = await db.orders.count_documents({
+        'branch_id': branch_id,
         'order_number': {'$regex': f'^SIP-{today}'},
         'courier_id': courier_id,
         'status': 'delivered'
@@ -615,6 +1213,7 @@ async def get_my_stats(user: dict = Depends(require_courier)):
     # Bugünkü gelir
     delivered_orders = await db.orders.find(
         {
+            'branch_id': branch_id,
             'order_number': {'$regex': f'^SIP-{today}'},
             'courier_id': courier_id,
             'status': 'delivered'
@@ -637,6 +1236,7 @@ async def get_my_history(user: dict = Depends(require_courier)):
     
     orders = await db.orders.find(
         {
+            'branch_id': branch_of(user),
             'order_number': {'$regex': f'^SIP-{today}'},
             'courier_id': courier_id
         },
@@ -658,208 +1258,427 @@ async def get_my_history(user: dict = Depends(require_courier)):
 async def root():
     return {"message": "Döner Restoranı POS API", "version": "2.0"}
 
+@api_router.get("/branches", response_model=List[Branch])
+async def get_branches():
+    """Aktif şubeler (giriş / kurye kaydı ekranı için)"""
+    branches = await db.branches.find({"is_active": True}, {"_id": 0}).to_list(100)
+    for branch in branches:
+        if isinstance(branch['created_at'], str):
+            branch['created_at'] = datetime.fromisoformat(branch['created_at'])
+    return branches
+
 
 # ========== CATEGORY ENDPOINTS ==========
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(input: CategoryCreate, user: dict = Depends(require_admin)):
-    category = Category(**input.model_dump())
+    category = Category(**input.model_dump(), branch_id=branch_of(user))
     doc = category.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.categories.insert_one(doc)
+    async with change_tracker.write('categories') as version:
+        doc['version'] = version
+        await db.categories.insert_one(doc)
     return category
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories(active_only: bool = True):
-    query = {"is_active": True} if active_only else {}
-    categories = await db.categories.find(query, {"_id": 0}).to_list(100)
-    for cat in categories:
-        if isinstance(cat['created_at'], str):
-            cat['created_at'] = datetime.fromisoformat(cat['created_at'])
-    return categories
+async def get_categories(active_only: bool = True, branch_id: str = DEFAULT_BRANCH_ID):
+    query = {"branch_id": branch_id}
+    if active_only:
+        query["is_active"] = True
+    
+    async def load():
+        categories = await db.categories.find(query, {"_id": 0}).to_list(100)
+        for cat in categories:
+            if isinstance(cat['created_at'], str):
+                cat['created_at'] = datetime.fromisoformat(cat['created_at'])
+        return categories
+    
+    return await single_flight.do(
+        read_key('categories', None, branch_id, active_only, collection_versions.get('categories')), load
+    )
 
 
 # ========== PRODUCT ENDPOINTS ==========
 
 @api_router.post("/products", response_model=Product)
 async def create_product(input: ProductCreate, user: dict = Depends(require_admin)):
-    category = await db.categories.find_one({"id": input.category_id})
+    branch_id = branch_of(user)
+    category = await db.categories.find_one({"id": input.category_id, "branch_id": branch_id})
     if not category:
         raise HTTPException(status_code=404, detail="Kategori bulunamadı")
     
-    product = Product(**input.model_dump())
+    product = Product(**input.model_dump(), branch_id=branch_id)
     doc = product.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.products.insert_one(doc)
+    async with change_tracker.write('products') as version:
+        doc['version'] = version
+        await db.products.insert_one(doc)
+    product_search.add({**product.model_dump(), 'version': version})
+    pricing_service.put(doc)
     return product
 
+@api_router.get("/products/search", response_model=List[Product])
+async def search_products(
+    q: str,
+    limit: int = 20,
+    category_id: Optional[str] = None,
+    available_only: bool = True,
+    branch_id: str = DEFAULT_BRANCH_ID
+):
+    """Ürün ara (Türkçe karakter duyarsız, önek ve yazım hatası toleranslı)"""
+    return product_search.search(
+        q, limit=min(limit, 100), available_only=available_only,
+        category_id=category_id, branch_id=branch_id
+    )
+
 @api_router.get("/products", response_model=List[Product])
-async def get_products(category_id: Optional[str] = None, available_only: bool = True):
-    query = {}
+async def get_products(
+    request: Request,
+    response: Response,
+    category_id: Optional[str] = None,
+    available_only: bool = True,
+    branch_id: str = DEFAULT_BRANCH_ID
+):
+    etag = collection_versions.etag('products', extra=str(request.query_params))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_cache_headers(response, etag)
+    
+    query = {"branch_id": branch_id}
     if category_id:
         query["category_id"] = category_id
     if available_only:
         query["is_available"] = True
     
-    products = await db.products.find(query, {"_id": 0}).to_list(200)
-    for prod in products:
-        if isinstance(prod['created_at'], str):
-            prod['created_at'] = datetime.fromisoformat(prod['created_at'])
-    return products
+    async def load():
+        products = await db.products.find(query, {"_id": 0}).to_list(200)
+        for prod in products:
+            if isinstance(prod['created_at'], str):
+                prod['created_at'] = datetime.fromisoformat(prod['created_at'])
+        return products
+    
+    return await single_flight.do(read_key('products', None, etag), load)
+
+@api_router.put("/products/{product_id}/image", response_model=Product)
+async def upload_product_image(product_id: str, request: Request, user: dict = Depends(require_admin)):
+    """Ürün görseli yükle (gövde: ham görsel dosyası, Content-Type: image/*)"""
+    if not request.headers.get('content-type', '').startswith('image/'):
+        raise HTTPException(status_code=415, detail="Görsel dosyası bekleniyor")
+    
+    # Sınırı aşan yükleme sonuna kadar okunmaz
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > image_store.max_bytes:
+            raise HTTPException(status_code=413, detail="Görsel çok büyük")
+        chunks.append(chunk)
+    try:
+        image_id = await image_store.save(b''.join(chunks))
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async with change_tracker.write('products') as version:
+        product = await db.products.find_one_and_update(
+            {"id": product_id, "branch_id": branch_of(user)},
+            {"$set": {
+                "image_id": image_id,
+                "image_url": image_store.url(image_id, IMAGE_DEFAULT_SIZE),
+                "version": version
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    if not product:
+        raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+    if isinstance(product['created_at'], str):
+        product['created_at'] = datetime.fromisoformat(product['created_at'])
+    product_search.add(product)
+    return product
+
+@api_router.get("/images/{image_id}/{variant}")
+async def get_image(image_id: str, variant: str, request: Request):
+    """Ürün görseli (boyut: IMAGE_SIZES değerlerinden biri ya da 'full')"""
+    if not image_store.is_valid(image_id, variant):
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    path = await image_store.ensure(image_id, variant)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    # İçerik adreslenir: aynı URL hiç değişmez
+    return file_response(
+        request, path, 'image/jpeg', f'"{image_id}-{variant}"',
+        cache_control='public, max-age=31536000, immutable'
+    )
 
 
 # ========== TABLE ENDPOINTS ==========
 
 @api_router.post("/tables", response_model=Table)
 async def create_table(input: TableCreate, user: dict = Depends(require_admin)):
-    table = Table(**input.model_dump())
+    table = Table(**input.model_dump(), branch_id=branch_of(user))
     doc = table.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.tables.insert_one(doc)
+    async with change_tracker.write('tables') as version:
+        doc['version'] = version
+        await db.tables.insert_one(doc)
+    doc.pop('_id', None)
+    floor_service.apply(doc)
     return table
 
 @api_router.get("/tables", response_model=List[Table])
-async def get_tables():
-    tables = await db.tables.find({}, {"_id": 0}).to_list(100)
-    for table in tables:
-        if isinstance(table['created_at'], str):
-            table['created_at'] = datetime.fromisoformat(table['created_at'])
-    return tables
+async def get_tables(request: Request, response: Response, branch_id: str = DEFAULT_BRANCH_ID):
+    """Masa haritası (bellekten)"""
+    etag = floor_service.etag(branch_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_cache_headers(response, etag)
+    return floor_service.tables(branch_id)
+
+@api_router.get("/tables/stream")
+async def stream_tables(request: Request, branch_id: str = DEFAULT_BRANCH_ID):
+    """Masa değişiklikleri (Server-Sent Events): önce tam harita, sonra değişen masalar"""
+    queue = floor_service.subscribe(branch_id)
+    
+    async def events():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(floor_service.tables(branch_id), default=str)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    table = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if table is None:
+                    yield f"event: snapshot\ndata: {json.dumps(floor_service.tables(branch_id), default=str)}\n\n"
+                else:
+                    yield f"event: table\ndata: {json.dumps(table, default=str)}\n\n"
+        finally:
+            floor_service.unsubscribe(branch_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.put("/tables/{table_id}/status")
-async def update_table_status(table_id: str, is_occupied: bool):
-    result = await db.tables.update_one(
-        {"id": table_id},
-        {"$set": {"is_occupied": is_occupied}}
-    )
-    if result.matched_count == 0:
+async def update_table_status(table_id: str, is_occupied: bool, branch_id: str = DEFAULT_BRANCH_ID):
+    async with change_tracker.write('tables') as version:
+        table = await floor_service.set_occupied(table_id, branch_id, is_occupied, version)
+    if table is None:
         raise HTTPException(status_code=404, detail="Masa bulunamadı")
     return {"message": "Masa durumu güncellendi"}
 
 @api_router.put("/tables/{table_id}/toggle")
 async def toggle_table_status(table_id: str,user: dict = Depends(get_current_user)):
-    """Masa durumunu değiştir (dolu <-> boş)"""
-    table = await db.tables.find_one({"id": table_id})
-    if not table:
+    """Masa durumunu değiştir (dolu <-> boş) - tek atomik güncelleme"""
+    async with change_tracker.write('tables') as version:
+        table = await floor_service.toggle(table_id, branch_of(user), version)
+    if table is None:
         raise HTTPException(status_code=404, detail="Masa bulunamadı")
     
-    new_status = not table.get('is_occupied', False)
-    await db.tables.update_one(
-        {"id": table_id},
-        {"$set": {"is_occupied": new_status}}
-    )
-    
     return {
         "message": "Masa durumu değiştirildi",
-        "is_occupied": new_status
+        "is_occupied": table['is_occupied']
     }
 
 
 # ========== COURIER ENDPOINTS (ADMIN) ==========
 
 @api_router.get("/couriers", response_model=List[Courier])
-async def get_couriers(available_only: bool = False, approved_only: bool = True):
-    query = {}
+async def get_couriers(
+    request: Request,
+    response: Response,
+    available_only: bool = False,
+    approved_only: bool = True,
+    branch_id: str = DEFAULT_BRANCH_ID
+):
+    etag = collection_versions.etag('couriers', extra=str(request.query_params))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_cache_headers(response, etag)
+    
+    query = {"branch_id": branch_id}
     if available_only:
         query["is_available"] = True
     if approved_only:
         query["is_approved"] = True
     
-    couriers = await db.couriers.find(query, {"_id": 0}).to_list(100)
-    for courier in couriers:
-        if isinstance(courier['created_at'], str):
-            courier['created_at'] = datetime.fromisoformat(courier['created_at'])
-    return couriers
+    async def load():
+        couriers = await db.couriers.find(query, {"_id": 0}).to_list(100)
+        for courier in couriers:
+            if isinstance(courier['created_at'], str):
+                courier['created_at'] = datetime.fromisoformat(courier['created_at'])
+        return couriers
+    
+    return await single_flight.do(read_key('couriers', None, etag), load)
 
 
 # ========== ORDER ENDPOINTS ==========
 
 @api_router.post("/orders", response_model=Order)
-async def create_order(input: OrderCreate, user: dict = Depends(get_current_user)):
-    total = sum(item.quantity * item.price for item in input.items)
-    order_number = await get_next_order_number()
-    
-    table_name = None
-    if input.table_id:
-        table = await db.tables.find_one({"id": input.table_id})
-        if table:
-            table_name = f"Masa {table['table_number']}"
-            await db.tables.update_one(
-                {"id": input.table_id},
-                {"$set": {"is_occupied": True}}
-            )
+@idempotency.idempotent
+async def create_order(input: OrderCreate, request: Request, user: dict = Depends(get_current_user)):
+    if not input.items:
+        raise HTTPException(status_code=400, detail="Sipariş boş olamaz")
+    
+    branch_id = branch_of(user)
+    try:
+        pricing = await pricing_service.price_items([item.model_dump() for item in input.items], branch_id)
+    except PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    order_number = await get_next_order_number(branch_id)
     
     order = Order(
         order_number=order_number,
-        items=input.items,
-        total_amount=total,
+        items=pricing['items'],
+        total_amount=pricing['subtotal'],
+        tax_amount=pricing['tax_amount'],
+        grand_total=pricing['grand_total'],
         order_type=input.order_type,
         table_id=input.table_id,
-        table_name=table_name,
         customer_name=input.customer_name,
         customer_phone=input.customer_phone,
         customer_address=input.customer_address,
-        notes=input.notes
+        notes=input.notes,
+        branch_id=branch_id
     )
     
-    doc = order.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    await db.orders.insert_one(doc)
+    changed = ('orders', 'tables') if input.table_id else ('orders',)
+    async with change_tracker.write(*changed) as version:
+        if input.table_id:
+            # Masayı dolu yap, siparişi bağla ve masa adını aynı sorguda al
+            table = await floor_service.attach_order(input.table_id, branch_id, order.id, version)
+            if table:
+                order.table_name = f"Masa {table['table_number']}"
+        doc = order.model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['updated_at'] = doc['updated_at'].isoformat()
+        doc['version'] = version
+        doc.update(search_fields(doc))
+        await db.orders.insert_one(doc)
+    
+    order_events.record(order.id, branch_id, 'created', status=order.status,
+                        user_id=user.get('user_id'), version=version)
+    
+    # Müşteri rehberini güncelle (hata siparişi engellemez)
+    if input.customer_phone:
+        try:
+            await customer_directory.upsert_from_order(
+                input.customer_name, input.customer_phone, input.customer_address
+            )
+        except Exception as e:
+            logging.error(f"Müşteri kaydı güncellenemedi: {str(e)}")
     
     return order
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(status: Optional[str] = None, user: dict = Depends(get_current_user)):
-    query = {"status": status} if status else {}
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
-    for order in orders:
-        if isinstance(order['created_at'], str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order['updated_at'], str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
-    return orders
+async def get_orders(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    branch_id = branch_of(user)
+    etag = collection_versions.etag('orders', extra=f"{request.query_params}|{branch_id}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_cache_headers(response, etag)
+    
+    query = {"branch_id": branch_id}
+    if status:
+        query["status"] = status
+    async def load():
+        orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
+        for order in orders:
+            if isinstance(order['created_at'], str):
+                order['created_at'] = datetime.fromisoformat(order['created_at'])
+            if isinstance(order['updated_at'], str):
+                order['updated_at'] = datetime.fromisoformat(order['updated_at'])
+        return orders
+    
+    return await single_flight.do(read_key('orders', user, etag), load)
+
+@api_router.get("/orders/search")
+async def search_orders(
+    number: Optional[str] = None,
+    phone: Optional[str] = None,
+    name: Optional[str] = None,
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Geçmiş sipariş ara: sipariş no (tam), telefon öneki, müşteri adı öneki,
+    `q` ile ad + not metni. Sonraki sayfa için dönen `next_cursor` gönderilir.
+    """
+    try:
+        return await order_search.search(
+            branch_of(user), number=number, phone=phone, name=name, q=q, status=status,
+            limit=max(1, min(limit, 100)), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str, user: dict = Depends(get_current_user)):
+@idempotency.idempotent
+async def update_order_status(order_id: str, status: str, request: Request, user: dict = Depends(get_current_user)):
     valid_statuses = ["pending", "preparing", "ready", "delivered", "cancelled"]
     if status not in valid_statuses:
         raise HTTPException(status_code=400, detail="Geçersiz durum")
     
-    order = await db.orders.find_one({"id": order_id})
-    if not order:
-        raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
-    
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {
-            "status": status,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    
-    if status in ["delivered", "cancelled"]:
-        if order.get('table_id'):
-            await db.tables.update_one(
-                {"id": order['table_id']},
-                {"$set": {"is_occupied": False}}
-            )
-        if order.get('courier_id'):
-            await db.couriers.update_one(
-                {"id": order['courier_id']},
-                {"$set": {"is_available": True}}
-            )
+    branch_id = branch_of(user)
+    closing = status in ["delivered", "cancelled"]
+    changed = ('orders', 'tables', 'couriers') if closing else ('orders',)
+    async with change_tracker.write(*changed) as version:
+        # Güncelleme ve önceki hali tek round trip
+        order = await db.orders.find_one_and_update(
+            {"id": order_id, "branch_id": branch_id},
+            {"$set": {
+                "status": status,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "version": version
+            }},
+            projection={"_id": 0}
+        )
+        if not order:
+            raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+        
+        if closing:
+            if order.get('table_id'):
+                await floor_service.release_order(order['table_id'], branch_id, order_id, version)
+            if order.get('courier_id'):
+                await db.couriers.update_one(
+                    {"id": order['courier_id']},
+                    {"$set": {"is_available": True, "version": version}}
+                )
+    
+    order_events.record(order_id, branch_id, 'status', status=status, previous_status=order.get('status'),
+                        courier_id=order.get('courier_id'), user_id=user.get('user_id'), version=version)
+    if status == "delivered":
+        await record_sales(order)
     
     return {"message": "Sipariş durumu güncellendi"}
 
+def check_receipt_layout(layout: str):
+    if layout not in RECEIPT_LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"Geçersiz fiş düzeni. Geçerli: {', '.join(RECEIPT_LAYOUTS)}")
+
 @api_router.get("/orders/{order_id}/receipt")
-async def generate_receipt(order_id: str):
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+async def generate_receipt(order_id: str, layout: str = "a4", user: dict = Depends(get_current_user)):
+    check_receipt_layout(layout)
+    order = await db.orders.find_one({"id": order_id, "branch_id": branch_of(user)}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
     
     try:
-        pdf_bytes = pdf_service.generate_receipt(order)
+        pdf_bytes = await run_in_threadpool(render_receipt, order, layout)
         return StreamingResponse(
             iter([pdf_bytes]),
             media_type="application/pdf",
@@ -871,41 +1690,158 @@ async def generate_receipt(order_id: str):
         logging.error(f"PDF oluşturma hatası: {str(e)}")
         raise HTTPException(status_code=500, detail="PDF oluşturulamadı")
 
+RECEIPT_BATCH_LIMIT = int(os.environ.get('RECEIPT_BATCH_LIMIT', '300'))
+
+@api_router.post("/receipts/batch")
+async def generate_receipt_batch(input: ReceiptBatch, user: dict = Depends(get_current_user)):
+    """Birden çok fiş tek sorgu + tek çok sayfalı PDF (gün sonu / yoğun saat baskısı)"""
+    check_receipt_layout(input.layout)
+    query = {'branch_id': branch_of(user)}
+    if input.order_ids:
+        if len(input.order_ids) > RECEIPT_BATCH_LIMIT:
+            raise HTTPException(status_code=400, detail=f"En fazla {RECEIPT_BATCH_LIMIT} fiş yazdırılabilir")
+        query['id'] = {'$in': input.order_ids}
+    else:
+        day = input.date or datetime.now(timezone.utc).strftime('%Y%m%d')
+        if not (len(day) == 8 and day.isdigit()):
+            raise HTTPException(status_code=400, detail="Tarih YYYYMMDD formatında olmalı")
+        query['order_number'] = {'$regex': f'^SIP-{day}'}
+        if input.order_type:
+            query['order_type'] = input.order_type
+        if input.courier_id:
+            query['courier_id'] = input.courier_id
+        if input.status:
+            query['status'] = input.status
+    
+    orders = await db.orders.find(query, {"_id": 0}).sort("order_number", 1).to_list(RECEIPT_BATCH_LIMIT + 1)
+    if not orders:
+        raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+    if len(orders) > RECEIPT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"En fazla {RECEIPT_BATCH_LIMIT} fiş yazdırılabilir; filtreyi daraltın")
+    if input.order_ids:
+        # İstenen sırada yazdır
+        position = {order_id: index for index, order_id in enumerate(input.order_ids)}
+        orders.sort(key=lambda o: position[o['id']])
+    
+    try:
+        pdf_bytes = await run_in_threadpool(render_receipts, orders, input.layout)
+    except Exception as e:
+        logging.error(f"Toplu PDF oluşturma hatası: {str(e)}")
+        raise HTTPException(status_code=500, detail="PDF oluşturulamadı")
+    
+    return StreamingResponse(
+        iter_bytes(pdf_bytes),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename=fisler-{orders[0]['order_number']}-{len(orders)}.pdf",
+            "Content-Length": str(len(pdf_bytes)),
+            "X-Receipt-Count": str(len(orders)),
+        }
+    )
+
+
+# ========== SYNC ENDPOINTS ==========
+
+@api_router.get("/sync")
+async def sync_changes(
+    since: int = 0,
+    collections: Optional[str] = None,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Delta senkronizasyon: `since` sürümünden sonra eklenen/değişen/silinen dokümanlar.
+    since=0 tam anlık görüntüyü sayfa sayfa döndürür: `cursor` doluysa aynı koleksiyonlarla
+    cursor ile tekrar istenir, anlık görüntü bitince dönen `version` ile delta moduna geçilir.
+    Dönen `version` bir sonraki istekte gönderilir; `has_more` true ise hemen tekrar istenmelidir.
+    """
+    try:
+        names = parse_collections(collections)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Bilinmeyen koleksiyon: {e}")
+    
+    try:
+        return await change_tracker.changes_since(
+            since, names, limit=max(1, min(limit, 2000)), branch_id=branch_of(user), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ========== CUSTOMER ENDPOINTS ==========
+
+@api_router.get("/customers/search")
+async def search_customers(q: str, limit: int = 10, user: dict = Depends(get_current_user)):
+    """Telefon öneki veya isim ile müşteri ara (otomatik tamamlama)"""
+    return await customer_directory.search(q, limit=min(limit, 50))
+
+@api_router.get("/customers/by-phone")
+async def get_customer_by_phone(phone: str, user: dict = Depends(get_current_user)):
+    """Telefon numarası ile müşteri getir"""
+    customer = await customer_directory.get_by_phone(phone)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Müşteri bulunamadı")
+    return customer
+
 
 # ========== STATISTICS ENDPOINTS ==========
 
 @api_router.get("/stats/dashboard")
 async def get_dashboard_stats(user: dict = Depends(require_admin)):
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    preparing_orders = await db.orders.count_documents({"status": "preparing"})
-    
+    branch_id = branch_of(user)
     today = datetime.now(timezone.utc).strftime('%Y%m%d')
-    today_orders = await db.orders.count_documents({'order_number': {'$regex': f'^SIP-{today}'}})
     
-    today_orders_data = await db.orders.find(
-        {'order_number': {'$regex': f'^SIP-{today}'}, 'status': {'$ne': 'cancelled'}},
-        {"_id": 0, "total_amount": 1}
-    ).to_list(1000)
-    today_revenue = sum(order.get('total_amount', 0) for order in today_orders_data)
-    
-    occupied_tables = await db.tables.count_documents({"is_occupied": True})
-    available_couriers = await db.couriers.count_documents({"is_available": True, "is_approved": True})
+    async def load():
+        total_orders = await db.orders.count_documents({"branch_id": branch_id})
+        pending_orders = await db.orders.count_documents({"branch_id": branch_id, "status": "pending"})
+        preparing_orders = await db.orders.count_documents({"branch_id": branch_id, "status": "preparing"})
+        
+        today_orders = await db.orders.count_documents(
+            {'branch_id': branch_id, 'order_number': {'$regex': f'^SIP-{today}'}}
+        )
+        
+        today_orders_data = await db.orders.find(
+            {'branch_id': branch_id, 'order_number': {'$regex': f'^SIP-{today}'}, 'status': {'$ne': 'cancelled'}},
+            {"_id": 0, "total_amount": 1}
+        ).to_list(1000)
+        today_revenue = sum(order.get('total_amount', 0) for order in today_orders_data)
+        
+        occupied_tables = await db.tables.count_documents({"branch_id": branch_id, "is_occupied": True})
+        available_couriers = await db.couriers.count_documents(
+            {"branch_id": branch_id, "is_available": True, "is_approved": True}
+        )
+        
+        return {
+            "total_orders": total_orders,
+            "today_orders": today_orders,
+            "today_revenue": today_revenue,
+            "pending_orders": pending_orders,
+            "preparing_orders": preparing_orders,
+            "occupied_tables": occupied_tables,
+            "available_couriers": available_couriers
+        }
     
-    return {
-        "total_orders": total_orders,
-        "today_orders": today_orders,
-        "today_revenue": today_revenue,
-        "pending_orders": pending_orders,
-        "preparing_orders": preparing_orders,
-        "occupied_tables": occupied_tables,
-        "available_couriers": available_couriers
-    }
+    versions = [collection_versions.get(name) for name in ('orders', 'tables', 'couriers')]
+    return await single_flight.do(read_key('stats/dashboard', user, today, *versions), load)
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# En içte: profil süresi kuyruk beklemesi ve sıkıştırmayı içermez
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+)
+
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+# Kuyruk dışında: kök span istemcinin gördüğü süreyi (kuyruk beklemesi dahil) kapsar
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -920,6 +1856,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_background_services():
+    await collection_versions.refresh()
+    collection_versions.start()
+    await branch_service.ensure_default()
+    await branch_service.ensure_indexes()
+    # Şube öncesi kayıtlar varsayılan şubeye atanır (sonraki açılışlarda iş yapmaz)
+    backfilled = await branch_service.backfill()
+    if backfilled:
+        logger.info(f"branch_id atanan dokümanlar: {backfilled}")
+    await location_service.ensure_collection()
+    await location_service.ensure_indexes()
+    await customer_directory.ensure_indexes()
+    await sales_analytics.ensure_indexes()
+    await change_tracker.ensure_indexes()
+    await order_events.ensure_indexes()
+    await idempotency.ensure_indexes()
+    await order_search.ensure_indexes()
+    await customer_directory.load()
+    customer_directory.start()
+    await product_search.reload()
+    product_search.start()
+    await floor_service.load()
+    floor_service.start()
+    
+    # Rapor servislerini istek yolunu bekletmeden arka planda hazırla
+    if os.environ.get('PREWARM_REPORT_SERVICES', '0') == '1':
+        asyncio.get_running_loop().run_in_executor(None, prewarm_report_services)
+    location_service.start()
+    order_events.start()
+    image_store.start()
+    request_profiler.start(db)
+    tracer.exporter.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    shutdown_report_services()
+    request_profiler.stop()
+    await tracer.exporter.stop()
+    await location_service.stop()
+    await order_events.stop()
+    await image_store.stop()
+    await floor_service.stop()
+    await customer_directory.stop()
+    await product_search.stop()
+    await collection_versions.stop()
     client.close()
@@ -0,0 +1,74 @@
+# Dosya Konumu: backend/setup_sharding.py
+#
+# Çoklu şube için veritabanı hazırlığı:
+#   1. branch_id olmayan eski kayıtları varsayılan şubeye ata
+#   2. Şube önekli indeksleri ve shard key indeksini oluştur
+#   3. mongos'a bağlıysa orders koleksiyonunu {branch_id: 1, id: 'hashed'} ile shard'la
+#
+# Yerel test için tek düğümlü sharded cluster (1 config + 1 shard + mongos):
+#   mongod --configsvr --replSet cfg --port 27019 --dbpath /tmp/cfg
+#   mongod --shardsvr --replSet sh0 --port 27018 --dbpath /tmp/sh0
+#   mongosh --port 27019 --eval 'rs.initiate({_id: "cfg", configsvr: true, members: [{_id: 0, host: "localhost:27019"}]})'
+#   mongosh --port 27018 --eval 'rs.initiate({_id: "sh0", members: [{_id: 0, host: "localhost:27018"}]})'
+#   mongos --configdb cfg/localhost:27019 --port 27017
+#   mongosh --port 27017 --eval 'sh.addShard("sh0/localhost:27018")'
+# Ardından MONGO_URL=mongodb://localhost:27017 ile bu script çalıştırılır.
+# Shard key branch_id önekli olduğu için bir şubenin sorguları sadece o şubenin
+# chunk'larına gider; şube eklendikçe şube başına sorgu maliyeti değişmez.
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+CURRENT_DIR = Path(__file__).parent
+sys.path.append(str(CURRENT_DIR))
+load_dotenv(CURRENT_DIR / '.env')
+
+from branch_service import BranchService, ORDERS_SHARD_KEY
+
+
+async def setup_sharding():
+    mongo_url = os.environ.get('MONGO_URL')
+    if not mongo_url:
+        print("❌ HATA: .env dosyasında MONGO_URL bulunamadı!")
+        return
+
+    client = AsyncIOMotorClient(mongo_url)
+    db_name = os.environ.get('DB_NAME', 'restoran_db')
+    db = client[db_name]
+    branches = BranchService(db)
+
+    await branches.ensure_default()
+    updated = await branches.backfill()
+    for name, count in updated.items():
+        print(f"✓ {name}: {count} dokümana branch_id atandı")
+
+    await branches.ensure_indexes()
+    print("✓ Şube indeksleri hazır")
+
+    hello = await client.admin.command('hello')
+    if hello.get('msg') != 'isdbgrid':
+        print("ℹ️  mongos'a bağlı değil: shard işlemi atlandı (indeksler shardCollection için hazır)")
+        client.close()
+        return
+
+    await client.admin.command('enableSharding', db_name)
+    try:
+        await client.admin.command('shardCollection', f"{db_name}.orders", key=ORDERS_SHARD_KEY)
+        print(f"✅ {db_name}.orders shard'landı: {ORDERS_SHARD_KEY}")
+    except Exception as e:
+        # Koleksiyon zaten shard'lıysa hata döner
+        print(f"⚠️ UYARI: shardCollection: {e}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    asyncio.run(setup_sharding())
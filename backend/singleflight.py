@@ -0,0 +1,69 @@
+# İstek Birleştirme (single-flight) - aynı anda gelen özdeş okumalar tek sorguyu paylaşır
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Aynı anahtarla eşzamanlı gelen çağrılar tek bir sorgunun sonucunu bekler.
+    - Sorgu ayrı bir görevde çalışır; ilk istemci bağlantıyı kesse de diğerleri sonucu alır
+    - İsteğe bağlı kısa TTL: sonuç birkaç yüz ms boyunca tekrar kullanılır
+    - Dönen nesne paylaşılır, çağıranlar değiştirmemelidir
+    """
+
+    def __init__(self, ttl: float = 0.5, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._results: Dict[str, Tuple[float, Any]] = {}
+        self.calls = 0
+        self.executed = 0
+        self.shared = 0
+        self.cache_hits = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """factory() sonucunu döndür; aynı anahtarlı çağrılar tek çalıştırmayı paylaşır"""
+        self.calls += 1
+        ttl = self.ttl if ttl is None else ttl
+        if ttl > 0:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t, ttl))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future, ttl: float):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # Hata önbelleğe alınmaz, bir sonraki çağrı yeniden dener
+            return
+        if ttl > 0:
+            now = time.monotonic()
+            if len(self._results) >= self.max_entries:
+                self._results = {k: v for k, v in self._results.items() if v[0] > now}
+                if len(self._results) >= self.max_entries:
+                    self._results.clear()
+            self._results[key] = (now + ttl, task.result())
+
+    def metrics(self) -> dict:
+        return {
+            'calls': self.calls,
+            'executed': self.executed,
+            'shared': self.shared,
+            'cache_hits': self.cache_hits,
+            'in_flight': len(self._inflight),
+            'saved_ratio': round(1 - self.executed / self.calls, 4) if self.calls else 0,
+        }
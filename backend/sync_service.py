@@ -0,0 +1,239 @@
+# Delta Senkronizasyon Servisi (POS terminalleri ve kurye uygulaması)
+import base64
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+SYNC_COLLECTIONS = ('orders', 'tables', 'categories', 'products', 'couriers')
+TOMBSTONE_COLLECTION = 'tombstones'
+COUNTER_ID = 'change_seq'
+
+
+def _encode_cursor(value: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Geçersiz senkron imleci")
+    if not isinstance(value, dict) or not isinstance(value.get('version'), int):
+        raise ValueError("Geçersiz senkron imleci")
+    return value
+
+
+class ChangeTracker:
+    """
+    Her yazmada artan global değişiklik sırası.
+    - Yazılan dokümana `version` alanı olarak işlenir
+    - Silinen dokümanlar için tombstone kaydı tutulur
+    - /sync?since=<version> sadece o sürümden sonra değişenleri döndürür
+    - Diğer worker'larda süren yazmalar görülemez: bir sürüm ancak
+      `settle_seconds` önce ayrılmışsa onaylanır (yazma bloğu o sürede biter).
+      Daha yeni değişiklikler yine gönderilir, onaylanan sürüm geride kalır ve
+      sonraki istekte tekrar gelirler (istemci için upsert: zararsız)
+    """
+
+    def __init__(self, db, collection_versions=None, tombstone_days: int = 30,
+                 settle_seconds: float = 5.0):
+        self.db = db
+        # ETag için koleksiyon sayaçları da aynı yazmada güncellenir
+        self.collection_versions = collection_versions
+        self.tombstone_days = tombstone_days
+        self.settle_seconds = settle_seconds
+        self._pending: Set[int] = set()
+        # (görülme zamanı, sayaç değeri); süresi dolanlar _settled'a katlanır
+        self._observed: Deque[Tuple[float, int]] = deque()
+        self._settled = 0
+
+    async def ensure_indexes(self):
+        # İstemciler kendi şubelerinin değişikliklerini ister
+        for name in SYNC_COLLECTIONS:
+            await self.db[name].create_index([('branch_id', 1), ('version', 1)])
+        await self.db[TOMBSTONE_COLLECTION].create_index([('branch_id', 1), ('version', 1)])
+        await self.db[TOMBSTONE_COLLECTION].create_index(
+            'deleted_at', expireAfterSeconds=self.tombstone_days * 24 * 3600
+        )
+
+    async def next_version(self) -> int:
+        doc = await self.db.counters.find_one_and_update(
+            {'_id': COUNTER_ID},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._observe(doc['seq'])
+        return doc['seq']
+
+    async def current_version(self) -> int:
+        doc = await self.db.counters.find_one({'_id': COUNTER_ID})
+        seq = doc['seq'] if doc else 0
+        self._observe(seq)
+        return seq
+
+    def _observe(self, seq: int):
+        self._observed.append((time.monotonic(), seq))
+        self.settled_version()
+
+    def settled_version(self) -> int:
+        """`settle_seconds` önce görülmüş en büyük sayaç: bu sürüme kadar tüm yazmalar bitmiştir"""
+        cutoff = time.monotonic() - self.settle_seconds
+        while self._observed and self._observed[0][0] <= cutoff:
+            self._settled = max(self._settled, self._observed.popleft()[1])
+        return self._settled
+
+    @asynccontextmanager
+    async def write(self, *collections: str):
+        """
+        Yazma bloğu için sürüm numarası ver.
+            async with change_tracker.write('orders') as version:
+                await db.orders.update_one(..., {'$set': {..., 'version': version}})
+        """
+        version = await self.next_version()
+        self._pending.add(version)
+        try:
+            yield version
+        finally:
+            self._pending.discard(version)
+            if self.collection_versions is not None:
+                await self.collection_versions.bump(*collections)
+
+    async def tombstone(self, collection: str, doc_ids: List[str], version: int,
+                        branch_id: Optional[str] = None):
+        """Silinen dokümanları kaydet"""
+        if not doc_ids:
+            return
+        now = datetime.now(timezone.utc)
+        await self.db[TOMBSTONE_COLLECTION].insert_many([
+            {'collection': collection, 'doc_id': doc_id, 'branch_id': branch_id,
+             'version': version, 'deleted_at': now}
+            for doc_id in doc_ids
+        ], ordered=False)
+
+    async def changes_since(self, since: int, collections=SYNC_COLLECTIONS, limit: int = 500,
+                            branch_id: Optional[str] = None, cursor: Optional[str] = None) -> dict:
+        """
+        `since` sürümünden sonraki değişiklikler (branch_id verilirse sadece o şube).
+        Dönen `version` istemcinin bir sonraki istekte göndereceği değerdir.
+        Sayfa bir sürümün ortasında kesilmez: aynı yazma bloğunda (aynı sürümde)
+        yazılan dokümanların hepsi aynı sayfada gelir, sayfa `limit`'i aşabilir.
+        since=0 tam anlık görüntüdür, `cursor` ile sayfa sayfa okunur (bkz. _snapshot).
+        """
+        scope = {'branch_id': branch_id} if branch_id else {}
+        upper = await self.current_version()
+        # Onaylanan sürüm: diğer worker'lar için bekleme süresi, bu worker için süren yazmalar
+        confirmed = self.settled_version()
+        if self._pending:
+            confirmed = min(confirmed, min(self._pending) - 1)
+
+        if since <= 0 or cursor:
+            return await self._snapshot(collections, limit, scope, min(upper, confirmed), cursor)
+
+        result: Dict[str, dict] = {}
+        has_more = False
+        for name in collections:
+            query = {**scope, 'version': {'$gt': since, '$lte': upper}}
+            docs = await self.db[name].find(query, {'_id': 0}).sort('version', 1).to_list(limit + 1)
+            if len(docs) > limit:
+                has_more = True
+                last = docs[limit - 1]['version']
+                upper = min(upper, last)
+                if docs[limit]['version'] == last:
+                    # Son sürümün kalanları da alınır
+                    query['version']['$lte'] = last
+                    docs = await self.db[name].find(query, {'_id': 0}).sort('version', 1).to_list(None)
+                else:
+                    docs = docs[:limit]
+            result[name] = {'changed': docs, 'deleted': []}
+
+        tombstones = await self.db[TOMBSTONE_COLLECTION].find(
+            {**scope, 'version': {'$gt': since, '$lte': upper}, 'collection': {'$in': list(collections)}},
+            {'_id': 0, 'collection': 1, 'doc_id': 1}
+        ).to_list(None)
+        for tombstone in tombstones:
+            result[tombstone['collection']]['deleted'].append(tombstone['doc_id'])
+
+        # Sayfa sınırına takılan koleksiyon varsa diğerlerinde de sınırdan sonrakileri gönderme
+        if has_more:
+            for name in collections:
+                result[name]['changed'] = [
+                    doc for doc in result[name]['changed'] if doc.get('version', 0) <= upper
+                ]
+
+        # Henüz onaylanmayan sürümler tekrar gönderilir; geri gidilmez
+        version = max(since, min(upper, confirmed))
+        return {
+            'version': version,
+            'full': False,
+            # Onay beklemeye takıldıysa hemen tekrar istemek aynı sayfayı getirir
+            'has_more': has_more and version == upper,
+            'cursor': None,
+            'collections': result,
+        }
+
+    async def _snapshot(self, collections, limit: int, scope: dict, start_version: int,
+                        cursor: Optional[str]) -> dict:
+        """
+        Tam anlık görüntü: eski (sürümsüz) dokümanlar dahil, koleksiyon sırasıyla `_id`'ye göre
+        en fazla `limit` doküman. Sürüm ilk sayfada sabitlenir ve imleçte taşınır; anlık görüntü
+        bitene kadar `version` 0 döner, bitince sabitlenen sürüm döner ve istemci delta moduna
+        geçer. Sayfalar arasında değişenler o sürümden sonraki deltada tekrar gelir.
+        """
+        position = _decode_cursor(cursor) if cursor else {'version': start_version}
+        names = list(collections)
+        after = None
+        if cursor:
+            if position.get('collection') not in names:
+                raise ValueError("Geçersiz senkron imleci")
+            names = names[names.index(position['collection']):]
+            after = position.get('after')
+            if after is not None and ObjectId.is_valid(after):
+                after = ObjectId(after)
+
+        result: Dict[str, dict] = {name: {'changed': [], 'deleted': []} for name in collections}
+        remaining = limit
+        next_cursor = None
+        for index, name in enumerate(names):
+            query = {**scope, '_id': {'$gt': after}} if index == 0 and after is not None else scope
+            docs = await self.db[name].find(query).sort('_id', 1).to_list(remaining + 1)
+            if len(docs) > remaining:
+                # Bir önceki koleksiyon tam sınırda bittiyse bu koleksiyon baştan okunur
+                last = docs[remaining - 1]['_id'] if remaining else None
+                next_cursor = _encode_cursor({
+                    'version': position['version'],
+                    'collection': name,
+                    'after': str(last) if last is not None else None,
+                })
+                docs = docs[:remaining]
+            for doc in docs:
+                doc.pop('_id')
+            result[name]['changed'] = docs
+            remaining -= len(docs)
+            if next_cursor:
+                break
+
+        return {
+            'version': 0 if next_cursor else position['version'],
+            'full': True,
+            'has_more': next_cursor is not None,
+            'cursor': next_cursor,
+            'collections': result,
+        }
+
+
+def parse_collections(value: Optional[str]):
+    """'orders,tables' -> ('orders', 'tables'); bilinmeyenler ValueError"""
+    if not value:
+        return SYNC_COLLECTIONS
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in names if name not in SYNC_COLLECTIONS]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    return names
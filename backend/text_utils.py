@@ -0,0 +1,48 @@
+# Türkçe metin normalizasyonu yardımcıları
+import re
+from typing import List, Optional
+
+# Python'un str.lower() fonksiyonu I/İ harflerini Türkçe kurallara göre çevirmez
+_TURKISH_LOWER = str.maketrans({'I': 'ı', 'İ': 'i'})
+# Klavyesinde Türkçe karakter olmayan cihazlar için ASCII karşılıklar
+_ASCII_FOLD = str.maketrans('ıçğöşüâîû', 'icgosuaiu')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def turkish_lower(text: str) -> str:
+    """Türkçe kurallarıyla küçük harfe çevir (I -> ı, İ -> i)"""
+    return text.translate(_TURKISH_LOWER).lower().replace('\u0307', '')
+
+
+def fold_text(text: Optional[str]) -> str:
+    """Arama için normalize et: Türkçe küçük harf + ASCII katlama + tek boşluk"""
+    if not text:
+        return ''
+    return ' '.join(turkish_lower(text).translate(_ASCII_FOLD).split())
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Normalize edilmiş kelimeler"""
+    return _TOKEN_RE.findall(fold_text(text))
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Telefonu rakamlara indir: '+90 (555) 111-22-33' / '0555...' -> '5551112233'"""
+    if not phone:
+        return None
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    if len(digits) == 12 and digits.startswith('90'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits or None
+
+
+def normalize_phone_prefix(prefix: str) -> str:
+    """Yazılmakta olan telefon önekini normalize et"""
+    digits = ''.join(ch for ch in prefix if ch.isdigit())
+    if prefix.strip().startswith('+') and digits.startswith('90'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = digits[1:]
+    return digits
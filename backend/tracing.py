@@ -0,0 +1,309 @@
+# İzleme (istek / Mongo komutu / rapor span'leri, OTLP JSON dosyasına aktarım)
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional['Span']] = ContextVar('trace_span', default=None)
+
+# OTLP sabitleri
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Trace:
+    """Bir isteğin tüm span'leri (thread havuzundan eklenenler dahil)"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List['Span'] = []
+        self.pending: Dict[tuple, 'Span'] = {}
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'message')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str] = None,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.message = ''
+        trace.spans.append(self)
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+
+    def set_error(self, message: str):
+        self.status = STATUS_ERROR
+        self.message = message[:300]
+
+    def to_otlp(self, default_end_ns: int) -> dict:
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or default_end_ns),
+            'attributes': [_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            'status': {'code': self.status, 'message': self.message} if self.status else {},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Aktif izlemeye alt span ekle (örneklenmeyen istekte maliyeti bir ContextVar okuması)"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes=attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    """Her Mongo komutu, komutu çalıştıran kodun span'inin altına CLIENT span olarak eklenir"""
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        parent.trace.pending[(event.request_id, event.connection_id)] = Span(
+            parent.trace, f"mongo.{event.command_name}", parent.span_id, kind=SPAN_KIND_CLIENT,
+            attributes={
+                'db.system': 'mongodb',
+                'db.name': event.database_name,
+                'db.operation': event.command_name,
+                'db.mongodb.collection': collection if isinstance(collection, str) else None,
+            }
+        )
+
+    def _finish(self, event, error: Optional[str] = None):
+        parent = _current.get()
+        if parent is None:
+            return
+        command_span = parent.trace.pending.pop((event.request_id, event.connection_id), None)
+        if command_span is None:
+            return
+        if error is not None:
+            command_span.set_error(error)
+        command_span.end(command_span.start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure))
+
+
+class OTLPFileExporter:
+    """
+    Her satır bir OTLP/JSON ExportTraceServiceRequest (collector file exporter formatı).
+    İzler bellekte toplanır, periyodik olarak thread havuzunda dosyaya eklenir.
+    Dosya `max_bytes` aşınca `.1` uzantısıyla bir kez döndürülür.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 50 * 1024 * 1024,
+                 service_name: str = 'anadolu-pos', flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self._buffer: List[Trace] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+
+    def export(self, trace: Trace):
+        self._buffer.append(trace)
+
+    def _payload(self, traces: List[Trace]) -> dict:
+        now = time.time_ns()
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                _attribute('service.name', self.service_name),
+                _attribute('process.pid', os.getpid()),
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [s.to_otlp(now) for trace in traces for s in trace.spans],
+            }],
+        }]}
+
+    def _write(self, line: str):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                if self.path.stat().st_size >= self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + '.1'))
+            except FileNotFoundError:
+                pass
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            line = json.dumps(self._payload(batch), ensure_ascii=False, default=str)
+            await asyncio.get_running_loop().run_in_executor(None, self._write, line)
+            self.exported += len(batch)
+        except Exception as e:
+            logger.error(f"İzler yazılamadı: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class Tracer:
+    """
+    Örnekleme istek başında verilir (`sample_rate`); gelen `traceparent`
+    örneklenmiş işaretliyse istek her zaman izlenir ve aynı trace ID kullanılır.
+    """
+
+    def __init__(self, exporter: OTLPFileExporter, sample_rate: float = 0.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.listener = MongoTracingListener()
+
+    def start_trace(self, traceparent: Optional[str], name: str,
+                    attributes: Dict[str, Any]) -> Optional[Span]:
+        match = _TRACEPARENT.match(traceparent or '')
+        parent_sampled = match is not None and int(match.group(3), 16) & 1
+        if not parent_sampled and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        trace = Trace(match.group(1) if match else uuid.uuid4().hex)
+        return Span(trace, name, match.group(2) if match else None, kind=SPAN_KIND_SERVER,
+                    attributes=attributes)
+
+
+class TracingMiddleware:
+    """ASGI middleware: örneklenen her /api isteği için kök span"""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+        self._templates: Optional[Dict[Any, str]] = None
+
+    def _route(self, scope) -> Optional[str]:
+        """Eşleşen yolun şablonu (/api/orders/{order_id}); yönlendirme sonrası bilinir"""
+        endpoint = scope.get('endpoint')
+        if endpoint is None or 'app' not in scope:
+            return None
+        if self._templates is None:
+            self._templates = {getattr(route, 'endpoint', None): route.path for route in scope['app'].routes}
+        return self._templates.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api'):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        root = self.tracer.start_trace(
+            headers.get(b'traceparent', b'').decode('latin-1'),
+            f"{scope['method']} {scope['path']}",
+            {'http.request.method': scope['method'], 'url.path': scope['path']}
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                root.attributes['http.response.status_code'] = message['status']
+                if message['status'] >= 500:
+                    root.set_error(f"HTTP {message['status']}")
+                message = {**message, 'headers': list(message.get('headers', [])) + [
+                    (b'x-trace-id', root.trace.trace_id.encode())
+                ]}
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            root.end()
+            template = self._route(scope)
+            if template:
+                root.name = f"{scope['method']} {template}"
+                root.attributes['http.route'] = template
+            self.tracer.exporter.export(root.trace)
+
+
+def create_tracer(root_dir: Path) -> Tracer:
+    exporter = OTLPFileExporter(
+        Path(os.environ.get('TRACE_FILE', root_dir / 'traces' / 'traces.jsonl')),
+        max_bytes=int(os.environ.get('TRACE_FILE_MAX_BYTES', str(50 * 1024 * 1024))),
+        service_name=os.environ.get('TRACE_SERVICE_NAME', 'anadolu-pos'),
+    )
+    return Tracer(exporter, sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', '0')))
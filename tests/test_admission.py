@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import admission  # noqa: E402
+from admission import (  # noqa: E402
+    AdmissionController, PriorityClass, ORDER_ENTRY, COURIER, RECEIPTS, DASHBOARD, REPORTS
+)
+from auth import create_access_token  # noqa: E402
+
+
+def make_controller(rate: float = 1.0, burst: float = 2.0, trusted_proxies=()) -> AdmissionController:
+    classes = {name: PriorityClass(name, 2, 1.0, 4, rate, burst)
+               for name in (ORDER_ENTRY, COURIER, RECEIPTS, DASHBOARD, REPORTS)}
+    return AdmissionController(classes, trusted_proxies=trusted_proxies)
+
+
+def lane(controller: AdmissionController, method: str, path: str):
+    priority = controller.classify(method, path)
+    return priority.name if priority is not None else None
+
+
+@pytest.mark.parametrize('method, path, expected', [
+    ('GET', '/api/orders/abc/receipt', RECEIPTS),
+    ('POST', '/api/receipts/batch', REPORTS),
+    ('GET', '/api/admin/export/orders', REPORTS),
+    ('POST', '/api/admin/couriers/settle', REPORTS),
+    ('POST', '/api/admin/backups', REPORTS),
+    ('GET', '/api/admin/backups', DASHBOARD),
+    ('GET', '/api/sync', ORDER_ENTRY),
+    ('GET', '/api/couriers', ORDER_ENTRY),
+    ('POST', '/api/orders', ORDER_ENTRY),
+    ('PUT', '/api/courier/orders/abc/take', COURIER),
+    ('GET', '/api/stats/daily', DASHBOARD),
+    ('GET', '/api/tables/stream', None),
+])
+def test_classify(method, path, expected):
+    assert lane(make_controller(), method, path) == expected
+
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    controller = make_controller(rate=1.0, burst=2.0)
+    priority = controller.classes[ORDER_ENTRY]
+
+    assert controller.allow('user:a', priority)
+    assert controller.allow('user:a', priority)
+    assert not controller.allow('user:a', priority)
+    # Kovalar kullanıcı ve sınıf başına ayrı
+    assert controller.allow('user:b', priority)
+    assert controller.allow('user:a', controller.classes[REPORTS])
+
+    now[0] = 100.5
+    assert not controller.allow('user:a', priority)
+    now[0] = 101.0
+    assert controller.allow('user:a', priority)
+    assert not controller.allow('user:a', priority)
+
+
+def test_client_key_prefers_token_user():
+    controller = make_controller()
+    token = create_access_token({'user_id': 'u1'})
+    headers = {b'authorization': f'Bearer {token}'.encode()}
+    assert controller.client_key(headers, ('10.0.0.5', 1234)) == 'user:u1'
+    # Geçersiz token IP'ye düşer
+    assert controller.client_key({b'authorization': b'Bearer bozuk'}, ('10.0.0.5', 1234)) == 'ip:10.0.0.5'
+
+
+def test_forwarded_for_is_read_only_from_trusted_proxy():
+    headers = {b'x-forwarded-for': b'1.1.1.1, 203.0.113.7, 10.0.0.2'}
+    untrusted = make_controller()
+    assert untrusted.client_ip(headers, ('10.0.0.1', 80)) == '10.0.0.1'
+
+    trusted = make_controller(trusted_proxies=['10.0.0.0/8'])
+    # İstemcinin kendi yazdığı 1.1.1.1 değil, proxy'nin gördüğü adres
+    assert trusted.client_ip(headers, ('10.0.0.1', 80)) == '203.0.113.7'
+    assert trusted.client_ip({}, ('10.0.0.1', 80)) == '10.0.0.1'
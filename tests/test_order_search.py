@@ -0,0 +1,86 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+from order_search_service import (  # noqa: E402
+    OrderSearch, _decode_cursor, _encode_cursor, search_fields
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_search(*orders) -> OrderSearch:
+    db = mongomock_motor.AsyncMongoMockClient()['order_search_test']
+
+    async def seed():
+        if orders:
+            await db.orders.insert_many([{**order, **search_fields(order)} for order in orders])
+
+    run(seed())
+    return OrderSearch(db)
+
+
+def order(order_id: str, created_at: str, phone: str = '0532 111 22 33', name: str = 'Ayşe Yılmaz',
+          branch_id: str = 'main') -> dict:
+    return {'id': order_id, 'branch_id': branch_id, 'created_at': created_at,
+            'order_number': f'SIP-{order_id}', 'customer_phone': phone, 'customer_name': name}
+
+
+def test_cursor_round_trip():
+    value = {'created_at': '2026-10-19T12:00:00+00:00', 'id': 'abc'}
+    assert _decode_cursor(_encode_cursor(value)) == value
+
+
+@pytest.mark.parametrize('cursor', ['bozuk!', _encode_cursor(['liste'])])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='imleci'):
+        _decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('criteria', [
+    {'phone': '0532 11'},
+    {'phone': '+90 532 11'},
+    {'name': 'ay'},
+    {'q': ' a '},
+    {},
+    {'status': 'pending'},
+])
+def test_short_or_missing_criteria_is_rejected(criteria):
+    with pytest.raises(ValueError):
+        run(make_search().search('main', **criteria))
+
+
+def test_phone_prefix_ignores_trunk_and_country_code():
+    search = make_search(
+        order('a', '2026-10-19T10:00:00'),
+        order('b', '2026-10-19T11:00:00', phone='0533 000 00 00'),
+    )
+    # Hepsi 7 rakamlık aynı önek: 532 111 2
+    for phone in ('0532 111 2', '+90 532 111 2', '5321112'):
+        result = run(search.search('main', phone=phone))
+        assert [item['id'] for item in result['items']] == ['a']
+
+
+def test_recent_search_pages_with_cursor_newest_first():
+    search = make_search(
+        order('a', '2026-10-19T10:00:00'),
+        order('b', '2026-10-19T11:00:00'),
+        order('c', '2026-10-19T11:00:00'),
+        order('d', '2026-10-19T12:00:00'),
+        order('x', '2026-10-19T13:00:00', branch_id='other'),
+    )
+    first = run(search.search('main', name='ayse', limit=2))
+    second = run(search.search('main', name='ayse', limit=2, cursor=first['next_cursor']))
+
+    # Aynı created_at'teki siparişler id ile ayrılır: sayfa sınırında atlanmaz
+    assert [item['id'] for item in first['items']] == ['d', 'c']
+    assert [item['id'] for item in second['items']] == ['b', 'a']
+    assert second['next_cursor'] is None
@@ -0,0 +1,91 @@
+import asyncio
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+from pricing_service import PricingError, PricingService, to_money  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_service(*products) -> PricingService:
+    db = mongomock_motor.AsyncMongoMockClient()['pricing_test']
+
+    async def seed():
+        if products:
+            await db.products.insert_many([dict(p) for p in products])
+
+    run(seed())
+    return PricingService(db)
+
+
+def product(product_id: str, price, branch_id: str = 'main', **extra) -> dict:
+    return {'id': product_id, 'name': product_id.title(), 'price': price, 'branch_id': branch_id, **extra}
+
+
+def test_line_total_is_quantity_times_catalog_price():
+    service = make_service(product('doner', 85.5), product('ayran', 15))
+    items = [
+        # İstemcinin gönderdiği fiyat yok sayılır, katalog fiyatı kullanılır
+        {'product_id': 'doner', 'quantity': 2, 'price': 1},
+        {'product_id': 'ayran', 'quantity': 3},
+    ]
+    result = run(service.price_items(items, 'main'))
+
+    assert [item['price'] for item in result['items']] == [85.5, 15.0]
+    assert [item['line_total'] for item in result['items']] == [171.0, 45.0]
+    assert [item['product_name'] for item in result['items']] == ['Doner', 'Ayran']
+    assert result['subtotal'] == 216.0
+
+
+def test_unknown_product_is_rejected():
+    service = make_service(product('doner', 85))
+    with pytest.raises(PricingError):
+        run(service.price_items([{'product_id': 'yok', 'quantity': 1}]))
+
+
+def test_product_of_other_branch_is_rejected():
+    service = make_service(product('doner', 85, branch_id='other'))
+    with pytest.raises(PricingError):
+        run(service.price_items([{'product_id': 'doner', 'quantity': 1}], 'main'))
+
+
+def test_unavailable_product_is_rejected():
+    service = make_service(product('doner', 85, is_available=False))
+    with pytest.raises(PricingError, match='satışta değil'):
+        run(service.price_items([{'product_id': 'doner', 'quantity': 1}], 'main'))
+
+
+def test_tax_is_split_from_subtotal():
+    service = make_service(product('lahmacun', '33.35'))
+    result = run(service.price_items([{'product_id': 'lahmacun', 'quantity': 1}], 'main'))
+
+    # 33,35 * %10 = 3,335 -> kuruşa yukarı yuvarlanır
+    assert result['tax_rate'] == 0.10
+    assert result['tax_amount'] == 3.34
+    assert result['grand_total'] == 36.69
+
+
+def test_subtotal_keeps_vat_exclusive_total_amount_meaning():
+    service = make_service(product('pide', 0.1))
+    result = run(service.price_items([{'product_id': 'pide', 'quantity': 3}], 'main'))
+
+    # total_amount = subtotal: KDV hariç, float toplama hatası olmadan
+    assert result['subtotal'] == 0.3
+    assert to_money(result['subtotal']) == sum(to_money(item['line_total']) for item in result['items'])
+    assert Decimal(str(result['grand_total'])) == to_money(result['subtotal']) + to_money(result['tax_amount'])
+
+
+def test_cached_product_is_served_without_query():
+    service = make_service()
+    service.put(product('doner', 85))
+    result = run(service.price_items([{'product_id': 'doner', 'quantity': 1}], 'main'))
+    assert result['subtotal'] == 85.0
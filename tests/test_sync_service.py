@@ -0,0 +1,210 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import sync_service  # noqa: E402
+from sync_service import ChangeTracker, parse_collections  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_tracker(settle_seconds: float = 0.0) -> ChangeTracker:
+    db = mongomock_motor.AsyncMongoMockClient()['sync_test']
+    return ChangeTracker(db, settle_seconds=settle_seconds)
+
+
+async def write_orders(tracker: ChangeTracker, ids, branch_id: str = 'main') -> int:
+    """Tek yazma bloğu: tüm siparişler aynı sürümü alır"""
+    async with tracker.write('orders') as version:
+        for order_id in ids:
+            await tracker.db.orders.update_one(
+                {'id': order_id},
+                {'$set': {'id': order_id, 'branch_id': branch_id, 'version': version}},
+                upsert=True
+            )
+    return version
+
+
+def changed_ids(page: dict, name: str = 'orders'):
+    return [doc['id'] for doc in page['collections'][name]['changed']]
+
+
+def test_changes_since_returns_only_newer_documents_of_branch():
+    async def scenario():
+        tracker = make_tracker()
+        first = await write_orders(tracker, ['a'])
+        await write_orders(tracker, ['b'])
+        await write_orders(tracker, ['x'], branch_id='other')
+        return await tracker.changes_since(first, ('orders',), branch_id='main')
+
+    page = run(scenario())
+    assert changed_ids(page) == ['b']
+    assert page['version'] == 3
+    assert page['has_more'] is False
+    assert page['full'] is False
+
+
+def test_full_snapshot_includes_unversioned_documents():
+    async def scenario():
+        tracker = make_tracker()
+        await tracker.db.orders.insert_one({'id': 'old', 'branch_id': 'main'})
+        await write_orders(tracker, ['a'])
+        return await tracker.changes_since(0, ('orders',), branch_id='main')
+
+    page = run(scenario())
+    assert sorted(changed_ids(page)) == ['a', 'old']
+    assert page['full'] is True
+    assert page['version'] == 1
+    assert page['has_more'] is False
+    assert page['cursor'] is None
+
+
+def test_full_snapshot_is_paged_with_pinned_version():
+    async def scenario():
+        tracker = make_tracker()
+        await write_orders(tracker, ['a', 'b', 'c'])
+        async with tracker.write('tables') as version:
+            await tracker.db.tables.insert_one({'id': 't1', 'branch_id': 'main', 'version': version})
+        names = ('orders', 'tables')
+        pages = [await tracker.changes_since(0, names, limit=2, branch_id='main')]
+        # Anlık görüntü sürerken yazılan sipariş sabitlenen sürümden sonraki deltada gelir
+        await write_orders(tracker, ['late'])
+        while pages[-1]['cursor']:
+            pages.append(await tracker.changes_since(
+                0, names, limit=2, branch_id='main', cursor=pages[-1]['cursor']
+            ))
+        delta = await tracker.changes_since(pages[-1]['version'], names, branch_id='main')
+        return pages, delta
+
+    pages, delta = run(scenario())
+    assert [len(changed_ids(p)) + len(changed_ids(p, 'tables')) for p in pages] == [2, 2, 1]
+    assert [p['has_more'] for p in pages] == [True, True, False]
+    assert [p['version'] for p in pages] == [0, 0, 2]
+    snapshot_orders = [order_id for p in pages for order_id in changed_ids(p)]
+    assert snapshot_orders[:3] == ['a', 'b', 'c']
+    assert [table_id for p in pages for table_id in changed_ids(p, 'tables')] == ['t1']
+    assert changed_ids(delta) == ['late']
+    assert all(p['full'] for p in pages)
+
+
+def test_invalid_snapshot_cursor_is_rejected():
+    tracker = make_tracker()
+    with pytest.raises(ValueError):
+        run(tracker.changes_since(0, ('orders',), cursor='bozuk'))
+    cursor = sync_service._encode_cursor({'version': 1, 'collection': 'tables', 'after': None})
+    with pytest.raises(ValueError):
+        run(tracker.changes_since(0, ('orders',), cursor=cursor))
+
+
+def test_tombstones_are_reported_as_deleted():
+    async def scenario():
+        tracker = make_tracker()
+        await write_orders(tracker, ['a', 'b'])
+        async with tracker.write('orders') as version:
+            await tracker.db.orders.delete_many({'id': {'$in': ['a', 'b']}})
+            await tracker.tombstone('orders', ['a', 'b'], version, 'main')
+        return await tracker.changes_since(1, ('orders',), branch_id='main')
+
+    page = run(scenario())
+    assert sorted(page['collections']['orders']['deleted']) == ['a', 'b']
+    assert page['version'] == 2
+
+
+def test_truncated_page_keeps_documents_tied_on_last_version():
+    async def scenario():
+        tracker = make_tracker()
+        since = await write_orders(tracker, ['seen'])
+        await write_orders(tracker, ['a'])
+        await write_orders(tracker, ['b', 'c', 'd'])
+        await write_orders(tracker, ['e'])
+        page = await tracker.changes_since(since, ('orders',), limit=2)
+        rest = await tracker.changes_since(page['version'], ('orders',), limit=2)
+        return page, rest
+
+    page, rest = run(scenario())
+    # limit=2 sürüm 3'ün ortasına denk gelir: sürüm 3'ün tamamı bu sayfada
+    assert sorted(changed_ids(page)) == ['a', 'b', 'c', 'd']
+    assert page['version'] == 3
+    assert page['has_more'] is True
+    assert changed_ids(rest) == ['e']
+    assert rest['version'] == 4
+    assert rest['has_more'] is False
+
+
+def test_truncated_collection_limits_other_collections_and_tombstones():
+    async def scenario():
+        tracker = make_tracker()
+        since = await write_orders(tracker, ['seen'])
+        await write_orders(tracker, ['a'])
+        await write_orders(tracker, ['b'])
+        async with tracker.write('tables') as version:
+            await tracker.db.tables.insert_one({'id': 't1', 'version': version})
+            await tracker.tombstone('orders', ['gone'], version)
+        return await tracker.changes_since(since, ('orders', 'tables'), limit=1)
+
+    page = run(scenario())
+    assert changed_ids(page) == ['a']
+    assert changed_ids(page, 'tables') == []
+    assert page['collections']['orders']['deleted'] == []
+    assert page['version'] == 2
+    assert page['has_more'] is True
+
+
+def test_unsettled_versions_are_sent_but_not_confirmed():
+    async def scenario():
+        tracker = make_tracker(settle_seconds=3600)
+        await write_orders(tracker, ['a'])
+        await write_orders(tracker, ['b'])
+        page = await tracker.changes_since(1, ('orders',), limit=1)
+        return page
+
+    page = run(scenario())
+    # Değişiklik gönderilir ama başka worker'da süren yazma olabilir: since onaylı kalır
+    assert changed_ids(page) == ['b']
+    assert page['version'] == 1
+    assert page['has_more'] is False
+
+
+def test_settled_version_follows_observation_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(sync_service.time, 'monotonic', lambda: now[0])
+    tracker = make_tracker(settle_seconds=5)
+    tracker._observe(3)
+    now[0] = 102.0
+    tracker._observe(7)
+    assert tracker.settled_version() == 0
+    now[0] = 105.0
+    assert tracker.settled_version() == 3
+    now[0] = 107.5
+    assert tracker.settled_version() == 7
+    assert not tracker._observed
+
+
+def test_pending_write_in_this_worker_holds_back_version():
+    async def scenario():
+        tracker = make_tracker()
+        since = await write_orders(tracker, ['a'])
+        async with tracker.write('orders') as pending_version:
+            done = await write_orders(tracker, ['b'])
+            page = await tracker.changes_since(since, ('orders',))
+        return pending_version, done, page
+
+    pending_version, done, page = run(scenario())
+    assert done > pending_version
+    assert page['version'] == pending_version - 1
+    assert 'b' in changed_ids(page)
+
+
+def test_parse_collections():
+    assert parse_collections(None) == sync_service.SYNC_COLLECTIONS
+    assert parse_collections('orders, tables') == ('orders', 'tables')
+    with pytest.raises(ValueError):
+        parse_collections('orders,users')